@@ -1,16 +1,62 @@
+import threading
 from .tileset import TileSet
 from .load import *
 
 
+class _LazyAsset:
+    """An AssetManager attribute that is only loaded the first time it's used (or prefetched)"""
+    def __init__(self, loader):
+        self.loader = loader
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        if self.name not in instance.__dict__:
+            # the prefetch thread could be loading this very asset right now; wait for it instead of doubling up
+            with instance._locks[self.name]:
+                if self.name not in instance.__dict__:
+                    instance.__dict__[self.name] = self.loader()
+
+        return instance.__dict__[self.name]
+
+
 class AssetManager:
-    """AssetManager is the central location for all assets in the game"""
+    """AssetManager is the central location for all assets in the game. Each asset is loaded when it's first
+    used, so the editor's GUI never has to be loaded just to play"""
+    tileset = _LazyAsset(lambda: TileSet("images/tiles.png"))
+    character_atlas = _LazyAsset(load_character_atlas)
+    pickup_atlas = _LazyAsset(load_pickup_atlas)
+    interactive_atlas = _LazyAsset(load_interactive_atlas)
+
+    gui_atlas = _LazyAsset(load_gui_atlas)
+    misc_atlas = _LazyAsset(load_misc_atlas)
+
+    sounds = _LazyAsset(load_sound_fx)
+
+    # everything a level needs, in roughly the order it needs it
+    PLAY_ASSETS = ("tileset", "character_atlas", "pickup_atlas", "interactive_atlas", "misc_atlas", "sounds")
+
     def __init__(self):
-        self.tileset = TileSet("images/tiles.png")
-        self.character_atlas = load_character_atlas()
-        self.pickup_atlas = load_pickup_atlas()
-        self.interactive_atlas = load_interactive_atlas()
+        self._locks = {name: threading.Lock() for name, value in vars(AssetManager).items()
+                       if isinstance(value, _LazyAsset)}
+        self._prefetch_thread = None
+
+    def prefetch(self, names=PLAY_ASSETS):
+        """Loads the named assets on a background thread, so they're (hopefully) ready by the time they're used"""
+        if self._prefetch_thread is not None:
+            return
+
+        def load():
+            for name in names:
+                asset = getattr(self, name)
 
-        self.gui_atlas = load_gui_atlas()
-        self.misc_atlas = load_misc_atlas()
+                if isinstance(asset, SoundBank):
+                    asset.load_all()
 
-        self.sounds = load_sound_fx()
+        self._prefetch_thread = threading.Thread(target=load, name="asset prefetch", daemon=True)
+        self._prefetch_thread.start()
@@ -0,0 +1,147 @@
+"""Disk cache of rescaled images, so atlases and tilesets don't have to be decoded and scaled on every launch.
+
+Each cached image is one pack file in config.asset_cache_directory: a small header, the modification times of the
+files it was built from, an index of named rects (an atlas's sprite rects, already rescaled) and then the raw
+pixels. A pack is read with a single read and turned into a surface with pygame.image.frombuffer. It is only used
+if the rescale factor and every source file's modification time still match; otherwise it's rebuilt.
+
+Images generated from other images (see color_transform) are packed the same way by read_generated and
+write_generated, stamped with a digest of whatever they were generated from instead of modification times"""
+import os
+import struct
+import pygame
+import config
+
+_MAGIC = b"SMBPACK1"
+_HEADER = struct.Struct("<8sHHIIB")  # magic, rescale factor, number of stamps, width, height, bytes per pixel
+_STAMP = struct.Struct("<q")
+_COUNT = struct.Struct("<I")
+_NAME_LENGTH = struct.Struct("<H")
+_RECT = struct.Struct("<iiii")
+
+_PIXEL_FORMATS = {3: "RGB", 4: "RGBA"}
+
+
+def _pack_path(name, rescale_factor):
+    return os.path.join(config.asset_cache_directory, f"{name}@{rescale_factor}x.pack")
+
+
+def _image_name(image_path):
+    return os.path.splitext(os.path.basename(image_path))[0]
+
+
+def _mtimes(source_paths):
+    return [os.stat(path).st_mtime_ns for path in source_paths]
+
+
+def _digest_stamps(digest):
+    # a digest is stored as however many 64 bit stamps as it takes
+    return [_STAMP.unpack_from(digest.ljust((len(digest) + 7) // 8 * 8, b'\0'), i)[0]
+            for i in range(0, len(digest), 8)]
+
+
+def read(image_path, source_paths, rescale_factor):
+    """Returns (surface, rects) for a cached image, or None if there's no usable pack for it"""
+    if config.asset_cache_directory is None:
+        return None
+
+    try:
+        return _read(_pack_path(_image_name(image_path), rescale_factor), _mtimes(source_paths), rescale_factor)
+    except OSError:
+        return None  # a source file is missing
+
+
+def read_generated(name, digest):
+    """Returns (surface, rects) for a generated image, if one was written with the same name and digest"""
+    if config.asset_cache_directory is None:
+        return None
+
+    return _read(_pack_path(name, 1), _digest_stamps(digest), 1)
+
+
+def _read(path, stamps, rescale_factor):
+    try:
+        # writable, since the surface made from it uses these very bytes as its pixels
+        data = bytearray(os.path.getsize(path))
+
+        with open(path, 'rb') as f:
+            if f.readinto(data) != len(data):
+                return None
+
+        view = memoryview(data)
+        magic, factor, stamp_count, width, height, bpp = _HEADER.unpack_from(view, 0)
+        offset = _HEADER.size
+
+        if magic != _MAGIC or factor != rescale_factor or stamp_count != len(stamps) or bpp not in _PIXEL_FORMATS:
+            return None
+
+        for stamp in stamps:
+            if _STAMP.unpack_from(view, offset)[0] != stamp:
+                return None  # a source changed since the pack was built
+
+            offset += _STAMP.size
+
+        rects = {}
+        count = _COUNT.unpack_from(view, offset)[0]
+        offset += _COUNT.size
+
+        for _ in range(count):
+            length = _NAME_LENGTH.unpack_from(view, offset)[0]
+            offset += _NAME_LENGTH.size
+
+            name = bytes(view[offset:offset + length]).decode('utf-8')
+            offset += length
+
+            rects[name] = pygame.Rect(*_RECT.unpack_from(view, offset))
+            offset += _RECT.size
+
+        if len(view) - offset != width * height * bpp:
+            return None  # truncated
+
+        # the surface keeps a reference to the buffer, so the pixels are never copied
+        surface = pygame.image.frombuffer(view[offset:], (width, height), _PIXEL_FORMATS[bpp])
+
+        return surface, rects
+    except (OSError, struct.error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def write(image_path, source_paths, rescale_factor, surface, rects=None):
+    """Stores a rescaled image, and the named rects that go with it, for read to find next time"""
+    if config.asset_cache_directory is None:
+        return
+
+    _write(_pack_path(_image_name(image_path), rescale_factor), _mtimes(source_paths), rescale_factor, surface, rects)
+
+
+def write_generated(name, digest, surface, rects=None):
+    if config.asset_cache_directory is None:
+        return
+
+    _write(_pack_path(name, 1), _digest_stamps(digest), 1, surface, rects)
+
+
+def _write(path, stamps, rescale_factor, surface, rects):
+    bpp = 4 if surface.get_flags() & pygame.SRCALPHA else 3
+    rects = rects or {}
+
+    chunks = [_HEADER.pack(_MAGIC, rescale_factor, len(stamps), surface.get_width(), surface.get_height(), bpp)]
+    chunks.extend(_STAMP.pack(stamp) for stamp in stamps)
+    chunks.append(_COUNT.pack(len(rects)))
+
+    for name, rect in rects.items():
+        encoded = name.encode('utf-8')
+        chunks.extend([_NAME_LENGTH.pack(len(encoded)), encoded, _RECT.pack(rect.x, rect.y, rect.width, rect.height)])
+
+    chunks.append(pygame.image.tostring(surface, _PIXEL_FORMATS[bpp]))
+
+    try:
+        os.makedirs(config.asset_cache_directory, exist_ok=True)
+
+        # write somewhere else first, so an interrupted write can never leave a broken pack behind
+        with open(path + ".tmp", 'wb') as f:
+            f.write(b"".join(chunks))
+
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"warning -- couldn't write asset cache {path}: {e}")
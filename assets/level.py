@@ -1,10 +1,14 @@
-import json
+from collections import namedtuple
 import pygame
 from pygame import Rect
 from entities.collider import ColliderManager, Collider
 from assets.tile_map import TileMap
+import level_file
+from assets.level_loader import level_loader
 import config
 from util import make_vector, copy_vector
+from scheduler import game_scheduler
+from dirty_rects import dirty_rects
 import entities.characters
 from entities.characters.spawners import MarioSpawnPoint
 from entities.characters.mario.mario import Mario
@@ -13,6 +17,8 @@ from event.game_events import EventHandler
 import entities.effects.mario_death
 import constants
 
+LevelSnapshot = namedtuple("LevelSnapshot", ["filename", "background_color", "normal_physics", "tile_map", "entities"])
+
 
 class Level(EventHandler):
     """A level is the highest-level object containing everything that makes up a level"""
@@ -31,14 +37,23 @@ class Level(EventHandler):
         self.stats = stats
         self.title = title
         self.loaded_from = ""
+        self._loaded_state = None  # snapshot taken when loaded_from was loaded, which reset goes back to
 
         self.asset_manager = assets
         self.player_input = PlayerInputHandler()
+        self.input_hook = None  # called with this level at the start of every update (input recording, replays)
         self.mario = Mario(self.player_input, self)
         self.mario.enabled = False
 
+        if config.batched_world_step:
+            # all enemies' world collisions for a step come from one batched query
+            self.entity_manager.before_layer_update[constants.Enemy] = self.collider_manager.begin_world_step
+
         self._scroll_position = make_vector(0, 0)
+        self._previous_scroll_position = self._scroll_position
+        self._stepped_at = None  # scheduler step this level was last updated in
         self._view_rect = Rect(0, 0, config.screen_rect.width, config.screen_rect.height)
+        self._drawn_as = None  # what the tiles and background looked like when last drawn, in dirty rect mode
         self._cleared = False
         self._timed_out = False
 
@@ -50,6 +65,12 @@ class Level(EventHandler):
         self.entity_manager.update_layer(constants.Trigger, dt, self.view_rect)
 
     def update(self, dt):
+        if self.input_hook is not None:
+            self.input_hook(self)
+
+        self._previous_scroll_position = self._scroll_position
+        self._stepped_at = game_scheduler.step_index
+
         self.entity_manager.update(dt, self.view_rect)
 
         # scroll map with mario
@@ -66,10 +87,32 @@ class Level(EventHandler):
             self._timed_out = True
 
     def draw(self, screen):
+        """Draws the background color, the tile map and the entities of the level"""
         vr = self.view_rect  # send copy: don't want our private stuff messed with
+        alpha = self._get_interpolation_alpha()
+
+        if alpha < 1. and self._previous_scroll_position.distance_to(self._scroll_position) < vr.width // 4:
+            vr.topleft = self._previous_scroll_position.lerp(self._scroll_position, alpha)
+
+        if config.dirty_rect_rendering:
+            drawn_as = vr.topleft, self.tile_map.revision, tuple(self.background_color)
 
+            if drawn_as != self._drawn_as:
+                dirty_rects.add_everything()  # scrolled, or the map changed: all of the view is different
+                self._drawn_as = drawn_as
+
+        screen.fill(self.background_color)
         self.tile_map.draw(screen, vr)
-        self.entity_manager.draw(screen, vr)
+
+        self.entity_manager.draw(screen, vr, alpha=alpha)
+
+    def _get_interpolation_alpha(self):
+        # only interpolate if this level took part in the latest physics step; otherwise it's paused (or not being
+        # updated at all, like in the editor) and should be drawn exactly where it is
+        if not config.interpolate_rendering or self._stepped_at != game_scheduler.step_index:
+            return 1.
+
+        return game_scheduler.alpha
 
     def handle_event(self, evt, game_events):
         self.player_input.handle_event(evt, game_events)
@@ -119,7 +162,7 @@ class Level(EventHandler):
                 "filename": self.filename,
                 "normal_physics": self.normal_physics,
                 "background_color": (self.background_color[0], self.background_color[1], self.background_color[2]),
-                "tile_map": self.tile_map.serialize(),
+                "tile_map": self.tile_map.serialize_packed(),
                 "entities": self.entity_manager.serialize()}
 
     def deserialize(self, values):
@@ -132,6 +175,30 @@ class Level(EventHandler):
         self.entity_manager.deserialize(self, values["entities"])
         self.normal_physics = values["normal_physics"] if "normal_physics" in values else True
 
+        self._register_mario()
+
+    def capture(self):
+        """Snapshot of this level as it is now, for restore. Entities are kept as the values they serialize to, and the
+        tile grid is shared with the tile map (not copied) until one of them changes"""
+        return LevelSnapshot(self.filename, self.background_color, self.normal_physics, self.tile_map.snapshot(),
+                             self.entity_manager.serialize())
+
+    def restore(self, snapshot):
+        """Puts this level back the way it was when snapshot was captured (from this level or any other), without
+        going through the level's file or its serialized form. Restoring the snapshot taken when the level was loaded
+        only rebuilds the entities that changed since (see EntityManager.checkpoint)"""
+        if self.mario.enabled:
+            self.despawn_mario()
+
+        self.filename = snapshot.filename
+        self.background_color = snapshot.background_color
+        self.normal_physics = snapshot.normal_physics
+        self.tile_map.restore(snapshot.tile_map)
+        self.entity_manager.restore_checkpoint(self, snapshot.entities)
+
+        self._register_mario()
+
+    def _register_mario(self):
         # we only want one unique mario, ignore any that might have been deserialized
         for existing in self.entity_manager.search_by_type(entities.characters.mario.Mario):
             existing.destroy()
@@ -157,7 +224,11 @@ class Level(EventHandler):
         if self.loaded_from:
             current_spawn = self._find_spawn_point()
 
-            self.load_from_path(self.loaded_from, current_spawn[1])  # want idx, not actual point
+            # no need to go back to the file: everything it had was captured when it was loaded, and only the
+            # entities play has touched since need rebuilding
+            self.restore(self._loaded_state)
+            self._scroll_to_spawn_point(current_spawn[1])  # want idx, not actual point
+
             self.stats.reset_time()
             self._timed_out = False
             self._cleared = False
@@ -178,11 +249,19 @@ class Level(EventHandler):
 
         self.entity_manager.clear()
 
-        with open(filename, 'r') as f:
-            self.deserialize(json.loads(f.read()))
+        self.deserialize(level_loader.read(filename))
 
         self.loaded_from = filename
+        self._loaded_state = self.capture()
+        self.entity_manager.checkpoint(self._loaded_state.entities)
+
+        # have whatever the warps lead to ready before mario gets there
+        for warp in self.entity_manager.search_by_type(entities.characters.triggers.LevelWarp):
+            level_loader.parse(warp.target_path)
 
+        self._scroll_to_spawn_point(spawn_idx)
+
+    def _scroll_to_spawn_point(self, spawn_idx):
         if spawn_idx > 0:
             spawn_points = self.entity_manager.search_by_type(MarioSpawnPoint)
             spawn_points.sort(key=lambda spawn: spawn.position.x)
@@ -191,6 +270,9 @@ class Level(EventHandler):
 
             self.position.x = spawn_points[spawn_idx].position.x
 
+    def save_to_path(self, filename, binary=True):
+        level_file.write(filename, self.serialize(), binary)
+
     def _find_spawn_point(self):
         spawn_points = self.entity_manager.search_by_type(MarioSpawnPoint)
 
@@ -243,7 +325,6 @@ class Level(EventHandler):
             y = 0  # todo: something broken with painting on y coords, low urgency
 
             self.position = make_vector(x, y)
-            screen.fill(self.background_color)
             self.draw(screen)
 
             capture.blit(screen, (x, y))
@@ -0,0 +1,65 @@
+"""Reads levels ahead of time on a worker thread, so moving on to the next one doesn't stall the game on the disk.
+
+parse reads and decodes a level file in the background; Level.load_from_path then takes the values from there
+instead of the disk (as long as the file hasn't changed since). Only the file is dealt with on the worker: the
+Level itself, its entities and everything they load (surfaces, fonts) are still made on the main thread, since
+pygame isn't safe to use from more than one thread"""
+import os
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+import level_file
+import config
+
+
+class LevelLoader:
+    def __init__(self):
+        self._executor = None  # started when first needed
+        self._parsed = {}  # path -> (modification time, future of the level's values)
+        self._lock = threading.Lock()
+
+    def parse(self, path):
+        """Starts reading the level at path in the background, unless it already has been"""
+        if not config.preload_levels:
+            return
+
+        try:
+            modified = os.stat(path).st_mtime_ns
+        except OSError:
+            return  # a warp to a level that doesn't exist; that's reported if it's ever loaded
+
+        with self._lock:
+            parsed = self._parsed.get(path)
+
+            if parsed is None or parsed[0] != modified:
+                self._parsed[path] = modified, self._submit(level_file.read, path)
+
+    def read(self, path):
+        """Values of the level at path, from the background if it was parsed there and hasn't changed since"""
+        with self._lock:
+            parsed = self._parsed.get(path)
+
+        if parsed is not None:
+            try:
+                if parsed[0] == os.stat(path).st_mtime_ns:
+                    return parsed[1].result()
+            except (OSError, CancelledError):
+                pass  # changed, or discarded before it was read; read it here instead
+
+        return level_file.read(path)
+
+    def discard(self):
+        """Drops every level parsed so far (stopping any that haven't started yet)"""
+        with self._lock:
+            for _, parsed in self._parsed.values():
+                parsed.cancel()
+
+            self._parsed.clear()
+
+    def _submit(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level loader")
+
+        return self._executor.submit(fn, *args)
+
+
+level_loader = LevelLoader()
@@ -27,21 +27,28 @@ def load_character_atlas():
 
 
 def load_gui_atlas():
+    # nearly all of this is only used by the editor, so nothing is made until it's first loaded
     atlas = SpriteAtlas(get_atlas_path("gui"), tf_use_rescale_factor=False, convert=False)
     kwargs = {"color_key": config.transparent_color}
 
-    def load_slice(name, darken_name, dims, **kw):
-        atlas.initialize_slice(name, dims, **kw)
+    def darken_slice(name, darken_name, dims):
         sliced = atlas.load_sliced(name)
+        darkened = generated_selected_version_darken(sliced.base_surface, 0.5)
 
-        if darken_name is not None:
-            darkened = generated_selected_version_darken(sliced.base_surface, 0.5)
+        if sliced.base_surface.get_colorkey() is not None:
+            darkened = darkened.convert()
+            darkened.set_colorkey(sliced.base_surface.get_colorkey())
 
-            if sliced.base_surface.get_colorkey() is not None:
-                darkened = darkened.convert()
-                darkened.set_colorkey(sliced.base_surface.get_colorkey())
+        atlas.initialize_slice_from_surface(darken_name, darkened, dims)
 
-            atlas.initialize_slice_from_surface(darken_name, darkened, dims)
+    def load_slice(name, darken_name, dims, **kw):
+        atlas.defer(SpriteAtlas.SLICED, name, atlas.initialize_slice, name, dims, **kw)
+
+        if darken_name is not None:
+            atlas.defer(SpriteAtlas.SLICED, darken_name, darken_slice, name, darken_name, dims)
+
+    def load_static(name, **kw):
+        atlas.defer(SpriteAtlas.STATIC, name, atlas.initialize_static, name, **kw)
 
     load_slice("bkg_square", "bkg_square_dk", (16, 16), **kwargs)
     load_slice("bkg_rounded", "bkg_rounded_dk", (32, 32), **kwargs)
@@ -62,25 +69,28 @@ def load_gui_atlas():
     load_slice("sb_thumb_light", None, (7, 7), **kwargs)
     load_slice("option_button", "option_button_hl", (4, 4))
 
-    atlas.initialize_static("option_button", **kwargs)
-    atlas.initialize_static("option_button_checked_heavy", **kwargs)
-    atlas.initialize_static("option_button_checked_light", **kwargs)
-    atlas.initialize_static("slider_thumb_h", **kwargs)
-    atlas.initialize_static("slider_thumb_h_light", **kwargs)
-    atlas.initialize_static("slider_thumb_v", **kwargs)
-    atlas.initialize_static("slider_thumb_v_light", **kwargs)
-    atlas.initialize_static("slider_bkg_h", **kwargs)
-    atlas.initialize_static("slider_bkg_v", **kwargs)
-    atlas.initialize_static("sb_thumb", **kwargs)
-    atlas.initialize_static("sb_thumb_light", **kwargs)
+    load_static("option_button", **kwargs)
+    load_static("option_button_checked_heavy", **kwargs)
+    load_static("option_button_checked_light", **kwargs)
+    load_static("slider_thumb_h", **kwargs)
+    load_static("slider_thumb_h_light", **kwargs)
+    load_static("slider_thumb_v", **kwargs)
+    load_static("slider_thumb_v_light", **kwargs)
+    load_static("slider_bkg_h", **kwargs)
+    load_static("slider_bkg_v", **kwargs)
+    load_static("sb_thumb", **kwargs)
+    load_static("sb_thumb_light", **kwargs)
 
     # tools (no colorkey => use per-pixel alpha)
 
-    def load_tool_static(name, hl_name):
-        atlas.initialize_static(name)
+    def highlight_tool(name, hl_name):
         atlas.initialize_static_from_surface(hl_name, generated_selected_version_circle(atlas.load_static(name).image,
                                                                                         pygame.Color('yellow')))
 
+    def load_tool_static(name, hl_name):
+        load_static(name)
+        atlas.defer(SpriteAtlas.STATIC, hl_name, highlight_tool, name, hl_name)
+
     load_tool_static("pencil", "pencil_hl")
     load_tool_static("paint", "paint_hl")
     load_tool_static("grid", "grid_hl")
@@ -91,11 +101,11 @@ def load_gui_atlas():
     load_tool_static("bottom", "bottom_hl")
 
     # other things used in editor, here because they shouldn't be scaled like other atlases are
-    atlas.initialize_static("level_warp")
-    atlas.initialize_static("mm_Smb", **kwargs)
-    atlas.initialize_static("menu_mushroom", **kwargs)
-    atlas.initialize_static("bulb", **kwargs)
-    atlas.initialize_static("level_end_trigger", **kwargs)
+    load_static("level_warp")
+    load_static("mm_Smb", **kwargs)
+    load_static("menu_mushroom", **kwargs)
+    load_static("bulb", **kwargs)
+    load_static("level_end_trigger", **kwargs)
 
     return atlas
 
@@ -156,10 +166,44 @@ def load_interactive_atlas():
     return atlas
 
 
-def load_sound_fx():
-    sounds = {}
-
-    def load_sound(name):
+class SoundBank:
+    """Sound effects by name, each loaded from disk the first time it's asked for"""
+    FILES = {'powerup': 'smb_powerup.wav',
+             'stomp': 'smb_stomp.wav',
+             'smb_life': 'smb_1-up.wav',
+             'kick': 'smb_kick.wav',
+             'pause': 'smb_pause.wav',
+             'jump_small': 'smb_jump-small.wav',
+             'jump_super': 'smb_jump-super.wav',
+             'pipe': 'smb_pipe.wav',
+             'downgrade': 'smb_pipe.wav',
+             'breakblock': 'smb_breakblock.wav',
+             'bump': 'smb_bump.wav',
+             'coin': 'smb_coin.wav',
+             'powerup_appears': 'smb_powerup_appears.wav',
+             'fireball': 'smb_fireball.wav',
+             'bowserfire': 'smb_bowserfire.wav'}
+
+    def __init__(self):
+        self._loaded = {}  # file name -> Sound (or None if it couldn't be loaded)
+
+    def __getitem__(self, name):
+        file_name = SoundBank.FILES[name]
+
+        if file_name not in self._loaded:
+            self._loaded[file_name] = SoundBank._load(file_name)
+
+        return self._loaded[file_name]
+
+    def __contains__(self, name):
+        return name in SoundBank.FILES
+
+    def load_all(self):
+        for name in SoundBank.FILES:
+            self[name]  # noqa -- loads it
+
+    @staticmethod
+    def _load(name):
         path = os.path.join('sounds', 'sfx', name)
 
         if not os.path.exists(path):
@@ -170,20 +214,6 @@ def load_sound_fx():
             except pygame.error:
                 warnings.warn(f'Unable to load {Sound}')
 
-    sounds['powerup'] = load_sound('smb_powerup.wav')
-    sounds['stomp'] = load_sound('smb_stomp.wav')
-    sounds['smb_life'] = load_sound('smb_1-up.wav')
-    sounds['kick'] = load_sound('smb_kick.wav')
-    sounds['pause'] = load_sound('smb_pause.wav')
-    sounds['jump_small'] = load_sound('smb_jump-small.wav')
-    sounds['jump_super'] = load_sound('smb_jump-super.wav')
-    sounds['pipe'] = load_sound('smb_pipe.wav')
-    sounds['downgrade'] = sounds['pipe']
-    sounds['breakblock'] = load_sound('smb_breakblock.wav')
-    sounds['bump'] = load_sound('smb_bump.wav')
-    sounds['coin'] = load_sound('smb_coin.wav')
-    sounds['powerup_appears'] = load_sound('smb_powerup_appears.wav')
-    sounds['fireball'] = load_sound('smb_fireball.wav')
-    sounds['bowserfire'] = load_sound('smb_bowserfire.wav')
-
-    return sounds
+
+def load_sound_fx():
+    return SoundBank()
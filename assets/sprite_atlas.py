@@ -1,9 +1,11 @@
 import os
 import copy
+import threading
 import pygame
 from animation import Animation
 from animation import StaticAnimation
 from entities.gui.sliced_image import SlicedImage
+from . import image_cache
 import config
 
 # if rescale is not a factor of 2, sprites will have fuzzy edges that will look terrible with color keying
@@ -34,6 +36,10 @@ class SpriteAtlas:
     more than read the main surface into memory along with a txt file that describes
     the surfaces contained within the atlas. This information can be used to create
     specific Animation instances for later use by calling appropriate methods on the atlas"""
+    STATIC = 'static'
+    ANIMATION = 'animation'
+    SLICED = 'sliced'
+
     def __init__(self, atlas_path=None, tf_use_rescale_factor=True, convert=True):
         # use the descriptor file to load subsurfaces
         self.sprite_rects = {}
@@ -46,42 +52,16 @@ class SpriteAtlas:
             if not os.path.exists(atlas_descriptor) or not os.path.exists(atlas_path):
                 raise FileNotFoundError(atlas_descriptor)
 
-            self.atlas = pygame.image.load(atlas_path)
-
-            if not self.atlas:
-                raise FileNotFoundError(atlas_path)
-
-            if tf_use_rescale_factor:
-                # apply rescaling
-                # rescale without resampling
-                scaled_size = (self.atlas.get_width() * config.rescale_factor,
-                               self.atlas.get_height() * config.rescale_factor)
+            self.rescale_factor = config.rescale_factor if tf_use_rescale_factor else 1
 
-                self.atlas = self.atlas \
-                    if config.rescale_factor == 1 else pygame.transform.scale(self.atlas, scaled_size)
+            sources = [atlas_path, atlas_descriptor]
+            cached = image_cache.read(atlas_path, sources, self.rescale_factor)
 
-                self.rescale_factor = config.rescale_factor
+            if cached is not None:
+                self.atlas, self.sprite_rects = cached
             else:
-                self.rescale_factor = 1
-
-            file = open(atlas_descriptor, 'r')
-
-            if not file:
-                raise FileNotFoundError(atlas_descriptor)
-
-            for line in file:
-                # of the form: name = left top width height
-                name, rect_str = [s.strip() for s in line.split('=')]
-                rect = self._get_rect_from_str(rect_str)
-
-                # apply rescale factor
-                rect.x *= self.rescale_factor
-                rect.y *= self.rescale_factor
-                rect.width *= self.rescale_factor
-                rect.height *= self.rescale_factor
-
-                # add sprite to dictionary
-                self.sprite_rects[name] = rect
+                self._load(atlas_path, atlas_descriptor)
+                image_cache.write(atlas_path, sources, self.rescale_factor, self.atlas, self.sprite_rects)
         else:
             self.__sprite_rects = {}
             self.atlas = None
@@ -90,9 +70,46 @@ class SpriteAtlas:
         self.statics = {}  # statics aren't initialized to anything by default so user can specify color key if wanted
         self.sliced = {}
 
+        # (kind, name) -> initializer run by the first load_static/load_animation/load_sliced of that name
+        self._deferred = {}
+        self._deferred_lock = threading.RLock()  # initializers can load other deferred names themselves
+
         if convert and self.atlas is not None:
             self.atlas = self.atlas.convert()
 
+    def _load(self, atlas_path, atlas_descriptor):
+        self.atlas = pygame.image.load(atlas_path)
+
+        if not self.atlas:
+            raise FileNotFoundError(atlas_path)
+
+        if self.rescale_factor != 1:
+            # apply rescaling
+            # rescale without resampling
+            scaled_size = (self.atlas.get_width() * self.rescale_factor,
+                           self.atlas.get_height() * self.rescale_factor)
+
+            self.atlas = pygame.transform.scale(self.atlas, scaled_size)
+
+        file = open(atlas_descriptor, 'r')
+
+        if not file:
+            raise FileNotFoundError(atlas_descriptor)
+
+        for line in file:
+            # of the form: name = left top width height
+            name, rect_str = [s.strip() for s in line.split('=')]
+            rect = self._get_rect_from_str(rect_str)
+
+            # apply rescale factor
+            rect.x *= self.rescale_factor
+            rect.y *= self.rescale_factor
+            rect.width *= self.rescale_factor
+            rect.height *= self.rescale_factor
+
+            # add sprite to dictionary
+            self.sprite_rects[name] = rect
+
     @property
     def sprite_names(self):
         return list(self.sprite_rects.keys())
@@ -186,14 +203,21 @@ class SpriteAtlas:
 
         self.sliced[name] = SlicedImage(slice_img, slice_size)
 
+    def defer(self, kind, name, initializer, *args, **kwargs):
+        """Puts off initializer(*args, **kwargs), which initializes the static, animation or sliced image (kind)
+        called name, until that name is first loaded. Assets that are never used are then never made"""
+        assert kind in (SpriteAtlas.STATIC, SpriteAtlas.ANIMATION, SpriteAtlas.SLICED)
+
+        self._deferred[(kind, name)] = (initializer, args, kwargs)
+
     def load_static(self, name):
-        return copy.copy(self._fetch(name, self.statics))
+        return copy.copy(self._fetch(name, self.statics, SpriteAtlas.STATIC))
 
     def load_animation(self, name):
-        return copy.copy(self._fetch(name, self.animations))
+        return copy.copy(self._fetch(name, self.animations, SpriteAtlas.ANIMATION))
 
     def load_sliced(self, name):
-        return copy.copy(self._fetch(name, self.sliced))
+        return copy.copy(self._fetch(name, self.sliced, SpriteAtlas.SLICED))
 
     def __add__(self, other):
         assert other is not self, "adding atlas to itself makes no sense"
@@ -224,7 +248,8 @@ class SpriteAtlas:
         for new_d, our_d, other_d in [(new_atlas.sprite_rects, self.sprite_rects, other.sprite_rects),
                                       (new_atlas.statics, self.statics, other.statics),
                                       (new_atlas.animations, self.animations, other.animations),
-                                      (new_atlas.sliced, self.sliced, other.sliced)]:
+                                      (new_atlas.sliced, self.sliced, other.sliced),
+                                      (new_atlas._deferred, self._deferred, other._deferred)]:
             new_d.update(our_d)
             new_d.update(other_d)
 
@@ -255,10 +280,19 @@ class SpriteAtlas:
                              rect.width * new_size[0], rect.height * new_size[1])
             self.sprite_rects[name] = nr
 
-    @staticmethod
-    def _fetch(name, location):
+    def _fetch(self, name, location, kind=None):
         name = name.strip()
 
+        if name not in location and (kind, name) in self._deferred:
+            # the prefetch thread could be initializing this very name right now; wait for it instead of finding
+            # the name neither deferred nor initialized
+            with self._deferred_lock:
+                if name not in location and (kind, name) in self._deferred:
+                    initializer, args, kwargs = self._deferred[(kind, name)]
+                    initializer(*args, **kwargs)
+
+                    del self._deferred[(kind, name)]  # only now it's worked, so a failure is retried next time
+
         if name not in location:
             print("could not find sprite '{}' in atlas".format(name))
             raise SpriteNotFoundError(name)
@@ -1,67 +1,157 @@
+from array import array
+from collections import OrderedDict, namedtuple
+import pygame
+from profiler import profiled
 import config
 
+TileMapSnapshot = namedtuple("TileMapSnapshot", ["width", "height", "tile_indices", "passable_grid"])
+
 
 class TileMap:
+    """Tile indices and passability are stored in packed, row-major arrays (index = y * width + x) so that
+    collision code can index them directly. Empty tiles are stored as NO_TILE.
+
+    Tiles are drawn from chunks of CHUNK_TILES x CHUNK_TILES tiles, each prerendered into its own surface the first
+    time it's seen and kept until config.tile_chunk_cache more recently drawn chunks push it out. set_tile (or
+    writing idx through a MapSquare) throws away the one chunk the tile is in; resizing or loading a map throws away
+    all of them.
+
+    The packed arrays can be shared with snapshots (and the values a map was loaded from), so every write goes through
+    _own first, which copies them if they're shared"""
+    NO_TILE = -1
+    CHUNK_TILES = 16
+
     class MapSquare:
-        __slots__ = ['passable', 'idx']
+        """Compatibility view of a single map square. Reads and writes go straight through to the packed arrays
+        of the owning TileMap"""
+        __slots__ = ['_tile_map', '_offset']
+
+        def __init__(self, tile_map, tile_position):
+            assert tile_map.is_in_bounds(tile_position)
 
-        def __init__(self, idx=None, passable=True):
+            self._tile_map = tile_map
+            self._offset = tile_position[1] * tile_map.width + tile_position[0]
+
+        @property
+        def idx(self):
+            idx = self._tile_map.tile_indices[self._offset]
+
+            return None if idx == TileMap.NO_TILE else idx
+
+        @idx.setter
+        def idx(self, idx):
             assert isinstance(idx, int) or idx is None
 
-            self.idx = idx
-            self.passable = passable
+            tile_map = self._tile_map
+            tile_map._own()
 
-        def serialize(self):
-            values = {}
+            tile_map.tile_indices[self._offset] = TileMap.NO_TILE if idx is None else idx
+            tile_map._invalidate_chunk(self._offset % tile_map.width, self._offset // tile_map.width)
 
-            if self.idx is not None:
-                values['idx'] = str(self.idx)
+        @property
+        def passable(self):
+            return self._tile_map.passable_grid[self._offset] != 0
 
-            if not self.passable:
-                values['passable'] = str(self.passable)
+        @passable.setter
+        def passable(self, tf):
+            self._tile_map._own()
+            self._tile_map.passable_grid[self._offset] = 1 if tf else 0
+            self._tile_map.passable_revision += 1
 
-            return values
+        def serialize(self):
+            return TileMap._serialize_square(self.idx, self.passable)
 
         def deserialize(self, values):
-            if 'idx' in values:
-                self.idx = int(values['idx'])
-            else:
-                self.idx = None
-
-            if 'passable' in values:
-                self.passable = False
-            else:
-                self.passable = True
+            self.idx, self.passable = TileMap._deserialize_square(values)
 
     def __init__(self, map_size, tileset):
-        self.tile_map = []
         self.tileset = tileset
         self.width, self.height = map_size
 
+        self.tile_indices = array('h')
+        self.passable_grid = bytearray()
+        self._shared = False  # the arrays belong to a snapshot as well, and must be copied before writing
+        self.passable_revision = 0  # goes up whenever passability changes, for ColliderManager.begin_world_step
+
+        self.revision = 0  # goes up whenever any tile changes, so whatever caches the drawn map can tell
+        self._chunks = OrderedDict()  # (chunk x, chunk y) -> surface, or None if it has no tiles; oldest first
+        self._prebaked = False
+
         self._create_map()
 
     def _create_map(self):
-        self.tile_map = []
+        count = self.width * self.height
 
-        for _ in range(self.width):
-            self.tile_map.append([TileMap.MapSquare() for _ in range(self.height)])
+        self.tile_indices = array('h', [TileMap.NO_TILE]) * count
+        self.passable_grid = bytearray(b'\x01') * count
+        self._shared = False
+        self.passable_revision += 1
+
+        self._chunks.clear()
+        self._prebaked = False
+        self.revision += 1
 
     def resize(self, new_width, new_height):
         assert 1 <= new_width < 2000
         assert 1 <= new_height < 2000
 
-        old_map = self.tile_map
+        old_indices, old_passable = self.tile_indices, self.passable_grid
         old_width, old_height = self.width, self.height
 
         self.width, self.height = new_width, new_height
 
         self._create_map()
 
-        # copy old map to new map
+        # copy old map to new map, a row at a time
+        copy_width = min(old_width, new_width)
+
         for y in range(min(old_height, new_height)):
-            for x in range(min(old_width, new_width)):
-                self.set_passable((x, y), old_map[x][y].passable)
-                self.set_tile((x, y), old_map[x][y].idx)
+            src, dst = y * old_width, y * new_width
+
+            self.tile_indices[dst:dst + copy_width] = old_indices[src:src + copy_width]
+            self.passable_grid[dst:dst + copy_width] = old_passable[src:src + copy_width]
+
+    def snapshot(self):
+        """The tile grid as it is now, for restore. Nothing is copied; the arrays are shared with the snapshot until
+        either is written to"""
+        self._shared = True
+
+        return TileMapSnapshot(self.width, self.height, self.tile_indices, self.passable_grid)
+
+    def restore(self, snapshot):
+        """Puts the tile grid back the way it was in snapshot (which may come from another map). Only the prerendered
+        chunks whose tiles differ are thrown away"""
+        if (snapshot.width, snapshot.height) != (self.width, self.height):
+            self.width, self.height = snapshot.width, snapshot.height
+            self._chunks.clear()
+            self._prebaked = False
+        elif snapshot.tile_indices is not self.tile_indices:
+            self._invalidate_changed_chunks(snapshot.tile_indices)
+        elif snapshot.passable_grid is self.passable_grid:
+            return  # nothing has been written since
+
+        self.tile_indices, self.passable_grid = snapshot.tile_indices, snapshot.passable_grid
+        self._shared = True
+        self.revision += 1
+        self.passable_revision += 1
+
+    def _invalidate_changed_chunks(self, tile_indices):
+        # only chunks that are actually cached need checking, a row of tiles at a time
+        current, width, size = self.tile_indices, self.width, TileMap.CHUNK_TILES
+
+        for cx, cy in list(self._chunks):
+            left, right = cx * size, min(width, (cx + 1) * size)
+
+            for y in range(cy * size, min(self.height, (cy + 1) * size)):
+                if current[y * width + left:y * width + right] != tile_indices[y * width + left:y * width + right]:
+                    del self._chunks[(cx, cy)]
+                    break
+
+    def _own(self):
+        if self._shared:
+            self.tile_indices = array('h', self.tile_indices)
+            self.passable_grid = bytearray(self.passable_grid)
+            self._shared = False
 
     def view_region_to_tile_region(self, view_region):
         # converts a viewing rectangle into visible tile coordinates
@@ -75,7 +165,36 @@ class TileMap:
 
         return x_min, y_min, x_max, y_max
 
+    @profiled("TileMap.draw")
     def draw(self, screen, view_region):
+        if config.tile_chunk_cache <= 0:
+            self._draw_tiles(screen, view_region)
+            return
+
+        if self.width == 0 or self.height == 0:
+            return
+
+        tw, th = self.tileset.tile_size
+        chunk_width, chunk_height = TileMap.CHUNK_TILES * tw, TileMap.CHUNK_TILES * th
+        last_cx, last_cy = (self.width - 1) // TileMap.CHUNK_TILES, (self.height - 1) // TileMap.CHUNK_TILES
+
+        left, top = int(view_region.left), int(view_region.top)
+        cx_min, cx_max = max(0, left // chunk_width), min(last_cx, (int(view_region.right) - 1) // chunk_width)
+        cy_min, cy_max = max(0, top // chunk_height), min(last_cy, (int(view_region.bottom) - 1) // chunk_height)
+
+        for cy in range(cy_min, cy_max + 1):
+            for cx in range(cx_min, cx_max + 1):
+                surface = self._get_chunk(cx, cy)
+
+                if surface is not None:
+                    screen.blit(surface, (cx * chunk_width - left, cy * chunk_height - top))
+
+        # evicting after drawing means every chunk on screen was just moved to the back, out of harm's way
+        if not self._prebaked:
+            while len(self._chunks) > config.tile_chunk_cache:
+                self._chunks.popitem(last=False)
+
+    def _draw_tiles(self, screen, view_region):
         # avoid drawing entire map by determining the subset of tiles visible in the given region
         tw, th = self.tileset.tile_size
         x_min, y_min, x_max, y_max = self.view_region_to_tile_region(view_region)
@@ -83,34 +202,104 @@ class TileMap:
         x_offset = -view_region.x
         y_offset = -view_region.y
 
+        tile_indices = self.tile_indices
+        width = self.width
+
         for y in range(y_min, y_max):
+            row = y * width
+
             for x in range(x_min, x_max):
+                idx = tile_indices[row + x]
+
+                if idx != TileMap.NO_TILE:
+                    self.tileset.blit(screen, (x * tw + x_offset, y * th + y_offset), idx)
 
-                tile = self.tile_map[x][y]
+    def _get_chunk(self, cx, cy):
+        key = cx, cy
+        chunks = self._chunks
 
-                if tile.idx is not None:
-                    self.tileset.blit(screen, (x * tw + x_offset, y * th + y_offset), tile.idx)
+        if key in chunks:
+            chunks.move_to_end(key)
+            return chunks[key]
+
+        surface = chunks[key] = self._render_chunk(cx, cy)
+
+        return surface
+
+    def _render_chunk(self, cx, cy):
+        tw, th = self.tileset.tile_size
+        x_min, y_min = cx * TileMap.CHUNK_TILES, cy * TileMap.CHUNK_TILES
+        x_max, y_max = min(self.width, x_min + TileMap.CHUNK_TILES), min(self.height, y_min + TileMap.CHUNK_TILES)
+
+        tile_indices = self.tile_indices
+        width = self.width
+        surface = None
+
+        for y in range(y_min, y_max):
+            row = y * width
+
+            for x in range(x_min, x_max):
+                idx = tile_indices[row + x]
+
+                if idx == TileMap.NO_TILE:
+                    continue
+
+                if surface is None:
+                    # same pixel format as the tiles; anything no tile covers stays transparent
+                    surface = pygame.Surface(((x_max - x_min) * tw, (y_max - y_min) * th), 0, self.tileset.surface)
+                    surface.fill(config.transparent_color)
+
+                self.tileset.blit(surface, ((x - x_min) * tw, (y - y_min) * th), idx)
+
+        if surface is not None:
+            surface.set_colorkey(config.transparent_color, pygame.RLEACCEL)
+
+        return surface
+
+    def _invalidate_chunk(self, x, y):
+        self.revision += 1
+        self._chunks.pop((x // TileMap.CHUNK_TILES, y // TileMap.CHUNK_TILES), None)
+
+    def prebake(self):
+        """Renders every chunk of the map now, and keeps them all until the map is resized or loaded again"""
+        for cy in range((self.height + TileMap.CHUNK_TILES - 1) // TileMap.CHUNK_TILES):
+            for cx in range((self.width + TileMap.CHUNK_TILES - 1) // TileMap.CHUNK_TILES):
+                self._get_chunk(cx, cy)
+
+        self._prebaked = True
 
     def update(self, dt):
         pass  # todo: update tileset tiles? need a load_shared or similar in sprite atlas
 
     def set_tile(self, tile_position, idx):
-        assert 0 <= tile_position[0] <= self.width
-        assert 0 <= tile_position[1] <= self.height
+        assert self.is_in_bounds(tile_position)
+        assert isinstance(idx, int) or idx is None
 
-        self.tile_map[tile_position[0]][tile_position[1]].idx = idx
+        self._own()
+        self.tile_indices[tile_position[1] * self.width + tile_position[0]] = TileMap.NO_TILE if idx is None else idx
+        self._invalidate_chunk(*tile_position)
+
+    def get_tile(self, tile_position):
+        assert self.is_in_bounds(tile_position)
+
+        idx = self.tile_indices[tile_position[1] * self.width + tile_position[0]]
+
+        return None if idx == TileMap.NO_TILE else idx
 
     def set_passable(self, tile_position, passable):
-        assert 0 <= tile_position[0] < self.width
-        assert 0 <= tile_position[1] < self.height
+        assert self.is_in_bounds(tile_position)
 
-        self.tile_map[tile_position[0]][tile_position[1]].passable = passable
+        self._own()
+        self.passable_grid[tile_position[1] * self.width + tile_position[0]] = 1 if passable else 0
+        self.passable_revision += 1
 
     def get_passable(self, tile_position):
-        assert 0 <= tile_position[0] <= self.width
-        assert 0 <= tile_position[1] <= self.height
+        assert self.is_in_bounds(tile_position)
+
+        return self.passable_grid[tile_position[1] * self.width + tile_position[0]] != 0
 
-        return self.tile_map[tile_position[0]][tile_position[1]].passable
+    def get_square(self, tile_position):
+        return TileMap.MapSquare(self, tile_position)
 
     def clip_to_bounds(self, tile_coords):
         tx = min(max(tile_coords[0], 0), self.width - 1)
@@ -130,9 +319,24 @@ class TileMap:
         return self.tileset.tile_height
 
     def serialize(self):
+        # note: on disk, squares are stored column by column
+        tile_indices, passable_grid, width = self.tile_indices, self.passable_grid, self.width
+
+        def square(offset):
+            idx = tile_indices[offset]
+
+            return TileMap._serialize_square(None if idx == TileMap.NO_TILE else idx, passable_grid[offset] != 0)
+
         return {"width": self.width,
                 "height": self.height,
-                "tile_map": [self.tile_map[x][y].serialize() for x in range(self.width) for y in range(self.height)]}
+                "tile_map": [square(y * width + x) for x in range(self.width) for y in range(self.height)]}
+
+    def serialize_packed(self):
+        """Same as serialize, but with the tile grid as copies of the packed arrays (see level_file)"""
+        return {"width": self.width,
+                "height": self.height,
+                "tile_indices": array('h', self.tile_indices),
+                "passable": bytearray(self.passable_grid)}
 
     def deserialize(self, values):
         self.width = int(values['width'])
@@ -141,13 +345,62 @@ class TileMap:
         assert self.width >= 0
         assert self.height >= 0
 
+        if "tile_indices" in values:
+            self._deserialize_packed(values)
+        else:
+            self._create_map()
+            self._deserialize_squares(values)
+
+        if config.prebake_tile_chunks and config.tile_chunk_cache > 0:
+            self.prebake()
+
+    def _deserialize_packed(self, values):
+        count = self.width * self.height
+
+        assert len(values["tile_indices"]) == count
+        assert len(values["passable"]) == count
+
+        # the packed grid is already laid out the way we store it, so it's shared with the values until written to
         self._create_map()
+        self.tile_indices = values["tile_indices"]
+        self.passable_grid = values["passable"]
+        self._shared = True
+
+    def _deserialize_squares(self, values):
 
         tiles = values["tile_map"]  # type: list
+        tile_indices, passable_grid, width, height = self.tile_indices, self.passable_grid, self.width, self.height
+
+        for i, square_values in enumerate(tiles[:width * height]):
+            x, y = divmod(i, height)
+            offset = y * width + x
+
+            idx, passable = TileMap._deserialize_square(square_values)
+
+            if idx is not None:
+                tile_indices[offset] = idx
+
+            if not passable:
+                passable_grid[offset] = 0
+
+    @staticmethod
+    def _serialize_square(idx, passable):
+        values = {}
+
+        if idx is not None:
+            values['idx'] = str(idx)
+
+        if not passable:
+            values['passable'] = str(passable)
+
+        return values
+
+    @staticmethod
+    def _deserialize_square(values):
+        idx = int(values['idx']) if 'idx' in values else None
+        passable = 'passable' not in values
 
-        for x in range(self.width):
-            for y in range(self.height):
-                self.tile_map[x][y].deserialize(tiles.pop(0))
+        return idx, passable
 
     @property
     def width_pixels(self):
@@ -1,5 +1,6 @@
 import os
 import pygame
+from . import image_cache
 import config
 
 
@@ -10,11 +11,18 @@ class TileSet:
 
         self.path = path
 
-        self.surface = pygame.image.load(path)
-        self.surface = pygame.transform.scale(self.surface,
-                                              (self.surface.get_width() * config.rescale_factor,
-                                               self.surface.get_height() * config.rescale_factor))\
-            .convert(pygame.display.get_surface())
+        cached = image_cache.read(path, [path], config.rescale_factor)
+
+        if cached is not None:
+            self.surface = cached[0]
+        else:
+            self.surface = pygame.image.load(path)
+            self.surface = pygame.transform.scale(self.surface,
+                                                  (self.surface.get_width() * config.rescale_factor,
+                                                   self.surface.get_height() * config.rescale_factor))
+            image_cache.write(path, [path], config.rescale_factor, self.surface)
+
+        self.surface = self.surface.convert(pygame.display.get_surface())
 
         self.surface.set_colorkey(config.transparent_color)
 
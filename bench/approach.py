@@ -0,0 +1,84 @@
+"""Compares ColliderManager.iterative_move (bisection) against ColliderManager.sweep (time of impact) for colliders
+falling onto the ground of a shipped level.
+
+Run from the repository root:
+
+    python -m bench.approach [level file]
+
+Reports the time per landing and how far above the ground each method leaves the collider."""
+import argparse
+import os
+import time
+from pygame import Rect
+import state  # noqa: F401 -- import order matters: pulls in the full entity graph before entities.collider
+from bench.util import BenchEntity, create_display
+from assets.tileset import TileSet
+from assets.tile_map import TileMap
+import level_file
+from entities.collider import Collider, ColliderManager
+from util import make_vector
+import constants
+
+
+def _landings(tile_map, fall_distance):
+    # for every column with ground in it, a drop from a little above the topmost impassable square
+    drops = []
+    tw, th = tile_map.tile_width, tile_map.tile_height
+
+    for x in range(tile_map.width):
+        for y in range(1, tile_map.height):
+            if not tile_map.get_passable((x, y)):
+                ground = y * th
+                start = make_vector(x * tw, ground - 32 - fall_distance * 0.75)
+                drops.append((start, start + make_vector(0, fall_distance), ground))
+                break
+
+    return drops
+
+
+def run(tile_map, method, fall_distance, repeats):
+    manager = ColliderManager(tile_map)
+    collider = Collider(BenchEntity(), manager, constants.Block, make_vector(0, 0), Rect(0, 0, 32, 32),
+                        constants.Enemy)
+
+    drops = _landings(tile_map, fall_distance)
+    gap = 0.
+
+    start_time = time.perf_counter()
+
+    for _ in range(repeats):
+        for start, target, ground in drops:
+            collider.position = start
+            method(manager, collider, target)
+
+            gap += ground - collider.rect.bottom
+
+    elapsed = time.perf_counter() - start_time
+    landings = len(drops) * repeats
+
+    return elapsed, landings, gap / max(landings, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("level", nargs="?", default=os.path.join("levels", "level-1-1.level"))
+    parser.add_argument("--fall", type=float, default=24., help="pixels fallen in one physics step")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    create_display()
+
+    tile_map = TileMap((1, 1), TileSet("images/tiles.png"))
+
+    tile_map.deserialize(level_file.read(args.level)["tile_map"])
+
+    methods = [("bisection", ColliderManager.iterative_move), ("sweep", ColliderManager.sweep)]
+
+    for name, method in methods:
+        elapsed, landings, gap = run(tile_map, method, args.fall, args.repeats)
+
+        print(f"{name:>10}: {elapsed * 1e6 / landings:8.2f} us/landing, average gap above ground {gap:.2f}px")
+
+
+if __name__ == "__main__":
+    main()
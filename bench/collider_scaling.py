@@ -0,0 +1,94 @@
+"""Measures how the per-step cost of ColliderManager.move grows with the number of registered colliders.
+
+Run from the repository root:
+
+    python -m bench.collider_scaling
+
+Colliders are scattered along a long strip of level and each one is moved a little every step, the same way
+SimpleMovement moves enemies. World (tile) collisions are left out so only collider-vs-collider cost is measured.
+Pass --verify to check every query against a brute force scan of all registered colliders."""
+import argparse
+import random
+import time
+from pygame import Rect
+import state  # noqa: F401 -- import order matters: pulls in the full entity graph before entities.collider
+from bench.util import BenchEntity
+from entities.collider import Collider, ColliderManager
+from util import make_vector
+import constants
+
+
+def _create_colliders(manager, count, level_width, level_height, rng):
+    colliders = []
+
+    for _ in range(count):
+        position = make_vector(rng.uniform(0, level_width), rng.uniform(0, level_height))
+        collider = Collider(BenchEntity(), manager, constants.Enemy | constants.Mario, position,
+                            Rect(0, 0, 32, 32), constants.Enemy)
+        collider.position = position
+
+        manager.register(collider)
+        colliders.append(collider)
+
+    return colliders
+
+
+def _brute_force(manager, collider):
+    return {c for c in manager.colliders()
+            if c is not collider and (collider.mask & c.layer) != 0 and collider.rect.colliderect(c.rect)}
+
+
+def run(count, steps, verify, seed=0):
+    rng = random.Random(seed)
+
+    # keep entity density constant, like a longer level with more things on it
+    level_width, level_height = count * 64, 15 * 32
+
+    manager = ColliderManager(tile_map=None)
+    colliders = _create_colliders(manager, count, level_width, level_height, rng)
+    velocities = [make_vector(rng.choice([-1., 1.]) * 2., 0.) for _ in colliders]
+
+    queries = 0
+    hits = 0
+    start = time.perf_counter()
+
+    for _ in range(steps):
+        for collider, vel in zip(colliders, velocities):
+            target = collider.position + vel
+
+            if not 0 <= target.x <= level_width:
+                vel.x = -vel.x
+                continue
+
+            collisions = collider.try_move(target)
+            queries += 1
+            hits += len(collisions)
+
+            if verify:
+                collider.move(target)
+                expected = _brute_force(manager, collider)
+                assert {c.hit_collider for c in collisions} == expected, "broadphase missed or invented a collision"
+                collider.position = target - vel if collisions else target
+
+    elapsed = time.perf_counter() - start
+
+    return elapsed, queries, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=240, help="physics steps per run")
+    parser.add_argument("--counts", type=int, nargs="+", default=[25, 50, 100, 200, 400, 800, 1600])
+    parser.add_argument("--verify", action="store_true", help="compare against a brute force scan")
+    args = parser.parse_args()
+
+    print(f"{'colliders':>10} {'ms/step':>10} {'us/query':>10} {'hits':>8}")
+
+    for count in args.counts:
+        elapsed, queries, hits = run(count, args.steps, args.verify)
+
+        print(f"{count:>10} {elapsed * 1000. / args.steps:>10.3f} {elapsed * 1e6 / max(queries, 1):>10.2f} {hits:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measures EntityManager.search_by_type and get_entities_inside_region on levels with many placed entities.
+
+Run from the repository root:
+
+    python -m bench.entity_queries
+
+Entities of a handful of types are spread along a synthetic level at constant density. One spawn point is placed
+per screen, so type lookups return a small fraction of all entities, the way Level._find_spawn_point does. Region
+queries are a single tile, like the editor's delete tool. The scan columns show the cost of looking at every
+registered entity instead."""
+import argparse
+import random
+import time
+from pygame import Rect
+import state  # noqa: F401 -- import order matters: pulls in the full entity graph before entities.entity_manager
+from bench.util import DriftingEntity
+from entities.entity_manager import EntityManager
+from util import make_vector
+import config
+
+
+class _Placed(DriftingEntity):
+    pass
+
+
+class _SpawnPoint(DriftingEntity):
+    pass
+
+
+class _OtherPlaced(_Placed):
+    pass
+
+
+def _scan_by_type(manager, cls):
+    return [entity for layer in manager.layers for entity in manager.layers[layer] if isinstance(entity, cls)]
+
+
+def _scan_region(manager, rect):
+    return [entity for layer in manager.layers for entity in manager.layers[layer]
+            if rect.collidepoint(*entity.position) or rect.colliderect(entity.rect)]
+
+
+def _time(fn, args_list):
+    start = time.perf_counter()
+
+    for args in args_list:
+        fn(*args)
+
+    return (time.perf_counter() - start) * 1e6 / len(args_list)
+
+
+def run(screens, per_screen, queries, seed=0):
+    rng = random.Random(seed)
+    screen = config.screen_rect
+    level_width = screens * screen.width
+
+    manager = EntityManager.create_default()
+
+    for _ in range(screens * per_screen):
+        cls = rng.choice([_Placed, _OtherPlaced])
+        manager.register(cls(make_vector(rng.uniform(0, level_width), rng.uniform(0, screen.height)), 0.))
+
+    for i in range(screens):
+        manager.register(_SpawnPoint(make_vector(i * screen.width, 0), 0.))
+
+    regions = [(Rect(rng.randrange(0, level_width, 32), rng.randrange(0, screen.height, 32), 32, 32),)
+               for _ in range(queries)]
+
+    # the first call folds the new registrations into the indices; leave that out of the timings
+    manager.get_entities_inside_region(regions[0][0])
+
+    type_queries = [(_SpawnPoint,)] * queries
+
+    return (manager.search_by_type(_SpawnPoint), _time(manager.search_by_type, type_queries),
+            _time(lambda cls: _scan_by_type(manager, cls), type_queries),
+            _time(manager.get_entities_inside_region, regions),
+            _time(lambda rect: _scan_region(manager, rect), regions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200, help="queries of each kind per run")
+    parser.add_argument("--per-screen", type=int, default=20, help="entities per screen width of level")
+    parser.add_argument("--screens", type=int, nargs="+", default=[4, 16, 64, 256])
+    args = parser.parse_args()
+
+    print(f"{'entities':>9} {'found':>6} {'type us':>9} {'scan us':>9} {'region us':>10} {'scan us':>9}")
+
+    for screens in args.screens:
+        found, by_type, type_scan, region, region_scan = run(screens, args.per_screen, args.queries)
+
+        print(f"{screens * (args.per_screen + 1):>9} {len(found):>6} {by_type:>9.1f} {type_scan:>9.1f} "
+              f"{region:>10.1f} {region_scan:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
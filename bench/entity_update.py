@@ -0,0 +1,86 @@
+"""Measures the cost of EntityManager.update and draw as a level gets longer.
+
+Run from the repository root:
+
+    python -m bench.entity_update
+
+Entities are spread along a synthetic level at constant density, so a longer level simply has more entities,
+almost all of them far outside the view. Every entity drifts back and forth a little each step (like patrolling
+enemies) so the spatial index keeps being updated. Only entities near the view should be touched; the reference
+column shows what a scan over every registered entity costs for the same level."""
+import argparse
+import random
+import time
+import state  # noqa: F401 -- import order matters: pulls in the full entity graph before entities.entity_manager
+from bench.util import DriftingEntity
+from entities.entity_manager import EntityManager
+from util import make_vector
+import config
+
+
+def _reference_scan(manager, view_rect):
+    # what EntityManager.update used to do: look at the position of every registered entity
+    offscreen_range = view_rect.width * (EntityManager.ENTITY_UPDATE_RANGE_MULTIPLIER - 1)
+    minx, maxx = view_rect.left - offscreen_range, view_rect.right + offscreen_range
+    touched = 0
+
+    for layer in manager.update_ordering:
+        for entity in list(manager.layers[layer]):
+            if minx <= entity.position.x <= maxx:
+                touched += 1
+
+    return touched
+
+
+def run(screens, per_screen, steps, seed=0):
+    rng = random.Random(seed)
+    view_rect = config.screen_rect.copy()
+    view_rect.x = view_rect.width  # a little way into the level, with entities on both sides of the view
+
+    manager = EntityManager.create_default()
+    level_width = screens * view_rect.width
+
+    entities = [DriftingEntity(make_vector(rng.uniform(0, level_width), rng.uniform(0, view_rect.height)),
+                               rng.choice([-30., 30.]))
+                for _ in range(screens * per_screen)]
+
+    manager.register(entities)
+
+    start = time.perf_counter()
+
+    for _ in range(steps):
+        manager.update(config.PHYSICS_DT, view_rect)
+        manager.draw(None, view_rect)
+
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+
+    for _ in range(steps):
+        _reference_scan(manager, view_rect)
+
+    reference = time.perf_counter() - start
+
+    touched = sum(1 for e in entities if e.updates > 0)
+
+    return len(entities), elapsed, reference, touched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=240, help="update + draw steps per run")
+    parser.add_argument("--per-screen", type=int, default=20, help="entities per screen width of level")
+    parser.add_argument("--screens", type=int, nargs="+", default=[4, 16, 64, 256, 1024])
+    args = parser.parse_args()
+
+    print(f"{'screens':>8} {'entities':>9} {'touched':>8} {'us/step':>10} {'scan us/step':>13}")
+
+    for screens in args.screens:
+        count, elapsed, reference, touched = run(screens, args.per_screen, args.steps)
+
+        print(f"{screens:>8} {count:>9} {touched:>8} {elapsed * 1e6 / args.steps:>10.1f} "
+              f"{reference * 1e6 / args.steps:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Plays every shipped level headless with scripted input and measures what a step of the game costs.
+
+Run from the repository root:
+
+    python -m bench.levels [level files] [--seconds 20] [--save bench/baselines/levels.json]
+    python -m bench.levels --compare bench/baselines/levels.json
+
+Each level is played twice with the same seed and input, so both runs are identical. The timed run updates the
+level at the fixed physics rate and draws it to an offscreen surface after every step, giving updates/sec and
+draws/sec. The counting run has profiling zones and tracemalloc on (both slow the game down a lot, so nothing is
+timed): it counts ColliderManager.move calls per step, the memory a step allocates on top of what it started with,
+and the peak memory of loading and playing the level. Levels end early if Mario dies or clears them; a level that
+fails to load or play is reported (and saved) with an "error" outcome, and the rest are still played."""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+import pygame
+import state  # noqa: F401 -- import order matters: pulls in the full entity graph before entities.*
+from bench.util import save_baseline, load_baseline, compare_to_baseline
+from headless import HeadlessSession, init_headless
+from assets import AssetManager
+from profiler import profiler
+import config
+
+METRICS = [("updates_per_sec", True), ("draws_per_sec", True), ("collisions_per_step", False),
+           ("alloc_kib_per_step", False), ("peak_mib", False)]
+
+
+def run_and_jump(step_index, player_input):
+    """Input script that runs right and jumps for a third of every second, enough to get some way into most levels"""
+    player_input.right = True
+    player_input.dash = True
+    player_input.jump = step_index % config.physics_rate < config.physics_rate // 3
+
+
+def _timed_run(level_path, steps, assets):
+    session = HeadlessSession(level_path, assets, run_and_jump, seed=0)
+    screen = pygame.Surface(config.screen_rect.size)
+
+    update_time, draw_time, draws = 0., 0., 0
+
+    while session.steps_taken < steps and not session.finished:
+        start = time.perf_counter()
+        session.step()
+        update_time += time.perf_counter() - start
+
+        if session.state_stack.top is None:
+            break
+
+        start = time.perf_counter()
+        session.state_stack.draw(screen)
+        draw_time += time.perf_counter() - start
+        draws += 1
+
+    return session, update_time, draw_time, draws
+
+
+def _counting_run(level_path, steps, assets):
+    profiler.clear()
+    profiler.enabled = True
+    tracemalloc.start()
+
+    try:
+        session = HeadlessSession(level_path, assets, run_and_jump, seed=0)
+        peak = tracemalloc.get_traced_memory()[1]
+        allocated = 0
+
+        while session.steps_taken < steps and not session.finished:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+
+            session.step()
+
+            step_peak = tracemalloc.get_traced_memory()[1]
+            allocated += step_peak - before
+            peak = max(peak, step_peak)
+
+        collisions = profiler.totals.count_calls("ColliderManager.move")
+
+        return session.steps_taken, collisions, allocated, peak
+    finally:
+        tracemalloc.stop()
+        profiler.enabled = config.profile_zones
+        profiler.clear()
+
+
+def run(level_path, seconds, assets):
+    steps = int(seconds * config.physics_rate)
+
+    session, update_time, draw_time, draws = _timed_run(level_path, steps, assets)
+    counted_steps, collisions, allocated, peak = _counting_run(level_path, steps, assets)
+
+    return {"steps": session.steps_taken,
+            "outcome": session.outcome or "running",
+            "updates_per_sec": session.steps_taken / max(update_time, 1e-9),
+            "draws_per_sec": draws / max(draw_time, 1e-9),
+            "collisions_per_step": collisions / max(1, counted_steps),
+            "alloc_kib_per_step": allocated / 1024. / max(1, counted_steps),
+            "peak_mib": peak / 1024. / 1024.,
+            "game_seconds": session.steps_taken / config.physics_rate}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("levels", nargs="*", help="level files to play; every level in levels/ if none are given")
+    parser.add_argument("--seconds", type=float, default=20., help="game time to play each level for")
+    parser.add_argument("--save", metavar="PATH", help="write the results to PATH as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results against a saved baseline")
+    args = parser.parse_args()
+
+    levels = args.levels or sorted(glob.glob(os.path.join("levels", "*.level")))
+
+    # assets are loaded once and shared by every run; they need the display to exist first
+    init_headless()
+    assets = AssetManager()
+    results = {}
+
+    print(f"{'level':<24} {'steps':>6} {'outcome':>10} {'updates/s':>10} {'draws/s':>9} {'coll/step':>10} "
+          f"{'KiB/step':>9} {'peak MiB':>9}")
+
+    for level_path in levels:
+        name = os.path.splitext(os.path.basename(level_path))[0]
+
+        try:
+            r = results[name] = run(level_path, args.seconds, assets)
+        except Exception as e:
+            # one broken level (a warp to a missing file, say) is that level's outcome, not the end of the suite
+            results[name] = {"outcome": "error", "error": f"{type(e).__name__}: {e}"}
+            print(f"{name:<24} {'':>6} {'error':>10} {results[name]['error']}")
+            continue
+
+        print(f"{name:<24} {r['steps']:>6} {r['outcome']:>10} {r['updates_per_sec']:>10.0f} "
+              f"{r['draws_per_sec']:>9.0f} {r['collisions_per_step']:>10.1f} {r['alloc_kib_per_step']:>9.2f} "
+              f"{r['peak_mib']:>9.2f}")
+
+    if args.compare:
+        print()
+        print("\n".join(compare_to_baseline(results, load_baseline(args.compare), METRICS)))
+
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"baseline written to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
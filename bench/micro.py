@@ -0,0 +1,146 @@
+"""Microbenchmarks for the pieces of a level that show up in most profiles: ColliderManager.move, TileMap.draw,
+SpriteAtlas loading, level deserialization and resetting a level to its snapshot.
+
+Run from the repository root:
+
+    python -m bench.micro [level file] [--save bench/baselines/micro.json] [--compare bench/baselines/micro.json]
+
+Moves and draws scroll across the whole map of the level, so they see open air, ground and walls alike. Atlas
+loading runs the same load functions AssetManager does (surface conversion and animation setup included), and
+deserialization loads the level from disk into a fresh Level each time."""
+import argparse
+import os
+import time
+import pygame
+from pygame import Rect
+import state  # noqa: F401 -- import order matters: pulls in the full entity graph before entities.*
+from bench.util import BenchEntity, save_baseline, load_baseline, compare_to_baseline
+from headless import init_headless, SilentLabels
+from assets import AssetManager
+from assets.load import load_character_atlas, load_pickup_atlas, load_interactive_atlas, load_misc_atlas, \
+    load_gui_atlas
+from assets.level import Level
+from assets.statistics import Statistics
+from assets.tile_map import TileMap
+import level_file
+from entities.collider import Collider, ColliderManager
+from entities.entity_manager import EntityManager
+from util import make_vector
+import config
+import constants
+
+METRICS = [("us_per_op", False)]
+
+
+def _time(fn, repeats):
+    start = time.perf_counter()
+
+    for _ in range(repeats):
+        fn()
+
+    return (time.perf_counter() - start) * 1e6 / repeats
+
+
+def bench_collider_move(tile_map, repeats):
+    manager = ColliderManager(tile_map)
+
+    # a few enemies standing around, so moves test against other colliders as well as the world
+    for x in range(0, tile_map.width_pixels, 256):
+        other = Collider(BenchEntity(), manager, constants.Block, make_vector(x, 0), Rect(x, 0, 32, 32),
+                         constants.Enemy)
+        manager.register(other)
+
+    collider = Collider(BenchEntity(), manager, constants.Block | constants.Enemy, make_vector(0, 0),
+                        Rect(0, 0, 32, 32), constants.Mario)
+    manager.register(collider)
+
+    positions = [make_vector(x, y)
+                 for y in range(0, tile_map.height_pixels, 13)
+                 for x in range(0, tile_map.width_pixels, 11)]
+
+    def sweep():
+        for pos in positions:
+            manager.move(collider, pos)
+
+    return _time(sweep, repeats) / len(positions)
+
+
+def bench_tile_map_draw(tile_map, repeats):
+    screen = pygame.Surface(config.screen_rect.size)
+    view_rect = config.screen_rect.copy()
+    lefts = range(0, max(1, tile_map.width_pixels - view_rect.width), 7)
+
+    def scroll():
+        for left in lefts:
+            view_rect.left = left
+            screen.fill(config.default_background_color)  # as Level.draw does
+            tile_map.draw(screen, view_rect)
+
+    return _time(scroll, repeats) / len(lefts)
+
+
+def bench_atlas_loading(repeats):
+    return {f"atlas_{fn.__name__[len('load_'):-len('_atlas')]}": _time(fn, repeats)
+            for fn in (load_character_atlas, load_pickup_atlas, load_interactive_atlas, load_misc_atlas,
+                       load_gui_atlas)}
+
+
+def bench_level_deserialize(level_path, assets, repeats):
+    stats = Statistics(SilentLabels())
+    stats.reset()
+
+    def load():
+        level = Level(assets, EntityManager.create_default(), stats)
+        level.load_from_path(level_path)
+
+    return _time(load, repeats)
+
+
+def bench_level_reset(level_path, assets, repeats):
+    stats = Statistics(SilentLabels())
+    stats.reset()
+
+    level = Level(assets, EntityManager.create_default(), stats)
+    level.load_from_path(level_path)
+
+    return _time(level.reset, repeats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("level", nargs="?", default=os.path.join("levels", "level-1-1.level"))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--save", metavar="PATH", help="write the results to PATH as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results against a saved baseline")
+    args = parser.parse_args()
+
+    init_headless()
+    assets = AssetManager()
+
+    tile_map = TileMap((1, 1), assets.tileset)
+    tile_map.deserialize(level_file.read(args.level)["tile_map"])
+
+    timings = {"collider_move": bench_collider_move(tile_map, args.repeats),
+               "tile_map_draw": bench_tile_map_draw(tile_map, args.repeats),
+               "level_deserialize": bench_level_deserialize(args.level, assets, args.repeats),
+               "level_reset": bench_level_reset(args.level, assets, args.repeats)}
+    timings.update(bench_atlas_loading(args.repeats))
+
+    results = {name: {"us_per_op": us} for name, us in timings.items()}
+
+    print(f"{args.level}: {tile_map.width}x{tile_map.height} tiles")
+
+    for name, us in timings.items():
+        print(f"{name:<24} {us:>12.2f} us/op")
+
+    if args.compare:
+        print()
+        print("\n".join(compare_to_baseline(results, load_baseline(args.compare), METRICS)))
+
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"baseline written to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
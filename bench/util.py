@@ -0,0 +1,82 @@
+import json
+import os
+import pygame
+from pygame import Rect
+from entities.entity import Entity
+from util import make_vector
+import constants
+
+
+class BenchEntity:
+    """Stand-in owner for colliders created by benchmarks"""
+    layer = constants.Enemy
+
+
+class DriftingEntity(Entity):
+    """Entity that moves a little every update and does nothing else"""
+    def __init__(self, position, speed):
+        super().__init__(Rect(0, 0, 32, 32))
+
+        self.position = position
+        self.speed = speed
+        self.updates = 0
+
+    def update(self, dt, view_rect):
+        self.updates += 1
+        self.position = make_vector(self.position.x + self.speed * dt, self.position.y)
+        self.speed = -self.speed if self.updates % 120 == 0 else self.speed
+
+    def draw(self, screen, view_rect):
+        pass
+
+    @property
+    def layer(self):
+        return constants.Enemy
+
+
+def create_display():
+    # some assets (TileSet, converted atlases) need a display surface to exist; it never needs to be visible
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+
+def save_baseline(path, results):
+    """Writes benchmark results (name -> {metric: value}) as JSON, to compare later runs against"""
+    directory = os.path.dirname(path)
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, 'r') as f:
+        return json.loads(f.read())
+
+
+def compare_to_baseline(results, baseline, metrics):
+    """Lines showing each metric next to its baseline value and the change in percent. metrics is a list of
+    (name, higher_is_better); changes for the worse are marked with a '!'"""
+    lines = []
+
+    for name, values in results.items():
+        if name not in baseline:
+            lines.append(f"{name}: not in baseline")
+            continue
+
+        for metric, higher_is_better in metrics:
+            old, new = baseline[name].get(metric), values.get(metric)
+
+            if old is None or new is None:
+                continue
+
+            change = (new - old) * 100. / old if old else 0.
+            worse = change < 0 if higher_is_better else change > 0
+
+            lines.append(f"{name:<24} {metric:<20} {old:>12.2f} -> {new:>12.2f} {change:>+8.1f}%"
+                         f"{' !' if worse else ''}")
+
+    return lines
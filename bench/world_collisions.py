@@ -0,0 +1,147 @@
+"""Measures ColliderManager.get_world_collisions against a shipped level, along with the memory held by the
+level's TileMap.
+
+Run from the repository root:
+
+    python -m bench.world_collisions [level file]
+
+Enemy-sized colliders are swept across the whole map, so the query mix includes open air, ground and walls. The
+same rects are then run through the batched ColliderManager.get_blocked_tiles, a physics step's worth at a time,
+and finally a population of walking enemies is stepped the way the game does it, with and without
+ColliderManager.begin_world_step feeding their world collisions."""
+import argparse
+import os
+import time
+import tracemalloc
+from array import array
+from pygame import Rect
+import state  # noqa: F401 -- import order matters: pulls in the full entity graph before entities.collider
+from bench.util import BenchEntity, create_display
+from assets.tileset import TileSet
+from assets.tile_map import TileMap
+import level_file
+from entities.collider import Collider, ColliderManager
+from util import make_vector
+import constants
+
+
+def measure_memory(tileset, values):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    if "tile_indices" in values:
+        # a packed map shares the arrays it's loaded from, which were allocated before measuring started: copy
+        # them here, so what the map holds on to is counted
+        values = dict(values, tile_indices=array('h', values["tile_indices"]), passable=bytearray(values["passable"]))
+
+    tile_map = TileMap((1, 1), tileset)
+    tile_map.deserialize(values)
+
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return tile_map, used
+
+
+def run(tile_map, repeats):
+    manager = ColliderManager(tile_map)
+    collider = Collider(BenchEntity(), manager, constants.Block, make_vector(0, 0), Rect(0, 0, 32, 32),
+                        constants.Enemy)
+
+    # sweep across the map in steps smaller than a tile, so most queries overlap 2-4 tiles
+    positions = [make_vector(x, y)
+                 for y in range(0, tile_map.height_pixels, 13)
+                 for x in range(0, tile_map.width_pixels, 11)]
+
+    queries, hits = 0, 0
+    start = time.perf_counter()
+
+    for _ in range(repeats):
+        for pos in positions:
+            collider.position = pos
+            hits += len(manager.get_world_collisions(collider))
+            queries += 1
+
+    return time.perf_counter() - start, queries, hits
+
+
+def run_batched(tile_map, repeats, batch_size):
+    manager = ColliderManager(tile_map)
+
+    rects = [Rect(x, y, 32, 32)
+             for y in range(0, tile_map.height_pixels, 13)
+             for x in range(0, tile_map.width_pixels, 11)]
+    batches = [rects[i:i + batch_size] for i in range(0, len(rects), batch_size)]
+
+    queries, hits = 0, 0
+    start = time.perf_counter()
+
+    for _ in range(repeats):
+        for batch in batches:
+            hits += sum(len(blocked) for blocked in manager.get_blocked_tiles(batch))
+            queries += len(batch)
+
+    return time.perf_counter() - start, queries, hits
+
+
+def run_stepped(tile_map, steps, population, batched):
+    manager = ColliderManager(tile_map)
+    entities, colliders = [], []
+
+    for i in range(population):
+        entity = BenchEntity()
+        entity.rect = Rect((i * 97) % tile_map.width_pixels, (i * 41) % tile_map.height_pixels, 32, 32)
+
+        entities.append(entity)
+        colliders.append(Collider(entity, manager, constants.Block, make_vector(*entity.rect.topleft),
+                                  Rect(0, 0, 32, 32), constants.Enemy))
+
+    queries, hits = 0, 0
+    start = time.perf_counter()
+
+    for step in range(steps):
+        if batched:
+            manager.begin_world_step(entities)
+
+        # every enemy moves a little within the step, as a walking one would
+        for entity, collider in zip(entities, colliders):
+            entity.rect.x = (entity.rect.x + 2) % tile_map.width_pixels
+            collider.position = make_vector(*entity.rect.topleft)
+            hits += len(manager.get_world_collisions(collider))
+            queries += 1
+
+    return time.perf_counter() - start, queries, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("level", nargs="?", default=os.path.join("levels", "level-1-1.level"))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=100, help="rects per batched query")
+    parser.add_argument("--population", type=int, default=100, help="enemies in the stepped run")
+    parser.add_argument("--steps", type=int, default=600, help="physics steps in the stepped run")
+    args = parser.parse_args()
+
+    create_display()
+    tileset = TileSet("images/tiles.png")
+
+    values = level_file.read(args.level)["tile_map"]
+
+    tile_map, used = measure_memory(tileset, values)
+    elapsed, queries, hits = run(tile_map, args.repeats)
+
+    print(f"{args.level}: {tile_map.width}x{tile_map.height} tiles")
+    print(f"tile map memory: {used / 1024.:.1f} KiB")
+    print(f"world queries:   {queries} in {elapsed:.3f}s ({elapsed * 1e6 / queries:.2f} us/query, {hits} hits)")
+
+    elapsed, queries, hits = run_batched(tile_map, args.repeats, args.batch_size)
+    print(f"batched queries: {queries} in {elapsed:.3f}s ({elapsed * 1e6 / queries:.2f} us/query, {hits} hits)")
+
+    for batched in (False, True):
+        elapsed, queries, hits = run_stepped(tile_map, args.steps, args.population, batched)
+        label = "stepped, batched:" if batched else "stepped:"
+        print(f"{label:<18}{queries} in {elapsed:.3f}s ({elapsed * 1e6 / queries:.2f} us/query, {hits} hits)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Whole-surface color transforms, for generating recolored variants of sprites (starman Mario, darkened GUI slices).
+
+With NumPy installed, every pixel of a surface is transformed in a handful of array operations through
+pygame.surfarray. Without it, the same thing is done a pixel at a time, which is far slower but gives the same
+result. Either way, generated variant sets are packed on disk by assets.image_cache so they're only ever made once"""
+import hashlib
+import pygame
+from assets import image_cache
+import config
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def scale_colors(surface, factor, color_key=config.transparent_color):
+    """Copy of surface with every color channel multiplied by factor (clamped to 0-255) and truncated, except for
+    pixels of color_key, which are left alone. The copy has the same pixel format, color key and alpha"""
+    result = surface.copy()
+
+    if numpy is not None and surface.get_bitsize() >= 24:
+        pixels = pygame.surfarray.array3d(surface)
+        keyed = numpy.all(pixels == tuple(pygame.Color(color_key))[:3], axis=2)
+
+        scaled = numpy.clip(pixels * float(factor), 0, 255).astype(numpy.uint8)
+        scaled[keyed] = pixels[keyed]
+
+        pygame.surfarray.blit_array(result, scaled)
+    else:
+        _scale_colors_per_pixel(result, factor, pygame.Color(color_key))
+
+    return result
+
+
+def _scale_colors_per_pixel(surface, factor, color_key):
+    with pygame.PixelArray(surface) as pixels:
+        for y in range(surface.get_height()):
+            for x in range(surface.get_width()):
+                clr = surface.unmap_rgb(pixels[x, y])
+
+                if clr == color_key:
+                    continue
+
+                clr.r = min(max(0, int(clr.r * factor)), 255)
+                clr.g = min(max(0, int(clr.g * factor)), 255)
+                clr.b = min(max(0, int(clr.b * factor)), 255)
+
+                pixels[x, y] = surface.map_rgb(clr)
+
+
+def scaled_variants(name, surfaces, factors, color_key=config.transparent_color):
+    """Every surface with its colors scaled by every factor, converted to the display format; all surfaces for the
+    first factor, then all of them for the second and so on. Comes from the disk cache if this exact set of
+    surfaces and factors has been generated before (name just has to be unique among the things cached)"""
+    digest = _digest(surfaces, factors, color_key)
+    cached = image_cache.read_generated(name, digest)
+
+    if cached is not None:
+        sheet, rects = cached
+        variants = [sheet.subsurface(rects[str(i)]).copy() for i in range(len(rects))]
+    else:
+        variants = [scale_colors(surface, factor, color_key) for factor in factors for surface in surfaces]
+        sheet, rects = _make_sheet(variants)
+        image_cache.write_generated(name, digest, sheet, rects)
+
+    result = []
+
+    for variant, source in zip(variants, surfaces * len(factors)):
+        variant = variant.convert()
+
+        if source.get_colorkey() is not None:
+            variant.set_colorkey(source.get_colorkey())
+
+        result.append(variant)
+
+    return result
+
+
+def _digest(surfaces, factors, color_key):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((list(factors), tuple(pygame.Color(color_key)))).encode())
+
+    for surface in surfaces:
+        h.update(repr(surface.get_size()).encode())
+        h.update(pygame.image.tostring(surface, "RGB"))
+
+    return h.digest()
+
+
+def _make_sheet(surfaces):
+    # stacked top to bottom, so the sheet is no wider than the widest surface
+    width = max(s.get_width() for s in surfaces)
+    height = sum(s.get_height() for s in surfaces)
+
+    sheet = pygame.Surface((width, height))
+    sheet.fill(config.transparent_color)
+
+    rects, y = {}, 0
+
+    for i, surface in enumerate(surfaces):
+        sheet.blit(surface, (0, y))
+        rects[str(i)] = pygame.Rect(0, y, surface.get_width(), surface.get_height())
+        y += surface.get_height()
+
+    return sheet, rects
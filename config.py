@@ -11,8 +11,27 @@ base_tile_dimensions = (16, 16)  # tiles on disk are treated as this dimension
 rescale_factor = 2  # all loaded sprites and images will be rescaled by this value
 
 transparent_color = Color('magenta')
+asset_cache_directory = "cache"  # rescaled atlases and tilesets are packed here for faster loading; None disables
+prefetch_assets = False  # load the assets a level needs on a background thread while the main menu is up
+save_levels_as_json = False  # the editor saves levels as JSON instead of the compact binary format
+preload_levels = True  # read upcoming levels (and warp targets) on a worker thread during play
 
-PHYSICS_DT = 1. / 60 / 4
+physics_rate = 240  # physics steps per second
+PHYSICS_DT = 1. / physics_rate
+max_physics_steps = 24  # per rendered frame; simulation time beyond this budget is dropped
+interpolate_rendering = True  # draw entities and scrolling between the last two physics states
+telemetry_frames = 600  # frame timings kept for the performance overlay and telemetry dumps
+telemetry_path = None  # if set, frame timings are written here (.json or .csv) when the game exits
+profile_zones = False  # time named profiling zones (see profiler.py); when off, zones cost next to nothing
+record_input_directory = None  # if set, every level played is recorded to an input log in this directory
+
+tile_chunk_cache = 16  # prerendered TileMap chunks kept for drawing; must cover a screenful. 0 draws tile by tile
+prebake_tile_chunks = False  # render every TileMap chunk when a map is loaded, instead of when it first shows up
+
+dirty_rect_rendering = False  # update only the parts of the screen that changed, and don't redraw screens that didn't
+
+batched_world_step = False  # enemies' world collisions come from one batched query per step; slower so far
+swept_approach = False  # Collider.approach stops at the exact point of contact instead of bisecting the distance
 
 default_background_color = Color('black')
 default_text_color = Color('white')
@@ -21,3 +40,6 @@ default_window_background = Color('red')
 
 editor_grid_color = (255, 0, 0, 128)
 editor_grid_overlay_color = (255, 0, 0, 255)
+editor_autosave_interval = 30.  # seconds between appending edits to the level's journal; None disables
+editor_journal_compact = 500  # journaled edits folded into the level file (in the background) past this many
+editor_undo_budget = 16 * 1024 * 1024  # bytes of undo history kept; the oldest edits are forgotten past this
@@ -0,0 +1,57 @@
+import pygame
+from pygame import Rect
+import config
+
+
+class DirtyRects:
+    """Parts of the screen that changed since the display was last updated, for config.dirty_rect_rendering.
+
+    Whatever draws adds the screen rects it touched; whatever can't tell (or touched all of it) calls
+    add_everything instead. present() hands just those rects to pygame.display.update, or flips if everything
+    changed, then starts over. Nothing is collected while dirty rect rendering is off"""
+    MAX_RECTS = 128  # past this many, a single flip is cheaper than updating each one
+
+    def __init__(self):
+        self._rects = []
+        self._everything = True  # nothing has been shown yet
+
+    def add(self, rect):
+        if self._everything or not config.dirty_rect_rendering:
+            return
+
+        rect = Rect(rect).clip(config.screen_rect)
+
+        if rect.width > 0 and rect.height > 0:
+            self._rects.append(rect)
+
+            if len(self._rects) > DirtyRects.MAX_RECTS:
+                self.add_everything()
+
+    def add_all(self, rects):
+        for rect in rects:
+            self.add(rect)
+
+    def add_everything(self):
+        self._everything = True
+        self._rects.clear()
+
+    @property
+    def empty(self):
+        return not self._everything and not self._rects
+
+    def present(self):
+        """Shows what changed on the display. Returns False if nothing had"""
+        if self._everything:
+            pygame.display.flip()
+        elif self._rects:
+            pygame.display.update(self._rects)
+        else:
+            return False
+
+        self._everything = False
+        self._rects = []
+
+        return True
+
+
+dirty_rects = DirtyRects()
@@ -1,5 +1,4 @@
 import os
-import json
 from util import make_vector, clamp
 from assets.gui_helper import *
 from entities.gui.modal import ModalTextInput
@@ -8,7 +7,7 @@ from entities.gui.modal import ModalTextInput
 class LevelConfigDialog(Dialog):
     SIZE = 256, 256
 
-    def __init__(self, level, gui_atlas):
+    def __init__(self, level, gui_atlas, journal):
         font = pygame.font.SysFont("", 24)
 
         self.gui_atlas = gui_atlas
@@ -26,6 +25,7 @@ class LevelConfigDialog(Dialog):
                          text_start_offset=(12, 5))
 
         self.level = level
+        self.journal = journal
         black = pygame.Color('black')
 
         # Background color text
@@ -134,9 +134,8 @@ class LevelConfigDialog(Dialog):
 
             self.level.filename = os.path.basename(path)
 
-            with open(path, 'w') as f:
-                f.write(json.dumps(self.level.serialize()))
-                print(f"Saved map '{path}'")
+            self.journal.save(path, binary=not config.save_levels_as_json)
+            print(f"Saved map '{path}'")
 
         def _cancel():
             pass
@@ -158,8 +157,7 @@ class LevelConfigDialog(Dialog):
                 print(f"cannot open '{path}' -- not a file")
                 return
 
-            with open(path, 'r') as f:
-                self.level.deserialize(json.loads(f.read()))
+            self.journal.load(path)
 
             print(f"Successfully read '{path}'")
 
@@ -180,7 +178,7 @@ class LevelConfigDialog(Dialog):
         def _set_width(width_str):
             try:
                 new_width = int(width_str)
-                self.level.tile_map.resize(new_width, self.level.tile_map.height)
+                self.journal.resize(new_width, self.level.tile_map.height)
                 self._update_level_dimensions_text()
             except ValueError:
                 print("invalid width, map size unchanged")
@@ -194,7 +192,7 @@ class LevelConfigDialog(Dialog):
         def _set_height(height_str):
             try:
                 new_height = int(height_str)
-                self.level.tile_map.resize(self.level.tile_map.width, new_height)
+                self.journal.resize(self.level.tile_map.width, new_height)
                 self._update_level_dimensions_text()
             except ValueError:
                 print("invalid height, map size unchanged")
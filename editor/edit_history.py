@@ -0,0 +1,279 @@
+"""Undo and redo for the editor.
+
+Every edit made through an EditJournal is recorded here as a command holding just what changed: the tile or
+passability changes of one stroke (everything from pressing a mouse button to releasing it), a resize along with
+the tiles it cut off, or the entities added and removed by one click. Undoing and redoing go back through the
+journal, so they're autosaved like any other edit. Once the commands take more than config.editor_undo_budget
+bytes, the oldest are forgotten; that's checked as a stroke grows, too, so even one long stroke stays in budget.
+
+Each command keeps count of its own size as it's added to, and the history keeps the total, so staying in budget
+costs the same however long the history is"""
+import json
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from entities.characters.level_entity import LevelEntity
+import config
+
+_NO_TILE = -1  # TileMap.NO_TILE
+
+
+class _Command(ABC):
+    """Subclasses keep size, the bytes (give or take) the command takes, up to date as they're added to"""
+    OVERHEAD = 128  # bytes, give or take, of any command before its contents
+
+    @abstractmethod
+    def undo(self, history):
+        pass
+
+    @abstractmethod
+    def redo(self, history):
+        pass
+
+
+class _TileChanges(_Command):
+    def __init__(self):
+        self.xs, self.ys = array('H'), array('H')
+        self.old, self.new = array('h'), array('h')
+        self.size = _Command.OVERHEAD
+
+    def add(self, tile_position, old, new):
+        """Returns the bytes this adds to the command's size, as every add does"""
+        self.xs.append(tile_position[0])
+        self.ys.append(tile_position[1])
+        self.old.append(_NO_TILE if old is None else old)
+        self.new.append(_NO_TILE if new is None else new)
+        self.size += 8
+
+        return 8
+
+    def undo(self, history):
+        for i in reversed(range(len(self.xs))):
+            history.journal.set_tile((self.xs[i], self.ys[i]), _idx(self.old[i]))
+
+    def redo(self, history):
+        for i in range(len(self.xs)):
+            history.journal.set_tile((self.xs[i], self.ys[i]), _idx(self.new[i]))
+
+
+class _PassableChanges(_Command):
+    def __init__(self):
+        self.xs, self.ys = array('H'), array('H')
+        self.old = bytearray()  # the new passability is always the opposite
+        self.size = _Command.OVERHEAD
+
+    def add(self, tile_position, old):
+        self.xs.append(tile_position[0])
+        self.ys.append(tile_position[1])
+        self.old.append(1 if old else 0)
+        self.size += 5
+
+        return 5
+
+    def undo(self, history):
+        for i in reversed(range(len(self.xs))):
+            history.journal.set_passable((self.xs[i], self.ys[i]), self.old[i] != 0)
+
+    def redo(self, history):
+        for i in range(len(self.xs)):
+            history.journal.set_passable((self.xs[i], self.ys[i]), self.old[i] == 0)
+
+
+class _Resize(_Command):
+    def __init__(self, tile_map, new_width, new_height):
+        self.old_size = tile_map.width, tile_map.height
+        self.new_size = new_width, new_height
+
+        # only the squares the resize cuts off (and that aren't empty) are kept, to be put back on undo
+        self.lost = _TileChanges()
+        self.lost_impassable = _PassableChanges()
+
+        for y in range(tile_map.height):
+            for x in range(new_width if y < new_height else 0, tile_map.width):
+                idx = tile_map.get_tile((x, y))
+
+                if idx is not None:
+                    self.lost.add((x, y), None, idx)
+
+                if not tile_map.get_passable((x, y)):
+                    self.lost_impassable.add((x, y), True)
+
+        self.size = self.lost.size + self.lost_impassable.size
+
+    def undo(self, history):
+        history.journal.resize(*self.old_size)
+        self.lost.redo(history)
+        self.lost_impassable.redo(history)
+
+    def redo(self, history):
+        history.journal.resize(*self.new_size)
+
+
+class _EntityChanges(_Command):
+    def __init__(self):
+        self.changes = []  # [added (or removed), the entity, its serialized values, their size]
+        self.size = 0
+
+    def add(self, added, entity):
+        values = entity.serialize()
+        size = _EntityChanges._size_of(values)
+
+        self.changes.append([added, entity, values, size])
+        self.size += size
+
+        return size
+
+    def undo(self, history):
+        for change in reversed(self.changes):
+            self._apply(history, change, not change[0])
+
+    def redo(self, history):
+        for change in self.changes:
+            self._apply(history, change, change[0])
+
+    def _apply(self, history, change, add):
+        entity = history.current(change[1])
+
+        if add:
+            rebuilt = LevelEntity.build(history.journal.level, change[2])
+
+            if rebuilt is not None:
+                history.journal.add_entity(rebuilt)
+                history.replaced(entity, rebuilt)
+                change[1] = rebuilt
+        elif history.journal.level.entity_manager.is_registered(entity):
+            change[2] = entity.serialize()  # might have been set up some more after it was placed
+            size = _EntityChanges._size_of(change[2])
+
+            self.size += size - change[3]
+            change[3] = size
+
+            history.journal.remove_entity(entity)
+
+    @staticmethod
+    def _size_of(values):
+        return _Command.OVERHEAD + len(json.dumps(values))
+
+
+def _idx(idx):
+    return None if idx == _NO_TILE else idx
+
+
+class EditHistory:
+    SUCCESSOR_SIZE = 64  # bytes, give or take, of remembering which entity replaced which
+
+    def __init__(self, journal):
+        self.journal = journal
+
+        self._undo = deque()
+        self._redo = []
+        self._stroke = None  # command being added to, until the stroke ends
+        self._applying = False  # edits made while undoing and redoing aren't recorded
+        self._successors = {}  # entity -> the entity rebuilt in its place by undo or redo
+        self._size = 0  # of every command in _undo and _redo, and of _successors
+
+    def tile_changed(self, tile_position, old, new):
+        self._grow(self._record(_TileChanges).add(tile_position, old, new))
+
+    def passable_changed(self, tile_position, old):
+        self._grow(self._record(_PassableChanges).add(tile_position, old))
+
+    def resizing(self, tile_map, new_width, new_height):
+        if not self._applying:
+            self.end_stroke()
+            self._push(_Resize(tile_map, new_width, new_height))
+
+    def entity_added(self, entity):
+        self._grow(self._record(_EntityChanges).add(True, entity))
+
+    def entity_removed(self, entity):
+        self._grow(self._record(_EntityChanges).add(False, entity))
+
+    def end_stroke(self):
+        self._stroke = None
+
+    def undo(self):
+        self.end_stroke()
+
+        if self._undo:
+            command = self._undo.pop()
+            self._apply(command, command.undo)
+            self._redo.append(command)
+
+    def redo(self):
+        self.end_stroke()
+
+        if self._redo:
+            command = self._redo.pop()
+            self._apply(command, command.redo)
+            self._undo.append(command)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._stroke = None
+        self._successors.clear()
+        self._size = 0
+
+    def current(self, entity):
+        while entity in self._successors:
+            entity = self._successors[entity]
+
+        return entity
+
+    def replaced(self, entity, rebuilt):
+        self._successors[entity] = rebuilt
+        self._grow(EditHistory.SUCCESSOR_SIZE)
+
+    def _record(self, command_type):
+        if self._applying:
+            return _Ignored()
+
+        if not isinstance(self._stroke, command_type):
+            self.end_stroke()
+            self._push(command_type())
+            self._stroke = self._undo[-1] if self._undo else None
+
+        return self._stroke if self._stroke is not None else _Ignored()
+
+    def _push(self, command):
+        # a new edit branches off; what was undone can't come back
+        self._size -= sum(undone.size for undone in self._redo)
+        self._redo.clear()
+
+        self._undo.append(command)
+        self._grow(command.size)
+
+    def _apply(self, command, fn):
+        size = command.size
+        self._applying = True
+
+        try:
+            fn(self)
+        finally:
+            self._applying = False
+            self._grow(command.size - size)  # entities can serialize differently by the time they're removed
+
+    def _grow(self, size):
+        self._size += size
+
+        if self._size > config.editor_undo_budget:
+            self._trim()
+
+    def _trim(self):
+        while self._undo and self._size > config.editor_undo_budget:
+            command = self._undo.popleft()
+            self._size -= command.size
+
+            if command is self._stroke:
+                self._stroke = None  # too big to keep on its own; the rest of the stroke goes into a new command
+
+        if not self._undo and not self._redo:
+            # no command is left to look up an entity that was replaced
+            self._size -= len(self._successors) * EditHistory.SUCCESSOR_SIZE
+            self._successors.clear()
+
+
+class _Ignored:
+    def add(self, *args):
+        return 0
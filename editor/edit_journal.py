@@ -0,0 +1,294 @@
+"""Journal of edits made in the editor, so autosaving a level costs as much as the edits rather than the whole map.
+
+Tile, passability, resize and entity edits go through an EditJournal, which makes them and remembers them. Every
+config.editor_autosave_interval seconds the editor flushes what's been remembered to a sidecar log next to the level
+file (the level's path + ".journal"), one JSON operation per line. Once the log holds config.editor_journal_compact
+operations, it's folded into the level file on a background thread and emptied.
+
+The log starts with a header holding the modification time of the level file it applies to; a log that doesn't
+match its level file is ignored. EditJournal.load reads a level with its log applied, which is how the editor loads
+levels, so edits that were autosaved but never saved in full aren't lost. Edits are also recorded in the journal's
+EditHistory, for undo and redo"""
+import json
+import os
+import threading
+from array import array
+import level_file
+from .edit_history import EditHistory
+import config
+import constants
+
+_NO_TILE = -1  # TileMap.NO_TILE
+
+
+def journal_path(level_path):
+    return level_path + ".journal"
+
+
+class EditJournal:
+    def __init__(self, level):
+        self.level = level
+        self.level_path = None  # edits are only logged once the level has been saved or loaded
+
+        self._pending = []  # operations not yet in the log; entity additions are kept as the entity until flushed
+        self._settings = None  # background color and physics, as of the last save or flush
+        self._logged = 0  # operations in the log
+        self._lock = threading.Lock()  # over the log and level files, which compaction rewrites
+        self._compaction = None
+
+        self.history = EditHistory(self)
+
+    @property
+    def changed(self):
+        return bool(self._pending) or self._settings != self._current_settings()
+
+    def set_tile(self, tile_position, idx):
+        tile_map = self.level.tile_map
+
+        old = tile_map.get_tile(tile_position)
+
+        if old != idx:
+            tile_map.set_tile(tile_position, idx)
+            self._log(["tile", tile_position[0], tile_position[1], idx])
+            self.history.tile_changed(tile_position, old, idx)
+
+    def set_passable(self, tile_position, passable):
+        tile_map = self.level.tile_map
+
+        old = tile_map.get_passable(tile_position)
+
+        if old != passable:
+            tile_map.set_passable(tile_position, passable)
+            self._log(["passable", tile_position[0], tile_position[1], passable])
+            self.history.passable_changed(tile_position, old)
+
+    def resize(self, width, height):
+        self.history.resizing(self.level.tile_map, width, height)
+        self.level.tile_map.resize(width, height)
+        self._log(["resize", width, height])
+
+    def add_entity(self, entity):
+        self.level.entity_manager.register(entity)
+        self.history.entity_added(entity)
+
+        # serialized when flushed, since some entities are only set up after they're placed (see LevelWarp)
+        self._log(["add", entity])
+
+    def remove_entity(self, entity):
+        self.history.entity_removed(entity)
+
+        added = next((op for op in self._pending if op[0] == "add" and op[1] is entity), None)
+
+        if added is not None:
+            self._pending.remove(added)  # never made it to the log, so there's nothing to take out of it
+        else:
+            self._log(["remove", constants.layer_to_name(entity.layer), _normalized(entity.serialize())])
+
+        entity.destroy()
+
+    def end_stroke(self):
+        """Edits from here on are undone separately from those before"""
+        self.history.end_stroke()
+
+    def undo(self):
+        self.history.undo()
+
+    def redo(self):
+        self.history.redo()
+
+    def flush(self):
+        """Appends everything edited since the last flush to the log"""
+        if self.level_path is None or not self.changed:
+            return
+
+        operations = [self._resolve(op) for op in self._pending]
+        operations = [op for op in operations if op is not None]
+
+        if self._settings != self._current_settings():
+            self._settings = self._current_settings()
+            operations.append(["settings", list(self._settings[0]), self._settings[1]])
+
+        self._pending.clear()
+
+        with self._lock:
+            path = journal_path(self.level_path)
+            new = not os.path.exists(path)
+
+            with open(path, 'a') as f:
+                if new:
+                    f.write(json.dumps(_header(self.level_path)) + "\n")
+
+                f.writelines(json.dumps(op) + "\n" for op in operations)
+
+            self._logged += len(operations)  # compaction sets this too
+
+        if self._logged >= config.editor_journal_compact and self._compaction is None:
+            self._compaction = threading.Thread(target=self._compact, args=(self.level_path,),
+                                                name="journal compaction", daemon=True)
+            self._compaction.start()
+
+    def save(self, level_path, binary=True):
+        """Saves the whole level to level_path; the journal starts over from there"""
+        self._wait_for_compaction()
+
+        with self._lock:
+            self.level.save_to_path(level_path, binary)
+            self._remove_log(level_path)
+
+        self._reset(level_path, 0)
+
+    def load(self, level_path):
+        """Loads the level at level_path, with its log replayed over it; edits are logged there from now"""
+        self._wait_for_compaction()
+
+        # the level and its log are read together, so they can't be caught halfway through being compacted
+        with self._lock:
+            values = level_file.pack_tile_map(level_file.read(level_path))
+            operations = _read_journal(level_path)[1]
+
+        self.level.deserialize(_apply(values, operations))
+        self._reset(level_path, len(operations))
+        self.history.clear()
+
+    def _reset(self, level_path, logged):
+        self.level_path = level_path
+        self._pending.clear()
+        self._settings = self._current_settings()
+        self._logged = logged
+
+    def _log(self, op):
+        if self.level_path is not None:
+            self._pending.append(op)
+
+    def _current_settings(self):
+        return tuple(self.level.background_color[:3]), self.level.normal_physics
+
+    def _resolve(self, op):
+        if op[0] != "add":
+            return op
+
+        entity = op[1]
+
+        if not self.level.entity_manager.is_registered(entity):
+            return None  # destroyed some other way, like cancelling a LevelWarp's target
+
+        return ["add", constants.layer_to_name(entity.layer), _normalized(entity.serialize())]
+
+    def _compact(self, level_path):
+        try:
+            with self._lock:
+                header, operations = _read_journal(level_path)
+
+            if header is not None and operations:
+                values = _apply(level_file.pack_tile_map(level_file.read(level_path)), operations)
+                level_file.write(level_path + ".tmp", values, level_file.is_binary(level_path))
+
+                with self._lock:
+                    # anything flushed while the level was being put together stays in the log
+                    remaining = _read_journal(level_path)[1][len(operations):]
+
+                    os.replace(level_path + ".tmp", level_path)
+                    self._remove_log(level_path)
+
+                    if remaining:
+                        with open(journal_path(level_path), 'w') as f:
+                            f.write(json.dumps(_header(level_path)) + "\n")
+                            f.writelines(json.dumps(op) + "\n" for op in remaining)
+
+                    self._logged = len(remaining)
+        finally:
+            # even if it failed, so the next flush can try again
+            self._compaction = None
+
+    def _wait_for_compaction(self):
+        compaction = self._compaction
+
+        if compaction is not None:
+            compaction.join()
+
+    @staticmethod
+    def _remove_log(level_path):
+        if os.path.exists(journal_path(level_path)):
+            os.remove(journal_path(level_path))
+
+
+def _header(level_path):
+    return {"journal": 1, "level_modified": os.stat(level_path).st_mtime_ns}
+
+
+def _read_journal(level_path):
+    """(header, operations) of the journal for level_path, or (None, []) if there's no journal that applies to it"""
+    try:
+        with open(journal_path(level_path), 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None, []
+
+    try:
+        header = json.loads(lines[0])
+        operations = [json.loads(line) for line in lines[1:] if line]
+    except (IndexError, ValueError):
+        print(f"warning -- ignoring unreadable journal for {level_path}")
+        return None, []
+
+    if header.get("level_modified") != os.stat(level_path).st_mtime_ns:
+        print(f"warning -- ignoring journal for {level_path}: the level was changed after it was written")
+        return None, []
+
+    return header, operations
+
+
+def _normalized(values):
+    # as the values will be once they've been through JSON (tuples become lists), so they can be compared
+    return json.loads(json.dumps(values))
+
+
+def _apply(values, operations):
+    """Level values (with a packed tile map) with operations replayed over them"""
+    tile_map = values["tile_map"]
+    width, height = tile_map["width"], tile_map["height"]
+    tile_indices, passable = array('h', tile_map["tile_indices"]), bytearray(tile_map["passable"])
+    entities = {name: list(layer) if name != "__class__" else layer for name, layer in values["entities"].items()}
+    values = dict(values)
+
+    for op in operations:
+        kind = op[0]
+
+        if kind == "tile":
+            _, x, y, idx = op
+            tile_indices[y * width + x] = _NO_TILE if idx is None else idx
+        elif kind == "passable":
+            _, x, y, tf = op
+            passable[y * width + x] = 1 if tf else 0
+        elif kind == "resize":
+            _, new_width, new_height = op
+            new_indices = array('h', [_NO_TILE]) * (new_width * new_height)
+            new_passable = bytearray(b'\x01') * (new_width * new_height)
+            copy_width = min(width, new_width)
+
+            for y in range(min(height, new_height)):
+                src, dst = y * width, y * new_width
+                new_indices[dst:dst + copy_width] = tile_indices[src:src + copy_width]
+                new_passable[dst:dst + copy_width] = passable[src:src + copy_width]
+
+            width, height, tile_indices, passable = new_width, new_height, new_indices, new_passable
+        elif kind == "add":
+            _, layer_name, entity_values = op
+            entities.setdefault(layer_name, []).append(entity_values)
+        elif kind == "remove":
+            _, layer_name, entity_values = op
+            layer = entities.get(layer_name, [])
+
+            if entity_values in layer:
+                layer.remove(entity_values)
+        elif kind == "settings":
+            _, background_color, normal_physics = op
+            values["background_color"] = tuple(background_color)
+            values["normal_physics"] = normal_physics
+        else:
+            print(f"warning -- unknown journal operation '{kind}'")
+
+    values["tile_map"] = {"width": width, "height": height, "tile_indices": tile_indices, "passable": passable}
+    values["entities"] = entities
+
+    return values
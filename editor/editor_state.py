@@ -11,6 +11,7 @@ from .place_mode import PlaceMode
 from .passable_mode import PassableMode
 from .config_mode import ConfigMode
 from .entity_mode import EntityMode
+from .edit_journal import EditJournal
 from state.performance_measurement import PerformanceMeasurement
 from assets.gui_helper import *
 from assets.statistics import Statistics
@@ -38,6 +39,8 @@ class EditorState(GameState, EventHandler):
 
         # create a level to edit
         self.level = Level(assets, EntityManager.create_editor(), Statistics(Labels()))
+        self.journal = EditJournal(self.level)
+        self._since_autosave = 0.
 
         # shim to create a callback before UI draws
         self.entity_manager.register(_ModeDrawHelper(self.on_pre_ui_draw))
@@ -75,7 +78,7 @@ class EditorState(GameState, EventHandler):
         self.tile_dialog = TilePickerDialog(self.assets)
         self.frame.add_child(self.tile_dialog)
 
-        self.config_dialog = LevelConfigDialog(self.level, self.assets.gui_atlas)
+        self.config_dialog = LevelConfigDialog(self.level, self.assets.gui_atlas, self.journal)
         self.frame.add_child(self.config_dialog)
 
         self.entity_dialog = EntityPickerDialog(self.level)
@@ -85,10 +88,10 @@ class EditorState(GameState, EventHandler):
         # editor states to handle relevant actions
         self.current_mode = None
 
-        self.place_mode = PlaceMode(self.tile_dialog, self.level)
-        self.passable_mode = PassableMode(self.level)
+        self.place_mode = PlaceMode(self.tile_dialog, self.level, self.journal)
+        self.passable_mode = PassableMode(self.level, self.journal)
         self.config_mode = ConfigMode()
-        self.entity_mode = EntityMode(self.entity_dialog, self.entity_tool_dialog, self.level)
+        self.entity_mode = EntityMode(self.entity_dialog, self.entity_tool_dialog, self.level, self.journal)
 
         self.set_mode(self.place_mode)
 
@@ -102,12 +105,18 @@ class EditorState(GameState, EventHandler):
         self.frame.add_child(self.mode_dialog)
 
         self._finished = False
+        self._changed = True  # anything happened since the last draw; the editor only changes in response to input
 
     def draw(self, screen):
-        screen.fill(self.level.background_color)
         self.level.draw(screen)
         self.entity_manager.draw(screen, self.level.view_rect, False)
 
+        self._changed = False
+
+    @property
+    def needs_redraw(self):
+        return self._changed
+
     def set_mode(self, new_mode):
         if new_mode is self.place_mode:
             # turn on/off relevant dialogs
@@ -138,6 +147,13 @@ class EditorState(GameState, EventHandler):
     def update(self, dt):
         self.entity_manager.update(dt, self.level.view_rect, False)
 
+        if config.editor_autosave_interval is not None:
+            self._since_autosave += dt
+
+            if self._since_autosave >= config.editor_autosave_interval:
+                self._since_autosave = 0.
+                self.journal.flush()
+
     @property
     def finished(self):
         return self._finished
@@ -152,8 +168,11 @@ class EditorState(GameState, EventHandler):
         self.game_events.unregister(self)
 
     def handle_event(self, evt, game_events):
+        self._changed = True
+
         if evt.type == pygame.QUIT or (evt.type == pygame.KEYDOWN and evt.key == pygame.K_ESCAPE):
             self.consume(evt)
+            self.journal.flush()
             self._finished = True
             return
 
@@ -173,17 +192,26 @@ class EditorState(GameState, EventHandler):
                 # copy level state -> we don't want the actual movement and deaths of entities to be reflected
                 # in our copy of the level
 
-                # easiest way to handle this is to serialize our level, then load it rather than some
+                # easiest way to handle this is to snapshot our level, then restore it rather than some
                 # complicated deepcopy incomplementation
                 stats = copy.copy(self.level.stats)
 
                 test_level = Level(self.assets, EntityManager.create_default(), stats)
-                test_level.deserialize(self.level.serialize())
+                test_level.restore(self.level.capture())
                 test_level.position = self.level.position
 
                 state_stack.push(PerformanceMeasurement(state_stack, self.game_events,
                                                         RunLevel(self.game_events, self.assets, test_level, stats)))
 
+            elif evt.type == pygame.KEYDOWN and evt.key in (pygame.K_z, pygame.K_y) and evt.mod & pygame.KMOD_CTRL:
+                self.consume(evt)
+
+                # ctrl+z undoes; ctrl+y or ctrl+shift+z redoes
+                if evt.key == pygame.K_y or evt.mod & pygame.KMOD_SHIFT:
+                    self.journal.redo()
+                else:
+                    self.journal.undo()
+
         if evt.type == pygame.MOUSEBUTTONUP:
             self.current_mode.on_map_mouseup(evt, pygame.mouse.get_pos())
             # don't consume this event
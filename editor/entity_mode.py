@@ -11,13 +11,14 @@ import config
 
 class EntityMode(EditorMode):
     """Editor is in tile-placement mode"""
-    def __init__(self, entity_dialog, tool_dialog, level):
+    def __init__(self, entity_dialog, tool_dialog, level, journal):
         super().__init__()
 
         self.entity_dialog = entity_dialog  # type: EntityPickerDialog
         self.tool_dialog = tool_dialog
         self.level = level
         self.level_map = level.tile_map
+        self.journal = journal
 
     def on_map_mousedown(self, evt, screen_mouse_pos):
         if self.entity_dialog.selected_entity is not None:
@@ -28,7 +29,7 @@ class EntityMode(EditorMode):
                 entity = LevelEntity.build(self.level, entity_values=None, kind=self.entity_dialog.selected_entity.name)
                 entity.position = location
 
-                self.level.entity_manager.register(entity)
+                self.journal.add_entity(entity)
 
                 if hasattr(entity, "spawned_in_editor"):
                     entity.spawned_in_editor()
@@ -44,7 +45,7 @@ class EntityMode(EditorMode):
 
             for e in self.level.entity_manager.get_entities_inside_region(r):
                 if getattr(e, "destroy") is not None:
-                    e.destroy()
+                    self.journal.remove_entity(e)
                 else:
                     print(f"warning: {e.__class__} does not define destroy()")
 
@@ -52,7 +53,7 @@ class EntityMode(EditorMode):
         pass  # single click per entity
 
     def on_map_mouseup(self, evt, screen_mouse_pos):
-        pass
+        self.journal.end_stroke()
 
     def draw(self, screen):
         # todo: check for option
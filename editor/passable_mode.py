@@ -4,11 +4,12 @@ from util import pixel_coords_to_tile_coords, tile_coords_to_pixel_coords
 
 
 class PassableMode(EditorMode):
-    def __init__(self, level):
+    def __init__(self, level, journal):
         super().__init__()
 
         self.level = level
         self.tile_map = level.tile_map
+        self.journal = journal
         self._motion_set = False  # tiles will be set to this passability on mouse drags
 
     def draw(self, screen):
@@ -62,8 +63,8 @@ class PassableMode(EditorMode):
             self._set_tile_passability(coords, self._motion_set)
 
     def on_map_mouseup(self, evt, screen_mouse_pos):
-        pass
+        self.journal.end_stroke()
 
     def _set_tile_passability(self, coords, tf):
-        self.tile_map.set_passable(coords, tf)
+        self.journal.set_passable(coords, tf)
         self._motion_set = tf
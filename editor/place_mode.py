@@ -9,12 +9,13 @@ import config
 
 class PlaceMode(EditorMode):
     """Editor is in tile-placement mode"""
-    def __init__(self, tile_dialog, level):
+    def __init__(self, tile_dialog, level, journal):
         super().__init__()
 
         self.picker_dialog = tile_dialog  # type: TilePickerDialog
         self.level = level
         self.level_map = level.tile_map
+        self.journal = journal
 
     def on_map_mousedown(self, evt, screen_mouse_pos):
         self.on_map_motion(evt, screen_mouse_pos)
@@ -26,10 +27,10 @@ class PlaceMode(EditorMode):
         if self.level_map.is_in_bounds(tile_coords):
             idx = self.picker_dialog.selected_tile_idx if (pygame.key.get_mods() & pygame.KMOD_CTRL) == 0 else None
 
-            self.level_map.set_tile(tile_coords, idx)
+            self.journal.set_tile(tile_coords, idx)
 
     def on_map_mouseup(self, evt, screen_mouse_pos):
-        pass
+        self.journal.end_stroke()
 
     def draw(self, screen):
         # todo: check for option
@@ -1,9 +1,8 @@
 import math
-import pygame
 from animation import Animation
+from color_transform import scaled_variants
 from .mario_constants import *
 import entities.characters.mario.mario as m
-import config
 
 
 class _DirectionSet(NamedTuple):
@@ -22,44 +21,21 @@ class _Variation(NamedTuple):
     super: _AnimationSet
 
 
-def generate_frame(surface, factor):
-    new_surface = surface.copy()
-
-    with pygame.PixelArray(new_surface) as pixels:
-        for y in range(new_surface.get_height()):
-            for x in range(new_surface.get_width()):
-                clr = new_surface.unmap_rgb(pixels[x][y])
-
-                if clr == config.transparent_color:
-                    continue
-
-                clr.r = min(max(0, int(clr.r * factor)), 255)
-                clr.g = min(max(0, int(clr.g * factor)), 255)
-                clr.b = min(max(0, int(clr.b * factor)), 255)
-
-                pixels[x][y] = new_surface.map_rgb(clr)
-
-    return new_surface.convert()
-
-
 # cutting out the sprites one by one would be very tedious, so let's be la..efficient and just make
 # the colors all crazy based on an existing mario animation set and variation
-def generate_starman_animation(animation):
-    # create 3 frames for every animation frame, changing its pixels a bunch each time
-    frames = []
-
-    factors = [0.65, 0.75, 1.5]
-    for val in factors:
-        for frame in animation.frames:
-            frames.append(generate_frame(frame, val))
+def generate_starman_animation(name, animation):
+    # create 3 frames for every animation frame, changing its pixels a bunch each time. Each animation is cached
+    # under its own name, or they'd all overwrite one another
+    frames = scaled_variants("starman_" + name, animation.frames, [0.65, 0.75, 1.5])
 
     duration = animation.duration * 3 if animation.duration > 0 else 0.125
 
     return Animation(frames, duration)
 
 
-def generate_starman_direction_set(from_set):
-    return _DirectionSet(generate_starman_animation(from_set.left), generate_starman_animation(from_set.right))
+def generate_starman_direction_set(name, from_set):
+    return _DirectionSet(generate_starman_animation(name + "_left", from_set.left),
+                         generate_starman_animation(name + "_right", from_set.right))
 
 # creating these is expensive, so only do it once
 stand_small = None
@@ -157,14 +133,14 @@ class MarioAnimation:
         stand_small = stand_small or _DirectionSet(atlas.load_static("mario_stand_left"), atlas.load_static("mario_stand_right"))
         stand_fire_small = stand_fire_small or _DirectionSet(atlas.load_static("mario_fire_stand_left"),
                               atlas.load_static("mario_fire_stand_right"))
-        stand_starman_small = stand_starman_small or generate_starman_direction_set(stand_small)
+        stand_starman_small = stand_starman_small or generate_starman_direction_set("stand_small", stand_small)
 
         # large stand variants
         stand_super = stand_super or _DirectionSet(atlas.load_static("super_mario_stand_left"),
                                     atlas.load_static("super_mario_stand_right"))
         stand_fire_super = stand_fire_super or _DirectionSet(atlas.load_static("super_mario_fire_stand_left"),
                               atlas.load_static("super_mario_fire_stand_right"))
-        stand_starman_super = stand_starman_super or generate_starman_direction_set(stand_super)
+        stand_starman_super = stand_starman_super or generate_starman_direction_set("stand_super", stand_super)
 
         self.stand = _Variation(
             _AnimationSet(stand_small, stand_fire_small, stand_starman_small),
@@ -176,14 +152,14 @@ class MarioAnimation:
         walk_small = walk_small or _DirectionSet(atlas.load_animation("mario_walk_left"), atlas.load_animation("mario_walk_right"))
         walk_fire_small = walk_fire_small or _DirectionSet(atlas.load_animation("mario_fire_walk_left"),
                               atlas.load_animation("mario_fire_walk_right"))
-        walk_starman_small = walk_starman_small or generate_starman_direction_set(walk_small)
+        walk_starman_small = walk_starman_small or generate_starman_direction_set("walk_small", walk_small)
 
         # super walk variants
         walk_super = walk_super or _DirectionSet(atlas.load_animation("super_mario_walk_left"),
                               atlas.load_animation("super_mario_walk_right"))
         walk_fire_super = walk_fire_super or _DirectionSet(atlas.load_animation("super_mario_fire_walk_left"),
                               atlas.load_animation("super_mario_fire_walk_right"))
-        walk_starman_super = walk_starman_super or generate_starman_direction_set(walk_super)
+        walk_starman_super = walk_starman_super or generate_starman_direction_set("walk_super", walk_super)
 
         self.walk = _Variation(
             _AnimationSet(walk_small, walk_fire_small, walk_starman_small),
@@ -194,13 +170,13 @@ class MarioAnimation:
         run_small = run_small or _DirectionSet(atlas.load_animation("mario_run_left"), atlas.load_animation("mario_run_right"))
         run_fire_small = run_fire_small or _DirectionSet(atlas.load_animation("mario_fire_run_left"),
                                   atlas.load_animation("mario_fire_run_right"))
-        run_starman_small = run_starman_small or generate_starman_direction_set(run_small)
+        run_starman_small = run_starman_small or generate_starman_direction_set("run_small", run_small)
 
         run_super = run_super or _DirectionSet(atlas.load_animation("super_mario_run_left"),
                                   atlas.load_animation("super_mario_run_right"))
         run_fire_super = run_fire_super or _DirectionSet(atlas.load_animation("super_mario_fire_run_left"),
                                        atlas.load_animation("super_mario_fire_run_right"))
-        run_starman_super = run_starman_super or generate_starman_direction_set(run_super)
+        run_starman_super = run_starman_super or generate_starman_direction_set("run_super", run_super)
 
         self.run = _Variation(
             _AnimationSet(run_small, run_fire_small, run_starman_small),
@@ -210,13 +186,13 @@ class MarioAnimation:
         ################### Skidding ####################
         skid_small = skid_small or _DirectionSet(atlas.load_static("mario_skid_right"), atlas.load_static("mario_skid_left"))
         skid_fire_small = skid_fire_small or _DirectionSet(atlas.load_static("mario_fire_skid_right"), atlas.load_static("mario_fire_skid_left"))
-        skid_starman_small = skid_starman_small or generate_starman_direction_set(skid_small)
+        skid_starman_small = skid_starman_small or generate_starman_direction_set("skid_small", skid_small)
 
         skid_super = skid_super or _DirectionSet(atlas.load_static("super_mario_skid_right"),
                               atlas.load_static("super_mario_skid_left"))
         skid_fire_super = skid_fire_super or _DirectionSet(atlas.load_static("super_mario_fire_skid_right"),
                               atlas.load_static("super_mario_fire_skid_left"))
-        skid_starman_super = skid_starman_super or generate_starman_direction_set(skid_super)
+        skid_starman_super = skid_starman_super or generate_starman_direction_set("skid_super", skid_super)
 
         self.skid = _Variation(
             _AnimationSet(skid_small, skid_fire_small, skid_starman_small),
@@ -228,13 +204,13 @@ class MarioAnimation:
                                         atlas.load_static("mario_jump_right"))
         jump_fire_small = jump_fire_small or _DirectionSet(atlas.load_static("mario_fire_jump_left"),
                                         atlas.load_static("mario_fire_jump_right"))
-        jump_starman_small = jump_starman_small or generate_starman_direction_set(jump_small)
+        jump_starman_small = jump_starman_small or generate_starman_direction_set("jump_small", jump_small)
 
         jump_super = jump_super or _DirectionSet(atlas.load_static("super_mario_jump_left"),
                                         atlas.load_static("super_mario_jump_right"))
         jump_fire_super = jump_fire_super or _DirectionSet(atlas.load_static("super_mario_fire_jump_left"),
                                         atlas.load_static("super_mario_fire_jump_right"))
-        jump_starman_super = jump_starman_super or generate_starman_direction_set(jump_super)
+        jump_starman_super = jump_starman_super or generate_starman_direction_set("jump_super", jump_super)
 
         self.jump = _Variation(
             _AnimationSet(jump_small, jump_super, jump_starman_small),
@@ -246,7 +222,7 @@ class MarioAnimation:
                               atlas.load_static("super_mario_crouch_right"))
         crouch_fire_super = crouch_fire_super or _DirectionSet(atlas.load_static("super_mario_fire_crouch_left"),
                               atlas.load_static("super_mario_fire_crouch_right"))
-        crouch_starman_super = crouch_starman_super or generate_starman_direction_set(crouch_super)
+        crouch_starman_super = crouch_starman_super or generate_starman_direction_set("crouch_super", crouch_super)
 
         self.crouch = _Variation(
             # super variants (these would be used for small, but that should never happen ...
@@ -28,8 +28,12 @@ class LevelWarp(LevelEntity):
         self.target_text = font.render(self.next_level_file, True, (0, 0, 0), (255, 255, 255))
         self.idx_text = font.render(str(self.spawn_idx), True, (0, 0, 0), (255, 255, 255))
 
+    @property
+    def target_path(self):
+        return "levels/" + self.next_level_file
+
     def _change_level(self, collision):
-        self.level.load_from_path("levels/" + self.next_level_file)
+        self.level.load_from_path(self.target_path)
         # no need to destroy this entity, it's already removed from the level
 
     def update(self, dt, view_rect):
@@ -39,7 +43,7 @@ class LevelWarp(LevelEntity):
 
         if self._launch:
             self.destroy()
-            self.level.load_from_path("levels/" + self.next_level_file)
+            self.level.load_from_path(self.target_path)
 
     def draw(self, screen, view_rect):
         super().draw(screen, view_rect)
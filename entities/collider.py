@@ -4,6 +4,8 @@ import copy
 from pygame import Rect
 from util import distance_squared
 from util import copy_vector
+from profiler import profiled
+import config
 import constants
 
 epsilon_sqr = sys.float_info.epsilon ** 2
@@ -62,11 +64,17 @@ class Collider:
     def iterative_move(self, new_pixel_position, tf_dispatch_events=False):
         return self.manager.iterative_move(self, new_pixel_position, tf_dispatch_events=tf_dispatch_events)
 
+    def sweep(self, new_pixel_position, tf_dispatch_events=False):
+        return self.manager.sweep(self, new_pixel_position, tf_dispatch_events=tf_dispatch_events)
+
     def approach(self, new_pixel_position, tf_dispatch_events=False):
         collisions = self.try_move(new_pixel_position, tf_dispatch_events=False)
 
         if collisions:
-            self.iterative_move(new_pixel_position, False)
+            if config.swept_approach:
+                self.sweep(new_pixel_position, False)
+            else:
+                self.iterative_move(new_pixel_position, False)
 
             if tf_dispatch_events:
                 ColliderManager.dispatch_events(self, collisions)
@@ -81,27 +89,156 @@ class Collider:
     def position(self, val):
         self._position = val
         self.rect.x, self.rect.y = self._position.x, self._position.y
+        self.manager.update_position(self)
+
+
+class _SpatialHash:
+    """Uniform grid broadphase. Each registered collider is filed under every cell its rect touches, so a query
+    only has to look at colliders sharing a cell with the query rect instead of every collider in the world"""
+    def __init__(self, cell_width, cell_height):
+        assert cell_width > 0
+        assert cell_height > 0
+
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+
+        self._cells = {}  # (cx, cy) -> set of colliders
+        self._collider_cells = {}  # collider -> (left, top, right, bottom) cell range it is filed under
+
+    def _cell_range(self, rect):
+        # inclusive on the right/bottom edge; a slightly generous range is fine since the narrow phase
+        # does a real rect test anyway
+        cw, ch = self.cell_width, self.cell_height
+
+        return rect.left // cw, rect.top // ch, rect.right // cw, rect.bottom // ch
+
+    def insert(self, collider):
+        if collider in self._collider_cells:
+            self.remove(collider)
+
+        cell_range = self._cell_range(collider.rect)
+        self._collider_cells[collider] = cell_range
+        self._add_to_cells(collider, cell_range)
+
+    def remove(self, collider):
+        cell_range = self._collider_cells.pop(collider, None)
+
+        if cell_range is not None:
+            self._remove_from_cells(collider, cell_range)
+
+    def update(self, collider):
+        old_range = self._collider_cells.get(collider)
+
+        if old_range is None:
+            return  # not ours to track
+
+        new_range = self._cell_range(collider.rect)
+
+        if new_range == old_range:
+            return  # optimization: most moves don't leave the current cell(s)
+
+        self._remove_from_cells(collider, old_range)
+        self._collider_cells[collider] = new_range
+        self._add_to_cells(collider, new_range)
+
+    def query(self, rect):
+        """Returns a set of colliders that might intersect the given rect"""
+        left, top, right, bottom = self._cell_range(rect)
+        cells = self._cells
+        found = set()
+
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = cells.get((cx, cy))
+
+                if cell:
+                    found.update(cell)
+
+        return found
+
+    def _add_to_cells(self, collider, cell_range):
+        left, top, right, bottom = cell_range
+        cells = self._cells
+
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                key = (cx, cy)
+                cell = cells.get(key)
+
+                if cell is None:
+                    cells[key] = cell = set()
+
+                cell.add(collider)
+
+    def _remove_from_cells(self, collider, cell_range):
+        left, top, right, bottom = cell_range
+        cells = self._cells
+
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                key = (cx, cy)
+                cell = cells.get(key)
+
+                if cell is not None:
+                    cell.discard(collider)
+
+                    if not cell:
+                        del cells[key]
 
 
 class ColliderManager:
     """Colliders use an instance of this to test against other colliders"""
+    WORLD_STEP_MARGIN = 32  # pixels an entity can move from where begin_world_step saw it and still use its tiles
+
     def __init__(self, tile_map):
         self._colliders = set()
         self.tile_map = tile_map
 
+        # colliders are bucketed by layer, and each bucket has its own broadphase grid. A query only walks the
+        # buckets its mask selects, so (for example) a hitbox looking for Mario never sees any enemies or blocks
+        self._layer_buckets = {}  # layer -> _SpatialHash
+
+        # entity -> (region, impassable tiles inside it), from the last begin_world_step
+        self._world_step = {}
+        self._world_step_revision = None
+
     def register(self, collider: Collider):
         self._colliders.add(collider)
+        self._get_bucket(collider.layer).insert(collider)
 
     def unregister(self, collider: Collider):
         if collider in self._colliders:
             self._colliders.remove(collider)
+            self._layer_buckets[collider.layer].remove(collider)
+
+    def update_position(self, collider: Collider):
+        """Keeps the broadphase in sync with a registered collider that has moved. Called by Collider itself"""
+        bucket = self._layer_buckets.get(collider.layer)
+
+        if bucket is not None:
+            bucket.update(collider)
 
     def clear(self):
         self._colliders = set()
+        self._layer_buckets = {}
+        self._world_step = {}
+        self._world_step_revision = None
+
+    def _get_bucket(self, layer):
+        bucket = self._layer_buckets.get(layer)
+
+        if bucket is None:
+            # broadphase cells are tile-sized; see TileMap.view_region_to_tile_region for the same calculation
+            bucket = _SpatialHash(config.base_tile_dimensions[0] * config.rescale_factor,
+                                  config.base_tile_dimensions[1] * config.rescale_factor)
+            self._layer_buckets[layer] = bucket
+
+        return bucket
 
     def contains(self, collider):
         return collider in self._colliders
 
+    @profiled("ColliderManager.move")
     def move(self, collider, new_pixel_position, tf_dispatch_events=False):
         """Teleports the collider to new position, and returns any resulting collisions"""
         collider.position = copy_vector(new_pixel_position)
@@ -115,12 +252,16 @@ class ColliderManager:
         if (collider.mask & constants.Block) != 0:
             collisions.extend(self.get_world_collisions(collider))
 
-        for other_collider in (c for c in self._colliders if c is not collider):
-            if (collider.mask & other_collider.layer) == 0:
-                continue
+        for layer, bucket in self._layer_buckets.items():
+            if (collider.mask & layer) == 0:
+                continue  # nothing in this bucket can collide with us
 
-            if collider.rect.colliderect(other_collider.rect) and other_collider not in collisions:
-                collisions.append(Collision(collider, other_collider, copy_vector(collider.position)))
+            for other_collider in bucket.query(collider.rect):
+                if other_collider is collider:
+                    continue
+
+                if collider.rect.colliderect(other_collider.rect) and other_collider not in collisions:
+                    collisions.append(Collision(collider, other_collider, copy_vector(collider.position)))
 
         if tf_dispatch_events:
             ColliderManager.dispatch_events(collider, collisions)
@@ -183,37 +324,241 @@ class ColliderManager:
 
         return dist
 
+    def sweep(self, collider, new_pixel_position, tf_dispatch_events=False):
+        """Swept alternative to iterative_move. Moves the collider in a straight line towards the new position,
+        stopping at the first point of contact with a tile or another collider. Every potential obstacle is tested
+        once for its time of impact, rather than re-running the whole query for every halving. Returns the
+        displacement that was actually applied, plus collisions for whatever was touched first"""
+        start = copy_vector(collider.position)
+        delta = copy_vector(new_pixel_position) - start
+
+        if collider.mask == 0 or delta.length_squared() < epsilon_sqr:
+            collider.position = start + delta
+            return delta, []
+
+        rect = collider.rect
+        dx, dy = delta.x, delta.y
+
+        # area covered by the entire move; one pixel of slack for rounding the final position into the rect
+        swept_left, swept_top = math.floor(rect.left + min(0., dx)) - 1, math.floor(rect.top + min(0., dy)) - 1
+        swept = Rect(swept_left, swept_top,
+                     math.ceil(rect.right + max(0., dx)) + 1 - swept_left,
+                     math.ceil(rect.bottom + max(0., dy)) + 1 - swept_top)
+
+        obstacles = self._get_sweep_obstacles(collider, swept)
+        time_of_impact = ColliderManager._time_of_impact
+        bounds = rect.left, rect.top, rect.right, rect.bottom
+
+        first_contact = 1.
+        contacts = []
+
+        for thing, other_bounds in obstacles:
+            toi = time_of_impact(bounds, dx, dy, other_bounds)
+
+            if toi is None or toi > first_contact:
+                continue
+
+            if toi < first_contact:
+                first_contact = toi
+                contacts = []
+
+            contacts.append(thing)
+
+        collider.position = start + delta * first_contact
+
+        # the sweep is done on the collider's (integer) rect, while its position is floating point: make sure
+        # rounding hasn't left it overlapping anything. Everything it could overlap is already in hand
+        if contacts and ColliderManager._overlaps_any(collider.rect, obstacles):
+            collider.position = start
+            self.iterative_move(collider, new_pixel_position)
+
+        collisions = [Collision(collider, thing, copy_vector(collider.position)) for thing in contacts]
+
+        if tf_dispatch_events:
+            ColliderManager.dispatch_events(collider, collisions)
+
+        return collider.position - start, collisions
+
+    def _get_sweep_obstacles(self, collider, swept):
+        # returns (thing, (left, top, right, bottom)) for everything that might be in the way inside the swept area
+        obstacles = []
+
+        if (collider.mask & constants.Block) != 0:
+            tile_map = self.tile_map
+            tw, th = tile_map.tile_width, tile_map.tile_height
+
+            left, right = max(0, int(swept.left / tw)), min(tile_map.width - 1, int(swept.right / tw))
+            top, bottom = max(0, int(swept.top / th)), min(tile_map.height - 1, int(swept.bottom / th))
+
+            obstacles.extend(((x, y), (x * tw, y * th, (x + 1) * tw, (y + 1) * th))
+                             for x, y in self._scan_impassable(left, top, right, bottom))
+
+        for layer, bucket in self._layer_buckets.items():
+            if (collider.mask & layer) == 0:
+                continue
+
+            for other_collider in bucket.query(swept):
+                if other_collider is not collider:
+                    r = other_collider.rect
+                    obstacles.append((other_collider, (r.left, r.top, r.right, r.bottom)))
+
+        return obstacles
+
+    @staticmethod
+    def _overlaps_any(rect, obstacles):
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+
+        for _, (other_left, other_top, other_right, other_bottom) in obstacles:
+            if left < other_right and right > other_left and top < other_bottom and bottom > other_top:
+                return True
+
+        return False
+
+    @staticmethod
+    def _time_of_impact(bounds, dx, dy, other_bounds):
+        """Slab test on (left, top, right, bottom) bounds: returns the fraction [0, 1) of the move (dx, dy) at which
+        the first box starts to overlap the second, or None if it never does. Already overlapping or touching and
+        moving inwards counts as an impact at 0"""
+        t_enter, t_exit = 0., 1.
+
+        for a_min, a_max, b_min, b_max, d in ((bounds[0], bounds[2], other_bounds[0], other_bounds[2], dx),
+                                              (bounds[1], bounds[3], other_bounds[1], other_bounds[3], dy)):
+            if d == 0.:
+                if a_max <= b_min or a_min >= b_max:
+                    return None  # never overlaps along this axis
+
+                continue
+
+            if d > 0.:
+                enter, leave = (b_min - a_max) / d, (b_max - a_min) / d
+            else:
+                enter, leave = (b_max - a_min) / d, (b_min - a_max) / d
+
+            t_enter, t_exit = max(t_enter, enter), min(t_exit, leave)
+
+            if t_enter >= t_exit:
+                return None
+
+        return t_enter
+
+    def begin_world_step(self, entities):
+        """Batched world query for a whole population at once (the enemy layer, every physics step): finds the
+        impassable tiles around each entity with a single get_blocked_tiles call. For the rest of the step, world
+        collisions of those entities' colliders only test their own tiles, as long as the colliders stay within
+        WORLD_STEP_MARGIN of where the entities were"""
+        margin = ColliderManager.WORLD_STEP_MARGIN
+        entities = [entity for entity in entities if getattr(entity, "rect", None) is not None]
+        regions = [entity.rect.inflate(margin * 2, margin * 2) for entity in entities]
+
+        self._world_step = dict(zip(entities, zip(regions, self.get_blocked_tiles(regions))))
+        self._world_step_revision = self.tile_map.passable_revision
+
     def get_world_collisions(self, collider):
-        tw, th = self.tile_map.tile_width, self.tile_map.tile_height
-        tmw, tmh = self.tile_map.width, self.tile_map.height
+        tile_map = self.tile_map
+        tw, th = tile_map.tile_width, tile_map.tile_height
+        rect = collider.rect
+
+        step = self._world_step.get(collider.entity)
+
+        if step is not None and step[0].contains(rect) and self._world_step_revision == tile_map.passable_revision:
+            # every impassable tile this collider could touch was found by begin_world_step already
+            r = Rect(0, 0, tw, th)
+            collisions = []
+
+            for x, y in step[1]:
+                r.x = x * tw
+                r.y = y * th
+
+                if rect.colliderect(r):
+                    collisions.append(Collision(moved_collider=collider, hit_thing=(x, y),
+                                                moved_collider_position=copy_vector(collider.position)))
+
+            return collisions
+
+        tmw, tmh = tile_map.width, tile_map.height
+        passable_grid = tile_map.passable_grid  # packed, row-major
 
-        # determine which grid square(s) the collider is in
-        left, right = int(collider.rect.left / tw), int(collider.rect.right / tw)
-        top, bottom = int(collider.rect.top / th), int(collider.rect.bottom / th)
+        # determine which grid square(s) the collider is in, clipped to the map
+        left, right = max(0, int(rect.left / tw)), min(tmw - 1, int(rect.right / tw))
+        top, bottom = max(0, int(rect.top / th)), min(tmh - 1, int(rect.bottom / th))
         r = Rect(left * tw, top * th, tw, th)
 
         collisions = []
 
         # each of these tiles is potentially intersecting the collider
         for x in range(left, right + 1):
-            if x < 0 or x >= tmw:
-                continue
-
             for y in range(top, bottom + 1):
-                if y < 0 or y >= tmh:
-                    continue
-
-                if not self.tile_map.get_passable((x, y)):
+                if not passable_grid[y * tmw + x]:
                     # a non-passable tile might be within range: now use a pixel-perfect collision test
                     r.x = x * tw
                     r.y = y * th
 
-                    if collider.rect.colliderect(r):
+                    if rect.colliderect(r):
                         collisions.append(Collision(moved_collider=collider, hit_thing=(x, y),
                                                     moved_collider_position=copy_vector(collider.position)))
 
         return collisions
 
+    def get_blocked_tiles(self, rects):
+        """Batched world query. For each rect given, returns a list of the impassable tile coordinates (x, y) that
+        it intersects, ordered by x then y. Rects spanning the same range of tiles (think a row of enemies
+        walking on the same ground) share one scan of the passability grid"""
+        tile_map = self.tile_map
+        tw, th = tile_map.tile_width, tile_map.tile_height
+        tmw, tmh = tile_map.width, tile_map.height
+
+        scans = {}  # tile range -> impassable tiles inside it
+        results = []
+        r = Rect(0, 0, tw, th)
+
+        for rect in rects:
+            # determine which grid square(s) the rect is in, clipped to the map
+            left, right = max(0, int(rect.left / tw)), min(tmw - 1, int(rect.right / tw))
+            top, bottom = max(0, int(rect.top / th)), min(tmh - 1, int(rect.bottom / th))
+
+            key = (left, top, right, bottom)
+            candidates = scans.get(key)
+
+            if candidates is None:
+                candidates = scans[key] = self._scan_impassable(left, top, right, bottom)
+
+            blocked = []
+
+            for x, y in candidates:
+                # a non-passable tile might be within range: now use a pixel-perfect collision test
+                r.x = x * tw
+                r.y = y * th
+
+                if rect.colliderect(r):
+                    blocked.append((x, y))
+
+            results.append(blocked)
+
+        return results
+
+    def _scan_impassable(self, left, top, right, bottom):
+        # rows of the packed grid are sliced out whole, and the (rare) impassable squares located
+        # with bytearray.find rather than testing every square in Python. NumPy (optional, see color_transform)
+        # wouldn't help: the rows scanned are only a few tiles long, and converting them would cost more
+        grid = self.tile_map.passable_grid
+        width = self.tile_map.width
+        found = []
+
+        if left > right:
+            return found
+
+        for y in range(top, bottom + 1):
+            row = grid[y * width + left:y * width + right + 1]
+            idx = row.find(0)
+
+            while idx != -1:
+                found.append((left + idx, y))
+                idx = row.find(0, idx + 1)
+
+        found.sort()  # x-major, same order as a column by column scan
+
+        return found
+
     def colliders(self):
         return copy.copy(self._colliders)
 
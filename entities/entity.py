@@ -8,9 +8,15 @@ import constants
 class Entity(ABC):
     """Important note: while you can make things exist on the map by making them entities, they
     WILL NOT BE SERIALIZED. Use LevelEntity for persistent things (anything that can be placed)"""
+    DIRTY_MARGIN = 32  # pixels around the rect that dirty_rect counts as touched
+
     def __init__(self, rect: Rect):
         super().__init__()
 
+        # set by an EntityManager while this entity is registered with it, so it can keep its spatial index current.
+        # Called whenever the position or the horizontal extent of this entity changes
+        self.on_position_changed = None
+
         # reminder to self: we don't just expose this publically because we want them
         # synchronized; specifically, that position can be tracked in floating points
         # (since rects are int-only)
@@ -37,6 +43,9 @@ class Entity(ABC):
     def rect(self, val):
         self._rect = val
 
+        if self.on_position_changed is not None:
+            self.on_position_changed(self, self._position.x)
+
     @property
     def position(self):
         return copy_vector(self._position)
@@ -46,6 +55,9 @@ class Entity(ABC):
         self._position = copy_vector(pos)
         self._rect.x, self._rect.y = pos
 
+        if self.on_position_changed is not None:
+            self.on_position_changed(self, self._position.x)
+
     @property
     def width(self):
         return self.rect.width
@@ -54,6 +66,9 @@ class Entity(ABC):
     def width(self, w):
         self._rect.width = w
 
+        if self.on_position_changed is not None:
+            self.on_position_changed(self, self._position.x)
+
     @property
     def height(self):
         return self._rect.height
@@ -64,3 +79,21 @@ class Entity(ABC):
 
     def get_rect(self):
         return self._rect.copy()
+
+    def dirty_rect(self, view_rect):
+        """Screen area draw may have touched. Sprites can be a little larger than the rect, hence the margin"""
+        return self._rect.move(-view_rect.x, -view_rect.y).inflate(Entity.DIRTY_MARGIN * 2, Entity.DIRTY_MARGIN * 2)
+
+    @property
+    def position_snapshot(self):
+        # the position setter always replaces _position rather than modifying it, so it can be handed out without
+        # a copy. Don't modify it
+        return self._position
+
+    def draw_interpolated(self, screen, view_rect, previous_position, alpha):
+        """Draws this entity alpha of the way from previous_position to its current position. Nothing is moved:
+        the view is shifted the other way instead, so colliders that draw keeps in sync (debug hitboxes) stay where
+        physics left them"""
+        offset = (self._position - previous_position) * (1. - alpha)
+
+        self.draw(screen, view_rect.move(round(offset.x), round(offset.y)))
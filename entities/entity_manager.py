@@ -1,11 +1,99 @@
 from .entity import Entity
 from .characters import LevelEntity
 from pygame.sprite import Rect
+from bisect import bisect_left, bisect_right
+from itertools import count
+from profiler import profiler
+from dirty_rects import dirty_rects
+import config
 import constants
 
 
+class _SortedLayer:
+    """Entities of a single layer kept sorted by x position, so the entities near the view can be found with a
+    binary search instead of a scan over the whole level"""
+    def __init__(self):
+        self.xs = []
+        self.entities = []
+
+    # past this many queued changes, rebuilding the lists is cheaper than changing them one entity at a time
+    BATCH_THRESHOLD = 16
+
+    def insert(self, entity, x):
+        idx = bisect_right(self.xs, x)
+
+        self.xs.insert(idx, x)
+        self.entities.insert(idx, entity)
+
+    def insert_many(self, entities_with_x):
+        if len(entities_with_x) < _SortedLayer.BATCH_THRESHOLD:
+            for entity, x in entities_with_x:
+                self.insert(entity, x)
+            return
+
+        merged = list(zip(self.xs, self.entities))
+        merged.extend(entities_with_x)
+        merged.sort(key=lambda pair: pair[1])
+
+        self.entities = [entity for entity, _ in merged]
+        self.xs = [x for _, x in merged]
+
+    def remove(self, entity, x):
+        idx = self._find(entity, x)
+
+        del self.xs[idx]
+        del self.entities[idx]
+
+    def remove_many(self, entities_with_x):
+        if len(entities_with_x) < _SortedLayer.BATCH_THRESHOLD:
+            for entity, x in entities_with_x:
+                self.remove(entity, x)
+            return
+
+        removed = {entity for entity, _ in entities_with_x}
+        kept = [i for i, entity in enumerate(self.entities) if entity not in removed]
+
+        self.xs = [self.xs[i] for i in kept]
+        self.entities = [self.entities[i] for i in kept]
+
+    def move(self, entity, old_x, new_x):
+        idx = self._find(entity, old_x)
+        xs = self.xs
+
+        # most moves are small enough that the entity keeps its place in the ordering
+        if (idx == 0 or xs[idx - 1] <= new_x) and (idx == len(xs) - 1 or new_x <= xs[idx + 1]):
+            xs[idx] = new_x
+        else:
+            del xs[idx]
+            del self.entities[idx]
+
+            self.insert(entity, new_x)
+
+    def _find(self, entity, x):
+        idx = bisect_left(self.xs, x)
+
+        # several entities can share an x position
+        while self.entities[idx] is not entity:
+            idx += 1
+
+        return idx
+
+    def get_range(self, minx, maxx):
+        # same convention as the range checks this replaces: a missing (or zero) bound doesn't limit the range
+        lo = bisect_left(self.xs, minx) if minx else 0
+        hi = bisect_right(self.xs, maxx) if maxx else len(self.xs)
+
+        return self.entities[lo:hi]
+
+
+# profiling zone per layer, named once up front
+_update_zone_names = {layer: f"EntityManager.update_layer[{constants.layer_to_name(layer)}]"
+                      for layer in constants.LayerList}
+
+
 class EntityManager:
     ENTITY_UPDATE_RANGE_MULTIPLIER = 1.25
+    MAX_INTERPOLATION_DISTANCE = 64  # entities that moved further than this in one step teleported; don't smear them
 
     def __init__(self, update_layer_ordering: list, draw_layer_ordering):
         assert update_layer_ordering is not None
@@ -14,8 +102,47 @@ class EntityManager:
         self.update_ordering = update_layer_ordering
         self.draw_ordering = draw_layer_ordering
 
+        # each layer is a dict used as an ordered set: registration order is kept, and removal is O(1)
         self.layers = dict(zip([layer_name for layer_name in constants.LayerList],
-                               [list() for _ in constants.LayerList]))
+                               [dict() for _ in constants.LayerList]))
+
+        # spatial index: entities of each layer sorted by x. Registrations, removals and moves are queued and
+        # applied to the index before the next update or draw pass, so entities can come and go while a pass is
+        # running without the pass having to copy anything
+        self._sorted_layers = {layer: _SortedLayer() for layer in constants.LayerList}
+
+        # layer -> called with the layer's entities in range just before they're updated (see Level)
+        self.before_layer_update = {}
+
+        self._current_x = {}
+        self._indexed_x = {}
+        self._moved = set()
+        self._pending_add = {}
+        self._pending_remove = []
+
+        # position of each entity before the latest update, for drawing between physics steps
+        self._previous_positions = {}
+
+        # screen rects entities were drawn in last time, in dirty rect mode
+        self._drawn_rects = []
+
+        # widest entity seen in each layer, so region queries know how far left of a region to start looking
+        self._widest = {layer: 0 for layer in constants.LayerList}
+
+        # registration order is the order entities are updated and drawn in
+        self._sequence = count()
+        self._order = {}
+        self._layer_rank = {layer: rank for rank, layer in enumerate(self.layers)}
+
+        # type index: exact class -> registered entities of that class, plus a cache of which of those classes
+        # are subclasses of a searched-for class
+        self._by_type = {}
+        self._subtypes = {}
+
+        # see checkpoint: entity -> the values it serialized to then, and the entities that may have changed since
+        self._checkpoint = {}
+        self._checkpoint_values = None
+        self._touched = None
 
     @staticmethod
     def create_default():
@@ -53,16 +180,110 @@ class EntityManager:
 
     def _register_internal(self, entity):
         assert entity.layer in self.layers.keys()
-        self.layers[entity.layer].append(entity)
+        assert entity not in self._order, "entity registered twice"
+        self.layers[entity.layer][entity] = None
+
+        self._current_x[entity] = entity.position.x
+        self._order[entity] = next(self._sequence)
+        self._pending_add[entity] = None
+
+        entity_type = type(entity)
+
+        if entity_type not in self._by_type:
+            self._by_type[entity_type] = {}
+            self._subtypes.clear()
+
+        self._by_type[entity_type][entity] = None
+
+        entity.on_position_changed = self._on_position_changed
+
+        if self._touched is not None:
+            self._touched.add(entity)
 
     def unregister(self, entity):
         assert isinstance(entity, Entity)
         assert entity.layer in self.layers.keys()
         assert entity in self.layers[entity.layer]
 
-        self.layers[entity.layer].remove(entity)
+        del self.layers[entity.layer][entity]
+
+        del self._current_x[entity]
+        del self._order[entity]
+        del self._by_type[type(entity)][entity]
+        self._moved.discard(entity)
+
+        if entity in self._pending_add:
+            del self._pending_add[entity]  # never made it into the index
+        else:
+            self._pending_remove.append((entity, self._indexed_x.pop(entity)))
+
+        if entity.on_position_changed == self._on_position_changed:
+            entity.on_position_changed = None
+
+        if self._touched is not None:
+            self._touched.add(entity)
+
+    def _on_position_changed(self, entity, x):
+        self._current_x[entity] = x
+        self._moved.add(entity)
+
+        if self._touched is not None:
+            self._touched.add(entity)
+
+    def _update_index(self):
+        if self._pending_remove:
+            for layer, entities_with_x in self._group_by_layer(self._pending_remove).items():
+                self._sorted_layers[layer].remove_many(entities_with_x)
+
+            self._pending_remove.clear()
+
+        if self._pending_add:
+            added = [(entity, self._current_x[entity]) for entity in self._pending_add]
+
+            for layer, entities_with_x in self._group_by_layer(added).items():
+                self._sorted_layers[layer].insert_many(entities_with_x)
+                self._widest[layer] = max(self._widest[layer], *(entity.rect.width for entity, _ in entities_with_x))
+
+            self._indexed_x.update(added)
+            self._pending_add.clear()
+
+        if not self._moved:
+            return
+
+        widest = self._widest
+
+        for entity in self._moved:
+            x = self._current_x[entity]
+
+            if entity.rect.width > widest[entity.layer]:
+                widest[entity.layer] = entity.rect.width
+
+            if x != self._indexed_x[entity]:
+                self._sorted_layers[entity.layer].move(entity, self._indexed_x[entity], x)
+                self._indexed_x[entity] = x
 
-    def draw(self, screen, view_rect, tf_enforce_range=True):
+        self._moved.clear()
+
+    @staticmethod
+    def _group_by_layer(entities_with_x):
+        by_layer = {}
+
+        for entity, x in entities_with_x:
+            by_layer.setdefault(entity.layer, []).append((entity, x))
+
+        return by_layer
+
+    def _get_entities_in_range(self, layer, minx, maxx):
+        self._update_index()
+
+        # only the entities in range are gathered; the index itself isn't touched until the next pass, so
+        # entities are free to register and unregister while these are processed
+        entities = self._sorted_layers[layer].get_range(minx, maxx)
+        entities.sort(key=self._order.__getitem__)
+
+        return entities
+
+    def draw(self, screen, view_rect, tf_enforce_range=True, alpha=1.):
         # draw only screen and a quarter
         if tf_enforce_range:
             offscreen_range = view_rect.width * (EntityManager.ENTITY_UPDATE_RANGE_MULTIPLIER - 1)
@@ -72,22 +293,53 @@ class EntityManager:
         minx = view_rect.left - offscreen_range
         maxx = view_rect.right + offscreen_range
 
+        if config.dirty_rect_rendering:
+            # wherever entities were drawn last time has to be shown again too, in case they moved or went away
+            dirty_rects.add_all(self._drawn_rects)
+            self._drawn_rects.clear()
+
         for layer in self.draw_ordering:
-            self.draw_layer(layer, screen, view_rect, minx, maxx)
+            self.draw_layer(layer, screen, view_rect, minx, maxx, alpha)
 
-    def draw_layer(self, layer, screen, view_rect, minx=None, maxx=None):
+        if config.dirty_rect_rendering:
+            dirty_rects.add_all(self._drawn_rects)
+
+    def draw_layer(self, layer, screen, view_rect, minx=None, maxx=None, alpha=1.):
         assert layer in self.layers
 
-        for entity in self.layers[layer].copy():
-            xpos = entity.position.x
+        current_x = self._current_x
+
+        for entity in self._get_entities_in_range(layer, minx, maxx):
+            xpos = current_x.get(entity)
+
+            if xpos is None:  # unregistered by an earlier entity, but still drawn this frame
+                xpos = entity.position.x
 
             if not minx or xpos >= minx:
                 if not maxx or xpos <= maxx:
                     if hasattr(entity, "enabled"):
                         if entity.enabled:
-                            entity.draw(screen, view_rect)
+                            self._draw_entity(entity, screen, view_rect, alpha)
                     else:
-                        entity.draw(screen, view_rect)
+                        self._draw_entity(entity, screen, view_rect, alpha)
+
+    def _draw_entity(self, entity, screen, view_rect, alpha):
+        previous = self._previous_positions.get(entity) if alpha < 1. else None
+
+        if previous is not None and \
+                previous.distance_squared_to(entity.position_snapshot) < EntityManager.MAX_INTERPOLATION_DISTANCE ** 2:
+            entity.draw_interpolated(screen, view_rect, previous, alpha)
+
+            if config.dirty_rect_rendering:
+                # drawn somewhere between the previous position and this one
+                rect = entity.dirty_rect(view_rect)
+                offset = previous - entity.position_snapshot
+                self._drawn_rects.append(rect.union(rect.move(offset.x, offset.y)))
+        else:
+            entity.draw(screen, view_rect)
+
+            if config.dirty_rect_rendering:
+                self._drawn_rects.append(entity.dirty_rect(view_rect))
 
     def update(self, dt, view_rect, tf_enforce_range=True):
         # update only screen and a quarter
@@ -99,24 +351,49 @@ class EntityManager:
         minx = view_rect.left - offscreen_range
         maxx = view_rect.right + offscreen_range
 
+        self._previous_positions.clear()
+
         for layer in self.update_ordering:
             self.update_layer(layer, dt, view_rect, minx, maxx)
 
     def update_layer(self, layer, dt, view_rect, minx=None, maxx=None):
         assert layer in self.layers
 
-        entities = list(self.layers[layer])  # since entities might be removed
+        with profiler.zone(_update_zone_names[layer]):
+            self._update_layer(layer, dt, view_rect, minx, maxx)
+
+    def _update_layer(self, layer, dt, view_rect, minx, maxx):
+        current_x = self._current_x
+        entities = self._get_entities_in_range(layer, minx, maxx)
+        profiling = profiler.enabled
+
+        if layer in self.before_layer_update:
+            self.before_layer_update[layer](entities)
+
+        if self._touched is not None:
+            self._touched.update(entities)
+
+        if config.interpolate_rendering:
+            previous_positions = self._previous_positions
+
+            for entity in entities:
+                previous_positions[entity] = entity.position_snapshot
 
         for entity in entities:
-            xpos = entity.position.x
+            xpos = current_x.get(entity)
+
+            if xpos is None:  # unregistered by an earlier entity, but still updated this frame
+                xpos = entity.position.x
 
             if not minx or xpos >= minx:
                 if not maxx or xpos <= maxx:
-                    if hasattr(entity, "enabled"):
-                        if entity.enabled:
+                    if getattr(entity, "enabled", True):
+                        if profiling:
+                            # one zone per entity type, to see which kind of entity eats the time
+                            with profiler.zone(type(entity).__name__):
+                                entity.update(dt, view_rect)
+                        else:
                             entity.update(dt, view_rect)
-                    else:
-                        entity.update(dt, view_rect)
 
     def serialize(self):
         values = {"__class__": self.__class__.__name__}
@@ -138,6 +415,8 @@ class EntityManager:
     def deserialize(self, level, values):
         assert values["__class__"] == self.__class__.__name__
 
+        self._forget_checkpoint()
+
         # clear existing entities
         for layer in self.layers:
             entity_list = self.layers[layer].copy()
@@ -149,7 +428,8 @@ class EntityManager:
             if any(self.layers[layer]):
                 print("warning: one or more entities were not destroyed")
 
-            self.layers[layer].clear()
+            for remaining in list(self.layers[layer]):
+                self.unregister(remaining)
 
         # load new data
         for layer in self.layers:
@@ -166,7 +446,76 @@ class EntityManager:
                 if entity is not None:
                     self.register(entity)
 
+    def checkpoint(self, values):
+        """Call with what serialize just returned. Until the next checkpoint (or deserialize, or clear), entities
+        that are updated, moved, registered or unregistered are tracked, so restore_checkpoint can put those values
+        back by rebuilding only them. Everything else is taken to be as it was, and left alone"""
+        self._forget_checkpoint()
+
+        for layer in self.layers:
+            serialized = [entity for entity in self.layers[layer] if hasattr(entity, "serialize")]
+            layer_values = values[constants.layer_to_name(layer)]
+
+            assert len(serialized) == len(layer_values), "values weren't serialized from this entity manager"
+
+            self._checkpoint.update(zip(serialized, layer_values))
+
+        self._checkpoint_values = values
+
+        # entities that don't serialize wouldn't have been restored; they're as good as changed
+        self._touched = {entity for layer in self.layers.values() for entity in layer if entity not in self._checkpoint}
+
+    def restore_checkpoint(self, level, values):
+        """Same as deserialize, but if values are those of the latest checkpoint, only the entities that may have
+        changed since are destroyed and rebuilt. Rebuilt entities are updated and drawn after the others in their
+        layer, rather than in the order they were loaded"""
+        if values is not self._checkpoint_values:
+            self.deserialize(level, values)
+            return
+
+        gone = set()
+        remaining = []
+
+        # destroying an entity can register others (or unregister more), so keep going until nothing is left
+        while self._touched:
+            touched, self._touched = self._touched, set()
+
+            for entity in touched - gone:
+                gone.add(entity)
+
+                if self.is_registered(entity) and hasattr(entity, "destroy"):
+                    entity.destroy()
+
+                if self.is_registered(entity):
+                    remaining.append(entity)
+
+        if remaining:
+            print("warning: one or more entities were not destroyed")
+
+            for entity in remaining:
+                if self.is_registered(entity):
+                    self.unregister(entity)
+
+        for entity in gone:
+            entity_values = self._checkpoint.pop(entity, None)
+
+            if entity_values is not None:
+                rebuilt = LevelEntity.build(level, entity_values)
+
+                if rebuilt is not None:
+                    self.register(rebuilt)
+                    self._checkpoint[rebuilt] = entity_values
+
+        self._touched.clear()
+
+    def _forget_checkpoint(self):
+        self._checkpoint.clear()
+        self._checkpoint_values = None
+        self._touched = None
+
     def clear(self):
+        self._forget_checkpoint()
+
         for layer in self.layers:
             entity_list = self.layers[layer].copy()
 
@@ -181,13 +530,22 @@ class EntityManager:
     def search_by_type(self, cls):
         found = []
 
-        for layer in self.layers:
-            for entity in self.layers[layer]:
-                if isinstance(entity, cls):
-                    found.append(entity)
+        for entity_type in self._get_subtypes(cls):
+            found.extend(self._by_type[entity_type])
+
+        # same order a scan would find them in: by layer, then by registration
+        found.sort(key=lambda entity: (self._layer_rank[entity.layer], self._order[entity]))
 
         return found
 
+    def _get_subtypes(self, cls):
+        subtypes = self._subtypes.get(cls)
+
+        if subtypes is None:
+            subtypes = self._subtypes[cls] = [t for t in self._by_type if issubclass(t, cls)]
+
+        return subtypes
+
     def is_registered(self, entity):
         layer = entity.layer
 
@@ -197,8 +555,13 @@ class EntityManager:
         # return any entity, regardless of layer, that is intersecting with the given rect
         found = set()
 
+        self._update_index()
+
         for layer in self.layers:
-            for entity in self.layers[layer]:
+            # an entity whose left edge is further left than this can't reach the region
+            minx = rect.left - self._widest[layer] - 1
+
+            for entity in self._sorted_layers[layer].get_range(minx, rect.right + 1):
                 if rect.collidepoint(*entity.position) or rect.colliderect(entity.rect):
                     found.add(entity)
 
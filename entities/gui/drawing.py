@@ -1,6 +1,7 @@
 import pygame
 from .sliced_image import SlicedImage
 from animation import Animation
+from color_transform import scale_colors
 
 
 # distinguishes between a color, a Surface, and a SlicedImage
@@ -43,18 +44,4 @@ def generated_selected_version_circle(surf, clr):
 def generated_selected_version_darken(surf, color_multiplier):
     assert isinstance(surf, pygame.Surface)
 
-    hl_surf = surf.copy()
-
-    with pygame.PixelArray(hl_surf) as pixels:
-        for y in range(hl_surf.get_height()):
-            for x in range(hl_surf.get_width()):
-                unmapped = hl_surf.unmap_rgb(pixels[x, y])  # type: pygame.Color
-
-                if unmapped != pygame.Color('magenta'):
-                    unmapped.r = int(unmapped.r * color_multiplier)
-                    unmapped.g = int(unmapped.g * color_multiplier)
-                    unmapped.b = int(unmapped.b * color_multiplier)
-
-                    pixels[x, y] = hl_surf.map_rgb(unmapped)
-
-    return hl_surf
+    return scale_colors(surf, color_multiplier, pygame.Color('magenta'))
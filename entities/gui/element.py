@@ -45,6 +45,10 @@ class Element(Entity, EventHandler):
     def layer(self):
         return constants.Interface
 
+    def dirty_rect(self, view_rect):
+        # elements are positioned in screen coordinates already, and draw their children inside their own rect
+        return self.rect.copy()
+
     def handle_event(self, evt, game_events):
         self.handle_event_children(evt, game_events)
 
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from copy import copy
 import pygame
+from profiler import profiled
 
 
 class EventHandler(ABC):
@@ -26,6 +27,7 @@ class GameEvents:
     def __init__(self):
         self._handlers = []
 
+    @profiled("GameEvents.do_events")
     def do_events(self):
         handlers = copy(self._handlers)  # in case event handlers insert more event handlers on an event
 
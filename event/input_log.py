@@ -0,0 +1,196 @@
+import hashlib
+import struct
+import config
+
+
+class InputLog:
+    """Player input for every physics step of a run, plus hashes of the game state taken every so often.
+
+    On disk the inputs are run-length encoded: held buttons rarely change from one step to the next, so a minute of
+    play usually takes a few hundred bytes. Layout (little endian):
+
+        header    magic 'SMBI', version (u8), dt (f64), random seed (u32), hash interval (u32), level path (u16 + utf8)
+        inputs    run count (u32), then per run: button mask (u8), length in steps (u16)
+        hashes    hash count (u32), then per hash: step (u32), state hash (u64)"""
+
+    MAGIC = b'SMBI'
+    VERSION = 1
+
+    # one bit per button, in this order
+    BUTTONS = ('left', 'right', 'up', 'down', 'jump', 'dash', 'fire')
+
+    _HEADER = struct.Struct('<4sBdII')
+    _RUN = struct.Struct('<BH')
+    _HASH = struct.Struct('<IQ')
+    _COUNT = struct.Struct('<I')
+    _PATH_LENGTH = struct.Struct('<H')
+
+    def __init__(self, level_path, seed, dt=config.PHYSICS_DT, hash_interval=240):
+        assert hash_interval > 0
+
+        self.level_path = level_path
+        self.seed = seed
+        self.dt = dt
+        self.hash_interval = hash_interval
+
+        self.frames = bytearray()  # button mask per step
+        self.hashes = {}  # step -> state hash
+
+    def __len__(self):
+        return len(self.frames)
+
+    @staticmethod
+    def get_mask(player_input):
+        mask = 0
+
+        for bit, button in enumerate(InputLog.BUTTONS):
+            if getattr(player_input, button):
+                mask |= 1 << bit
+
+        return mask
+
+    @staticmethod
+    def apply_mask(mask, player_input):
+        for bit, button in enumerate(InputLog.BUTTONS):
+            setattr(player_input, button, (mask >> bit) & 1 == 1)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return InputLog.from_bytes(f.read())
+
+    def to_bytes(self):
+        path = self.level_path.encode('utf-8')
+
+        parts = [InputLog._HEADER.pack(InputLog.MAGIC, InputLog.VERSION, self.dt, self.seed, self.hash_interval),
+                 InputLog._PATH_LENGTH.pack(len(path)), path]
+
+        runs = self._get_runs()
+
+        parts.append(InputLog._COUNT.pack(len(runs)))
+        parts.extend(InputLog._RUN.pack(mask, length) for mask, length in runs)
+
+        parts.append(InputLog._COUNT.pack(len(self.hashes)))
+        parts.extend(InputLog._HASH.pack(step, state_hash) for step, state_hash in sorted(self.hashes.items()))
+
+        return b''.join(parts)
+
+    @staticmethod
+    def from_bytes(data):
+        magic, version, dt, seed, hash_interval = InputLog._HEADER.unpack_from(data, 0)
+        offset = InputLog._HEADER.size
+
+        if magic != InputLog.MAGIC:
+            raise ValueError("not an input log")
+
+        if version != InputLog.VERSION:
+            raise ValueError(f"unsupported input log version {version}")
+
+        path_length, = InputLog._PATH_LENGTH.unpack_from(data, offset)
+        offset += InputLog._PATH_LENGTH.size
+
+        log = InputLog(data[offset:offset + path_length].decode('utf-8'), seed, dt, hash_interval)
+        offset += path_length
+
+        run_count, = InputLog._COUNT.unpack_from(data, offset)
+        offset += InputLog._COUNT.size
+
+        for mask, length in InputLog._RUN.iter_unpack(data[offset:offset + run_count * InputLog._RUN.size]):
+            log.frames.extend(bytes((mask,)) * length)
+
+        offset += run_count * InputLog._RUN.size
+
+        hash_count, = InputLog._COUNT.unpack_from(data, offset)
+        offset += InputLog._COUNT.size
+
+        for step, state_hash in InputLog._HASH.iter_unpack(data[offset:offset + hash_count * InputLog._HASH.size]):
+            log.hashes[step] = state_hash
+
+        return log
+
+    def _get_runs(self):
+        runs = []
+        frames = self.frames
+        start = 0
+
+        while start < len(frames):
+            mask = frames[start]
+            end = start + 1
+
+            while end < len(frames) and frames[end] == mask and end - start < 0xFFFF:
+                end += 1
+
+            runs.append((mask, end - start))
+            start = end
+
+        return runs
+
+
+def get_state_hash(level):
+    """64 bit hash of the parts of a level's state that gameplay depends on: every registered entity's class and
+    position, mario's velocity, and the player's statistics"""
+    h = hashlib.blake2b(digest_size=8)
+    pack = struct.Struct('<dd').pack
+
+    for layer, entities in level.entity_manager.layers.items():
+        h.update(struct.pack('<II', layer, len(entities)))
+
+        for entity in entities:
+            h.update(type(entity).__name__.encode('utf-8'))
+            h.update(pack(*entity.position_snapshot))
+
+    h.update(pack(level.mario.movement.horizontal_speed, level.mario.movement.vertical_speed))
+    h.update(struct.pack('<iii', level.stats.score, level.stats.coins, level.stats.lives))
+
+    return int.from_bytes(h.digest(), 'little')
+
+
+class InputRecorder:
+    """Level.input_hook that writes down the player's input at the start of every physics step"""
+    def __init__(self, log: InputLog):
+        self.log = log
+
+    def __call__(self, level):
+        log = self.log
+        step = len(log.frames)
+
+        if step % log.hash_interval == 0:
+            log.hashes[step] = get_state_hash(level)
+
+        log.frames.append(InputLog.get_mask(level.player_input))
+
+
+class InputPlayer:
+    """Level.input_hook that plays back recorded input, checking the game state against the recorded hashes"""
+    def __init__(self, log: InputLog):
+        self.log = log
+        self.step = 0
+        self.hashes_checked = 0
+        self.mismatches = []  # (step, expected hash, actual hash)
+
+    @property
+    def finished(self):
+        return self.step >= len(self.log.frames)
+
+    def __call__(self, level):
+        log = self.log
+
+        if self.finished:
+            InputLog.apply_mask(0, level.player_input)  # recording is over: let go of everything
+            return
+
+        expected = log.hashes.get(self.step)
+
+        if expected is not None:
+            actual = get_state_hash(level)
+            self.hashes_checked += 1
+
+            if actual != expected:
+                self.mismatches.append((self.step, expected, actual))
+
+        InputLog.apply_mask(log.frames[self.step], level.player_input)
+        self.step += 1
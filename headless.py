@@ -0,0 +1,185 @@
+"""Headless runtime: simulates a level with no window, no rendering and no audible sound.
+
+    session = HeadlessSession("levels/level-1-1.level", input_script=held_input("right", "dash"))
+    session.run(60 * config.physics_rate)
+
+Rendering is skipped entirely (nothing ever draws, and score labels are never rendered to text). A 1x1 display
+surface on SDL's dummy video driver still exists, because loading assets converts surfaces to the display format;
+sound goes to SDL's dummy audio driver so the mixer calls made during play keep working. Each step is recorded as
+a frame in telemetry, with only update time filled in"""
+import os
+import random
+from typing import NamedTuple
+import pygame
+from state.game_state import state_stack
+from state.run_level import RunLevel
+from assets import AssetManager
+from assets.level import Level
+from assets.statistics import Statistics
+from entities.entity_manager import EntityManager
+from entities.effects.level_cleared import LevelCleared
+from entities.effects.mario_death import MarioDeath
+from event import GameEvents
+from event.input_log import InputLog, InputRecorder, InputPlayer
+from telemetry import telemetry, FrameTelemetry
+import config
+
+
+def init_headless():
+    # must happen before pygame is initialized; has no effect on a display that already exists
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    pygame.init()
+
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1))
+
+
+def held_input(*names):
+    """Input script that holds the named PlayerInputHandler flags down for the whole run"""
+    def script(step_index, player_input):
+        for name in names:
+            setattr(player_input, name, True)
+
+    return script
+
+
+class SilentLabels:
+    """Stand-in for scoring.Labels: keeps track of the same values, but never renders any text"""
+    def __init__(self):
+        self.world = '1-1'
+        self.time = 400
+        self.coins = 0
+        self.lives = 3
+        self.points = 0
+
+    def prep_labels(self):
+        pass
+
+    def prep_lives(self):
+        pass
+
+    def prep_coins(self):
+        pass
+
+    def prep_world(self):
+        pass
+
+    def prep_points(self):
+        pass
+
+    def prep_time(self):
+        pass
+
+    def show_labels(self, screen):
+        pass
+
+
+class HeadlessSession:
+    """Loads a single level and steps it at a fixed dt, feeding it scripted input.
+
+    The level runs inside a RunLevel state on the regular state stack, so anything that takes over from the level
+    (power up transformations, for instance) behaves exactly as it does in the game. Things that would wait for a
+    sound to end (clearing the level, dying) end the session instead"""
+    def __init__(self, level_path, assets=None, input_script=None, dt=config.PHYSICS_DT, seed=None, input_hook=None):
+        init_headless()
+
+        # some entities are randomized when they're created, so this has to happen before the level is loaded
+        if seed is not None:
+            random.seed(seed)
+
+        self.dt = dt
+        self.input_script = input_script
+        self.assets = assets or AssetManager()
+        self.labels = SilentLabels()
+        self.stats = Statistics(self.labels)
+        self.stats.reset()
+
+        self.level = Level(self.assets, EntityManager.create_default(), self.stats)
+        self.level.load_from_path(level_path)
+        self.level.input_hook = input_hook
+
+        self.run_level = RunLevel(GameEvents(), self.assets, self.level, self.stats, self.labels)
+        self.state_stack = state_stack
+
+        self.state_stack.states.clear()
+        self.state_stack.push(self.run_level)
+
+        self.level.begin()
+
+        self.steps_taken = 0
+
+    def step(self, count=1):
+        """Advances the simulation by count steps, or fewer if the session finishes first. Returns steps taken"""
+        taken = 0
+
+        while taken < count and not self.finished:
+            if self.input_script is not None:
+                self.input_script(self.steps_taken, self.level.player_input)
+
+            telemetry.begin_frame()
+
+            with telemetry.measure(FrameTelemetry.UPDATE):
+                self.state_stack.update(self.dt)
+
+            telemetry.add_steps(1)
+
+            self.steps_taken += 1
+            taken += 1
+
+        return taken
+
+    def run(self, max_steps):
+        return self.step(max_steps)
+
+    @property
+    def elapsed(self):
+        return self.steps_taken * self.dt
+
+    @property
+    def outcome(self):
+        """None while the level is still being played, otherwise 'cleared', 'died' or 'timed out'"""
+        if self.level.cleared or any(isinstance(s, LevelCleared) for s in self.state_stack.states):
+            return 'cleared'
+
+        if self.level.entity_manager.search_by_type(MarioDeath):
+            return 'died'
+
+        if self.level.timed_out:
+            return 'timed out'
+
+        return None
+
+    @property
+    def finished(self):
+        return self.outcome is not None or self.state_stack.top is None
+
+
+def record(level_path, max_steps, input_script, seed=0, hash_interval=240, assets=None):
+    """Plays a level headless with scripted input, and returns the run as an InputLog"""
+    log = InputLog(level_path, seed, hash_interval=hash_interval)
+    session = HeadlessSession(level_path, assets, input_script, log.dt, seed, InputRecorder(log))
+
+    session.run(max_steps)
+
+    return log
+
+
+class ReplayResult(NamedTuple):
+    steps: int  # physics steps of the log that were played back
+    recorded_steps: int
+    hashes_checked: int
+    mismatches: list  # (step, expected hash, actual hash)
+    outcome: str
+
+
+def replay(log, assets=None):
+    """Plays an InputLog back as fast as possible, checking the game state against its hashes"""
+    player = InputPlayer(log)
+    session = HeadlessSession(log.level_path, assets, None, log.dt, log.seed, player)
+
+    while not player.finished and not session.finished:
+        session.step()
+
+    return ReplayResult(player.step, len(log), player.hashes_checked, player.mismatches, session.outcome)
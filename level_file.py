@@ -0,0 +1,248 @@
+"""Reading and writing .level files.
+
+Levels are stored in a compact binary format; the older JSON format (one dict per tile) is still read, and can be
+written with binary=False to export a level in a readable form. The binary layout, all little-endian:
+
+    header       magic "SMBLEVEL", format version, map width and height (in tiles), flags, background RGB
+    strings      level name, file name
+    tiles        zlib-compressed tile indices (int16, row by row, -1 for no tile) followed by passability bytes
+    entities     entity manager class; then per layer its name and entity count, and per entity its name,
+                 position and any other values it serialized (as JSON, usually empty)
+
+Strings are a 16 bit length followed by UTF-8. A file is recognized by its magic, not its extension.
+
+To convert levels from one format to the other, run from the repository root:
+
+    python -m level_file levels/*.level [--json]"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b"SMBLEVEL"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHIIB3B")  # magic, version, width, height, flags, background r, g, b
+_LENGTH = struct.Struct("<H")
+_COUNT = struct.Struct("<I")
+_POSITION = struct.Struct("<dd")
+
+_NORMAL_PHYSICS = 0x1
+
+_NO_TILE = -1  # TileMap.NO_TILE, duplicated so conversion doesn't need pygame
+
+
+class LevelFormatError(Exception):
+    pass
+
+
+def is_binary(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read(path):
+    """Reads a level in either format, returning the values Level.deserialize takes. A binary level's tile map
+    values hold the packed tile_indices and passable arrays instead of a list of squares"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if data.startswith(MAGIC):
+        return _unpack(data)
+
+    return json.loads(data.decode('utf-8'))
+
+
+def write(path, values, binary=True):
+    """Writes the values of Level.serialize (tile map packed or not) to path, as binary or JSON"""
+    if binary:
+        data = _pack(values)
+    else:
+        data = json.dumps(unpack_tile_map(values)).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def pack_tile_map(values):
+    """Level values with the tile map as packed tile_indices and passable arrays, whichever way it came"""
+    tile_map = values["tile_map"]
+
+    if "tile_indices" in tile_map:
+        return values
+
+    width, height = int(tile_map["width"]), int(tile_map["height"])
+    tile_indices = array('h', [_NO_TILE]) * (width * height)
+    passable = bytearray(b'\x01') * (width * height)
+
+    # squares are stored column by column
+    for i, square in enumerate(tile_map["tile_map"][:width * height]):
+        x, y = divmod(i, height)
+
+        if 'idx' in square:
+            tile_indices[y * width + x] = int(square['idx'])
+
+        if 'passable' in square:
+            passable[y * width + x] = 0
+
+    return dict(values, tile_map={"width": width, "height": height, "tile_indices": tile_indices,
+                                  "passable": passable})
+
+
+def unpack_tile_map(values):
+    """Level values with the tile map as the list of squares the JSON format uses, whichever way it came"""
+    tile_map = values["tile_map"]
+
+    if "tile_indices" not in tile_map:
+        return values
+
+    width, height = tile_map["width"], tile_map["height"]
+    tile_indices, passable = tile_map["tile_indices"], tile_map["passable"]
+
+    def square(offset):
+        result = {}
+
+        if tile_indices[offset] != _NO_TILE:
+            result['idx'] = str(tile_indices[offset])
+
+        if not passable[offset]:
+            result['passable'] = str(False)
+
+        return result
+
+    return dict(values, tile_map={"width": width, "height": height,
+                                  "tile_map": [square(y * width + x) for x in range(width) for y in range(height)]})
+
+
+def _pack(values):
+    values = pack_tile_map(values)
+    tile_map = values["tile_map"]
+
+    flags = _NORMAL_PHYSICS if values.get("normal_physics", True) else 0
+    r, g, b = values["background_color"][:3]
+
+    chunks = [_HEADER.pack(MAGIC, VERSION, tile_map["width"], tile_map["height"], flags, r, g, b),
+              _pack_string(values.get("name", "unknown")),
+              _pack_string(values.get("filename") or "")]
+
+    tile_indices = array('h', tile_map["tile_indices"])
+
+    if sys.byteorder != 'little':
+        tile_indices.byteswap()
+
+    tiles = zlib.compress(tile_indices.tobytes() + bytes(tile_map["passable"]), 9)
+    chunks.extend([_COUNT.pack(len(tiles)), tiles])
+
+    entities = dict(values["entities"])
+    chunks.append(_pack_string(entities.pop("__class__")))
+    chunks.append(_LENGTH.pack(len(entities)))
+
+    for layer_name, entity_values in entities.items():
+        chunks.extend([_pack_string(layer_name), _COUNT.pack(len(entity_values))])
+
+        for entity in entity_values:
+            entity = dict(entity)
+
+            chunks.append(_pack_string(entity.pop("name")))
+            chunks.append(_POSITION.pack(*entity.pop("position")))
+            chunks.append(_pack_string(json.dumps(entity) if entity else ""))
+
+    return b"".join(chunks)
+
+
+def _unpack(data):
+    try:
+        view = memoryview(data)
+        magic, version, width, height, flags, r, g, b = _HEADER.unpack_from(view, 0)
+        offset = _HEADER.size
+
+        if version != VERSION:
+            raise LevelFormatError(f"unsupported level format version {version}")
+
+        name, offset = _unpack_string(view, offset)
+        filename, offset = _unpack_string(view, offset)
+
+        length = _COUNT.unpack_from(view, offset)[0]
+        offset += _COUNT.size
+
+        tiles = zlib.decompress(view[offset:offset + length])
+        offset += length
+
+        count = width * height
+
+        if len(tiles) != count * 3:
+            raise LevelFormatError(f"expected {count * 3} bytes of tiles, found {len(tiles)}")
+
+        tile_indices = array('h')
+        tile_indices.frombytes(tiles[:count * 2])
+
+        if sys.byteorder != 'little':
+            tile_indices.byteswap()
+
+        passable = bytearray(tiles[count * 2:])
+
+        entity_class, offset = _unpack_string(view, offset)
+        entities = {"__class__": entity_class}
+
+        layer_count = _LENGTH.unpack_from(view, offset)[0]
+        offset += _LENGTH.size
+
+        for _ in range(layer_count):
+            layer_name, offset = _unpack_string(view, offset)
+            entity_count = _COUNT.unpack_from(view, offset)[0]
+            offset += _COUNT.size
+
+            layer = entities[layer_name] = []
+
+            for _ in range(entity_count):
+                entity_name, offset = _unpack_string(view, offset)
+                x, y = _POSITION.unpack_from(view, offset)
+                offset += _POSITION.size
+                extra, offset = _unpack_string(view, offset)
+
+                entity = {"name": entity_name, "position": [x, y]}
+                entity.update(json.loads(extra) if extra else {})
+
+                layer.append(entity)
+    except (struct.error, zlib.error, UnicodeDecodeError, ValueError) as e:
+        raise LevelFormatError(f"corrupt level file: {e}") from e
+
+    return {"name": name,
+            "filename": filename,
+            "normal_physics": bool(flags & _NORMAL_PHYSICS),
+            "background_color": (r, g, b),
+            "tile_map": {"width": width, "height": height, "tile_indices": tile_indices, "passable": passable},
+            "entities": entities}
+
+
+def _pack_string(s):
+    encoded = s.encode('utf-8')
+
+    return _LENGTH.pack(len(encoded)) + encoded
+
+
+def _unpack_string(view, offset):
+    length = _LENGTH.unpack_from(view, offset)[0]
+    offset += _LENGTH.size
+
+    return bytes(view[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert .level files between the binary and JSON formats")
+    parser.add_argument("levels", nargs="+", metavar="LEVEL", help="level files to convert in place")
+    parser.add_argument("--json", action="store_true", help="write JSON instead of binary")
+    args = parser.parse_args()
+
+    for path in args.levels:
+        values = read(path)
+        write(path, values, binary=not args.json)
+
+        print(f"{path}: {'JSON' if args.json else 'binary'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+from functools import wraps
+from time import perf_counter_ns
+import config
+
+
+class ZoneNode:
+    """Time spent in a named zone, with the zones entered while inside it as children"""
+    __slots__ = ['name', 'ns', 'calls', 'children']
+
+    def __init__(self, name):
+        self.name = name
+        self.ns = 0
+        self.calls = 0
+        self.children = {}
+
+    def merge(self, other):
+        self.ns += other.ns
+        self.calls += other.calls
+
+        for name, child in other.children.items():
+            mine = self.children.get(name)
+
+            if mine is None:
+                mine = self.children[name] = ZoneNode(name)
+
+            mine.merge(child)
+
+    def count_calls(self, name):
+        """Calls of every zone with the given name, wherever it shows up under this one"""
+        return (self.calls if self.name == name else 0) + sum(c.count_calls(name) for c in self.children.values())
+
+    def to_dict(self, frames=1):
+        """Times in milliseconds and call counts, averaged over frames"""
+        return {"name": self.name,
+                "ms": self.ns / 1e6 / frames,
+                "calls": self.calls / frames,
+                "children": [child.to_dict(frames) for child in self._sorted_children()]}
+
+    def _sorted_children(self):
+        return sorted(self.children.values(), key=lambda c: c.ns, reverse=True)
+
+    def format(self, frames=1, indent=0):
+        lines = [f"{'  ' * indent}{self.name:<{48 - 2 * indent}} {self.ns / 1e6 / frames:9.3f} ms "
+                 f"{self.calls / frames:9.1f} calls"]
+
+        for child in self._sorted_children():
+            lines.extend(child.format(frames, indent + 1))
+
+        return lines
+
+
+class _NullZone:
+    """What a zone is while profiling is off: does nothing at all"""
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_null_zone = _NullZone()
+
+
+class _Zone:
+    __slots__ = ['_profiler', '_name']
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        p = self._profiler
+        parent = p._stack[-1]
+        node = parent.children.get(self._name)
+
+        if node is None:
+            node = parent.children[self._name] = ZoneNode(self._name)
+
+        p._stack.append(node)
+        p._starts.append(perf_counter_ns())
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        p = self._profiler
+        elapsed = perf_counter_ns() - p._starts.pop()
+        node = p._stack.pop()
+
+        node.ns += elapsed
+        node.calls += 1
+
+
+class Profiler:
+    """Named timing zones that nest into a tree per frame.
+
+        with profiler.zone("TileMap.draw"):
+            ...
+
+    Zones entered inside another zone become its children, so the same name can show up in several places in the
+    tree. Frames are delimited by begin_frame (telemetry calls it); the last frame's tree is kept, and every frame
+    is added to a running total until clear(). While disabled, zone() hands back a shared object that does nothing"""
+    def __init__(self):
+        self.enabled = config.profile_zones
+
+        self.last_frame = None  # tree of the last finished frame
+        self.totals = ZoneNode("frame")  # every frame since the last clear, added up
+        self.frames = 0
+
+        self._root = ZoneNode("frame")
+        self._stack = [self._root]
+        self._starts = []
+        self._zones = {}
+
+    def zone(self, name):
+        if not self.enabled:
+            return _null_zone
+
+        zone = self._zones.get(name)
+
+        if zone is None:
+            zone = self._zones[name] = _Zone(self, name)
+
+        return zone
+
+    def begin_frame(self, frame_ns=0):
+        """Finishes the frame in progress, which took frame_ns in total. Does nothing if no zone was entered"""
+        if len(self._stack) > 1:
+            return  # called from inside a zone; the frame isn't over yet
+
+        root = self._root
+
+        if not root.children:
+            return
+
+        root.ns = frame_ns
+        root.calls = 1
+
+        self.last_frame = root
+        self.totals.merge(root)
+        self.frames += 1
+
+        self._root = ZoneNode("frame")
+        self._stack = [self._root]
+
+    def clear(self):
+        self.last_frame = None
+        self.totals = ZoneNode("frame")
+        self.frames = 0
+
+        self._root = ZoneNode("frame")
+        self._stack = [self._root]
+        self._starts = []
+
+    def report(self):
+        """Average time and calls per frame of every zone, as indented text"""
+        if self.frames == 0:
+            return "no profiling zones were recorded"
+
+        return "\n".join([f"zones averaged over {self.frames} frames"] + self.totals.format(self.frames))
+
+    def to_dict(self):
+        return self.totals.to_dict(max(1, self.frames))
+
+
+profiler = Profiler()
+
+
+def profiled(name):
+    """Decorator putting every call of the function in a zone"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+
+            with profiler.zone(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
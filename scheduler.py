@@ -0,0 +1,79 @@
+import config
+
+
+class FixedStepScheduler:
+    """Turns variable frame times into a whole number of fixed-length physics steps per frame.
+
+    Time that can't be simulated within the per-frame step budget is dropped rather than carried over, so a slow
+    frame can't snowball into ever slower frames. Whatever is left over (less than one step) is exposed as alpha,
+    how far rendering is between the last two physics states"""
+
+    def __init__(self, step_dt=config.PHYSICS_DT, max_steps=config.max_physics_steps):
+        assert step_dt > 0.
+        assert max_steps >= 1
+
+        self.step_dt = step_dt
+        self.max_steps = max_steps
+
+        self._accumulator = 0.
+        self._alpha = 1.
+        self._step_index = 0
+        self._steps_last_frame = 0
+        self._dropped_last_frame = 0.
+        self._dropped_total = 0.
+
+    def advance(self, elapsed, step):
+        """Accumulates elapsed seconds and calls step(dt) once per whole physics step, up to the budget"""
+        self._accumulator += elapsed
+        steps = 0
+
+        while self._accumulator >= self.step_dt and steps < self.max_steps:
+            self._step_index += 1
+            step(self.step_dt)
+
+            self._accumulator -= self.step_dt
+            steps += 1
+
+        # over budget: drop the whole steps we didn't get to, but keep the fraction so rendering stays smooth
+        dropped = 0.
+
+        if self._accumulator >= self.step_dt:
+            dropped = int(self._accumulator / self.step_dt + 1e-9) * self.step_dt  # tolerate rounding in the sum
+            self._accumulator = max(0., self._accumulator - dropped)
+
+        self._steps_last_frame = steps
+        self._dropped_last_frame = dropped
+        self._dropped_total += dropped
+        self._alpha = self._accumulator / self.step_dt
+
+        return steps
+
+    def reset(self):
+        self._accumulator = 0.
+        self._alpha = 1.
+
+    @property
+    def alpha(self):
+        """Fraction of a physics step between the last simulated state and the time being rendered"""
+        return self._alpha
+
+    @property
+    def step_index(self):
+        """Number of physics steps taken so far; lets things tell whether they were part of the latest step"""
+        return self._step_index
+
+    @property
+    def steps_last_frame(self):
+        return self._steps_last_frame
+
+    @property
+    def dropped_last_frame(self):
+        """Seconds of simulation that were skipped last frame because the step budget ran out"""
+        return self._dropped_last_frame
+
+    @property
+    def dropped_total(self):
+        return self._dropped_total
+
+
+game_scheduler = FixedStepScheduler()
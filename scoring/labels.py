@@ -1,5 +1,7 @@
 import pygame
 import pygame.font
+from profiler import profiled
+from dirty_rects import dirty_rects
 
 
 class Labels:
@@ -46,6 +48,9 @@ class Labels:
         self.lives_image = None
         self.lives_rect = None
 
+        # where the labels were last shown, so a label whose text got shorter doesn't leave the old text behind
+        self._shown_rects = ()
+
         # Prep it all
         self.prep_labels()
         self.prep_lives()
@@ -115,6 +120,7 @@ class Labels:
         self.lives_rect.left = self.lives_rect.left + 915
         self.lives_rect.top = 48
 
+    @profiled("Labels.show_labels")
     def show_labels(self, screen):
         screen.blit(self.text1_image, self.text1_rect)
         screen.blit(self.text2_image, self.text2_rect)
@@ -126,3 +132,11 @@ class Labels:
         screen.blit(self.world_image, self.world_rect)
         screen.blit(self.coins_image, self.coins_rect)
         screen.blit(self.lives_image, self.lives_rect)
+
+        shown = (self.text1_rect, self.text2_rect, self.text3_rect, self.text4_rect, self.text5_rect,
+                 self.points_rect, self.time_rect, self.world_rect, self.coins_rect, self.lives_rect)
+
+        dirty_rects.add_all(self._shown_rects)
+        dirty_rects.add_all(shown)
+
+        self._shown_rects = tuple(rect.copy() for rect in shown)
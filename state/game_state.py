@@ -1,9 +1,13 @@
 from abc import abstractmethod
 from abc import ABC
 from event import GameEvents
+from dirty_rects import dirty_rects
+import config
 
 
 class GameState(ABC):
+    reports_dirty_rects = False  # draw adds what it touched to dirty_rects itself; otherwise the whole screen counts
+
     def __init__(self, game_events=None):
         super().__init__()
 
@@ -22,6 +26,11 @@ class GameState(ABC):
     def finished(self):
         return True
 
+    @property
+    def needs_redraw(self):
+        """Whether drawing again would change anything on screen. Only asked in dirty rect mode"""
+        return True
+
     def activated(self):
         """Script just became top state in stack"""
         pass
@@ -40,6 +49,7 @@ class NoStatesError(RuntimeError):
 class GameStateStack:
     def __init__(self, initial_state=None):
         self.states = [] if initial_state is None else [initial_state]
+        self._drawn_state = None  # state that drew the screen last, in dirty rect mode
 
         if self.top is not None:
             initial_state.activated()
@@ -88,8 +98,25 @@ class GameStateStack:
 
     def draw(self, screen):
         top = self.top
-        if top:
+
+        if top is None:
+            return
+
+        if not config.dirty_rect_rendering:
             top.draw(screen)
+            return
+
+        # a state that just became the top one has never drawn this screen, so it always draws all of it
+        if top is not self._drawn_state:
+            self._drawn_state = top
+            dirty_rects.add_everything()
+        elif not top.needs_redraw:
+            return
+
+        top.draw(screen)
+
+        if not top.reports_dirty_rects:
+            dirty_rects.add_everything()
 
     def event(self, event):
         top = self.top
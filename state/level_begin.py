@@ -51,6 +51,10 @@ class LevelBegin(GameState):
         screen.blit(self.mario_icon, self.mario_pos)
         screen.blit(self.lives, self.lives_pos)
 
+    @property
+    def needs_redraw(self):
+        return False  # nothing on this screen moves
+
     @property
     def finished(self):
         return self.elapsed >= LevelBegin.DURATION
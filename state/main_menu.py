@@ -8,12 +8,15 @@ from .game_state import state_stack
 from editor.editor_state import EditorState
 from entities.entity_manager import EntityManager
 from util import make_vector
+from dirty_rects import dirty_rects
 import config
 from scoring import Labels
 from assets.statistics import Statistics
 
 
 class MainMenu(GameState, EventHandler):
+    reports_dirty_rects = True
+
     def __init__(self, assets):
         super().__init__(GameEvents())
 
@@ -45,8 +48,6 @@ class MainMenu(GameState, EventHandler):
         self.level.update(dt)
 
     def draw(self, screen):
-        screen.fill(self.level.background_color)
-
         self.level.draw(screen)
 
         screen.blit(self._banner.image, make_vector(*config.screen_rect.center) -
@@ -84,6 +85,7 @@ class MainMenu(GameState, EventHandler):
 
                 screen.blit(self._mushroom.image, mr)
 
+            dirty_rects.add((0, r.y, config.screen_rect.width, r.height))  # the button and its mushrooms
             r.y += r.height + 10
 
         self._scoring.show_labels(screen)
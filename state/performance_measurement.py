@@ -1,4 +1,3 @@
-from typing import NamedTuple
 import pygame
 from .game_state import GameState
 from .game_state import GameStateStack
@@ -7,18 +6,23 @@ from entities.gui.text import Text
 from entities.entity_manager import EntityManager
 from util import make_vector
 from event import EventHandler
+from scheduler import game_scheduler
+from telemetry import telemetry, FrameTelemetry
 import config
 import constants
 
 
-class _Measurement(NamedTuple):
-    min: int
-    avg: float
-    max: int
-    max_overall: int
-
-
 class PerformanceMeasurement(GameState, EventHandler):
+    """Overlay showing frame time percentiles from the telemetry module, with a graph of recent frame times"""
+    GRAPH_SIZE = (240, 80)
+    GRAPH_SCALE_MS = 50.  # frame time at the top of the graph
+    GRAPH_COLORS = {FrameTelemetry.EVENTS: (255, 255, 0),
+                    FrameTelemetry.UPDATE: (0, 200, 0),
+                    FrameTelemetry.DRAW: (64, 128, 255),
+                    FrameTelemetry.FLIP: (200, 0, 200)}
+    TARGET_COLOR = (255, 255, 255)
+    OTHER_COLOR = (128, 128, 128)  # part of the frame not spent in any channel (waiting, mostly)
+
     def __init__(self, state_stack, game_events, target_state: GameState):
         super().__init__(game_events)
 
@@ -36,79 +40,78 @@ class PerformanceMeasurement(GameState, EventHandler):
         game_events.register(self)
 
         self.frame_rate = Text(text_position, "Frame Rate", anchor=Anchor.TOP_RIGHT, font=font)
+        self.channel_stats = {}
 
-        text_position.y += self.frame_rate.height
-        self.draw_stats = Text(text_position, anchor=Anchor.TOP_RIGHT, text="???", font=font)
+        for channel in FrameTelemetry.CHANNELS:
+            text_position.y += self.frame_rate.height
+            self.channel_stats[channel] = Text(text_position, anchor=Anchor.TOP_RIGHT, text="???", font=font)
 
         text_position.y += self.frame_rate.height
-        self.update_rate = Text(text_position, anchor=Anchor.TOP_RIGHT, text="???", font=font)
-
-        text_position.y += self.frame_rate.height
-        self.update_stats = Text(text_position, anchor=Anchor.TOP_RIGHT, text="???", font=font)
-
-        self.entities.register([self.frame_rate, self.draw_stats, self.update_rate, self.update_stats])
+        self.dropped_time = Text(text_position, anchor=Anchor.TOP_RIGHT, text="???", font=font)
 
-        self.last_performance_update = 0
+        self.entities.register([self.frame_rate, self.dropped_time, *self.channel_stats.values()])
 
-        self.update_performance = _Measurement(0, 0, 0, 0)
-        self.update_call_count = 0
-        self.update_total_ticks = 0
+        self.graph_rect = pygame.Rect(0, 0, *PerformanceMeasurement.GRAPH_SIZE)
+        self.graph_rect.topright = (config.screen_rect.right, text_position.y + self.frame_rate.height * 2)
 
-        self.draw_performance = _Measurement(0, 0, 0, 0)
-        self.draw_call_count = 0
-        self.draw_total_ticks = 0
+        self.last_text_update = pygame.time.get_ticks()
+        self.last_frame_count = telemetry.frame_count
+        self.last_dropped_total = game_scheduler.dropped_total
 
     def update(self, dt):
-        start_tick = pygame.time.get_ticks()
         self.target_state.update(dt)
-
-        elapsed_ticks = pygame.time.get_ticks() - start_tick
-
-        self.update_call_count += 1
-        self.update_total_ticks += elapsed_ticks
-
         self.entities.update(dt, pygame.Rect(0, 0, 0, 0))
 
-        self.update_performance = _Measurement(
-            min(self.update_performance.min, elapsed_ticks),
-            self.update_performance.avg,
-            max(self.update_performance.max, elapsed_ticks),
-            max(self.update_performance.max_overall, self.update_performance.max))
-
         current_tick = pygame.time.get_ticks()
 
-        if current_tick - self.last_performance_update > 1000:
-            delta_seconds = (current_tick - self.last_performance_update) / 1000.0
+        if current_tick - self.last_text_update > 1000:
+            delta_seconds = (current_tick - self.last_text_update) / 1000.0
 
-            # these two are interested in tracking min, avg, and max elapsed ticks for update and draw
-            self._do_update_info_text()
-            self._do_draw_info_text()
-
-            # this tracks frames per second that are actually rendered
             self._do_frame_rate(delta_seconds)
+            self._do_channel_stats()
 
-            # this tracks updates per second. This does not necessarily equal frame rate
-            self._do_update_rate(delta_seconds)
+            # simulation time the scheduler had to skip because it ran out of steps
+            self._do_dropped_time(delta_seconds)
 
-            self.update_call_count, self.draw_call_count = 0, 0
-            self.update_total_ticks, self.draw_total_ticks = 0, 0
-            self.last_performance_update = current_tick
+            self.last_text_update = current_tick
 
     def draw(self, screen):
-        start_ticks = pygame.time.get_ticks()
         self.target_state.draw(screen)
+        self.entities.draw(screen, pygame.Rect(0, 0, 0, 0))
 
-        elapsed = pygame.time.get_ticks() - start_ticks
-        self.draw_call_count += 1
-        self.draw_total_ticks += elapsed
+        self._draw_graph(screen)
 
-        self.entities.draw(screen, pygame.Rect(0, 0, 0, 0))
-        self.draw_performance = _Measurement(
-            min(self.draw_performance.min, elapsed),
-            self.draw_performance.avg,
-            max(self.draw_performance.max, elapsed),
-            max(self.draw_performance.max_overall, self.draw_performance.max)
-        )
+    def _draw_graph(self, screen):
+        r = self.graph_rect
+        ms_to_pixels = r.height / PerformanceMeasurement.GRAPH_SCALE_MS / 1e6
+
+        screen.fill((0, 0, 0), r)
+
+        frames = telemetry.buffers[FrameTelemetry.FRAME].last(r.width)
+        channels = [(telemetry.buffers[channel].last(r.width), color)
+                    for channel, color in PerformanceMeasurement.GRAPH_COLORS.items()]
+
+        # one column per frame, newest on the right, stacked by channel with the remainder of the frame on top
+        x = r.right - len(frames)
+
+        for i, frame_ns in enumerate(frames):
+            bottom = r.bottom
+
+            for values, color in channels:
+                height = min(int(values[i] * ms_to_pixels), bottom - r.top)
+
+                if height > 0:
+                    pygame.draw.line(screen, color, (x + i, bottom - 1), (x + i, bottom - height))
+                    bottom -= height
+
+            top = max(r.top, r.bottom - int(frame_ns * ms_to_pixels))
+
+            if top < bottom:
+                pygame.draw.line(screen, PerformanceMeasurement.OTHER_COLOR, (x + i, bottom - 1), (x + i, top))
+
+        # line at the frame time needed for 60 fps
+        target_y = r.bottom - int(1000. / 60 * 1e6 * ms_to_pixels)
+        pygame.draw.line(screen, PerformanceMeasurement.TARGET_COLOR, (r.left, target_y), (r.right - 1, target_y))
 
     def activated(self):
         self.target_state.activated()
@@ -125,34 +128,28 @@ class PerformanceMeasurement(GameState, EventHandler):
         pm = PerformanceMeasurement(state_stack, target_state.game_events, target_state)
         state_stack.push(pm)
 
-    def _do_update_info_text(self):
-        # calc avg
-        avg = (self.update_performance.min + self.update_performance.max) * 0.5
-        self.update_stats.text = f"U: {self.update_performance.min}, {avg:.2f}," \
-                                 f" {self.update_performance.max}, {self.update_performance.max_overall}"
-        self.update_performance = \
-            _Measurement(0, avg, 0, max(self.update_performance.max_overall, self.update_performance.max))
-
-    def _do_draw_info_text(self):
-        avg = (self.draw_performance.min + self.draw_performance.max) * 0.5
-        self.draw_stats.text = f"D: {self.draw_performance.min}, {avg:.2f}," \
-                               f" {self.draw_performance.max}, {self.draw_performance.max_overall}"
-        self.draw_performance = \
-            _Measurement(0, avg, 0, max(self.draw_performance.max_overall, self.draw_performance.max))
-
     def _do_frame_rate(self, delta_seconds):
+        frames = telemetry.frame_count - self.last_frame_count
+        self.last_frame_count = telemetry.frame_count
+
         if delta_seconds > 0:
-            avg_fps = float(self.draw_call_count) / delta_seconds
-            self.frame_rate.text = f"FPS: {avg_fps:.2f}"
+            self.frame_rate.text = f"FPS: {frames / delta_seconds:.2f}"
         else:
             self.frame_rate.text = "FPS: ???"
 
-    def _do_update_rate(self, delta_seconds):
+    def _do_channel_stats(self):
+        for channel, text in self.channel_stats.items():
+            p50, p95, p99 = telemetry.percentiles(channel)
+            text.text = f"{channel} ms p50/95/99: {p50:.2f}, {p95:.2f}, {p99:.2f}"
+
+    def _do_dropped_time(self, delta_seconds):
+        dropped = game_scheduler.dropped_total - self.last_dropped_total
+        self.last_dropped_total = game_scheduler.dropped_total
+
         if delta_seconds > 0:
-            avg_updates = float(self.update_call_count) / delta_seconds
-            self.update_rate.text = f"UPS: {avg_updates:.2f}"
+            self.dropped_time.text = f"Dropped: {dropped * 1000. / delta_seconds:.1f} ms/s"
         else:
-            self.update_rate.text = "UPS: ???"
+            self.dropped_time.text = "Dropped: ???"
 
     def handle_event(self, evt, game_events):
         if evt.type == pygame.KEYDOWN and evt.key == pygame.K_ESCAPE:
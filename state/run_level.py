@@ -4,6 +4,8 @@ from event import EventHandler
 
 
 class RunLevel(GameState, EventHandler):
+    reports_dirty_rects = True  # the level and the labels do
+
     def __init__(self, game_events, assets, level, stats, labels):
         super().__init__(game_events)
 
@@ -19,7 +21,6 @@ class RunLevel(GameState, EventHandler):
         self.stats.update(dt)
 
     def draw(self, screen):
-        screen.fill(self.level.background_color)
         self.level.draw(screen)
         self.labels.show_labels(screen)
 
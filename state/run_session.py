@@ -1,20 +1,28 @@
+import os
+import random
+import time
 import pygame
 from .game_state import GameState
 from assets.statistics import Statistics
 from assets.level import Level
+from assets.level_loader import level_loader
 import entities.entity_manager
 from .run_level import RunLevel
 from state.game_state import state_stack
 from scoring import Labels
 from event import EventHandler
+from event.input_log import InputLog, InputRecorder
 from .level_begin import LevelBegin
 from .game_over import GameOver
 from .time_over import TimeOut
+import config
 
 
 class RunSession(GameState, EventHandler):
     """A session persists between levels, and is mainly about keep tracking of score, lives. A session ends
     when the player has run out of lives or has beaten all levels"""
+    reports_dirty_rects = True  # the level and the labels do
+
     def __init__(self, assets):
         super().__init__()
 
@@ -33,6 +41,7 @@ class RunSession(GameState, EventHandler):
 
         self.current_level = None
         self.level_runner = None
+        self.input_log = None
 
     def update(self, dt):
         if not self.finished:
@@ -54,30 +63,32 @@ class RunSession(GameState, EventHandler):
         return self._finished
 
     def change_state(self):
+        self._save_input_log()
+
         if self.current_level and self.current_level.timed_out:
             self.mario_stats.lives -= 1
 
         if self.mario_stats.lives == 0:
             state_stack.push(GameOver(self.scoring_labels))
-            self._finished = True
+            self._finish()
         else:
             show_timeout = self.current_level.timed_out if self.current_level else False
 
             # play again if didn't clear it or haven't tried yet
-            self.current_level = self.current_level or Level(self.assets,
-                                                             entities.entity_manager.EntityManager.create_default(),
-                                                             self.mario_stats)
+            self.current_level = self.current_level or self._create_level()
 
             if self.current_level.cleared and len(self.levels) > 0:
                 self.levels.pop(0)
 
             if len(self.levels) > 0:
                 # load and play next level
-                self.current_level = Level(self.assets,
-                                           entities.entity_manager.EntityManager.create_default(),
-                                           self.mario_stats)
+                path = "levels/" + self.levels[0][0]
 
-                self.current_level.load_from_path("levels/" + self.levels[0][0])
+                self._start_input_log(path)
+                self.current_level = self._create_level()
+                self.current_level.load_from_path(path)  # from what _preload_levels parsed, if it's ready
+
+                self.current_level.input_hook = InputRecorder(self.input_log) if self.input_log is not None else None
                 self.current_level.title = self.levels[0][1]
 
                 self.level_runner = RunLevel(self.game_events, self.assets, self.current_level, self.mario_stats,
@@ -94,10 +105,24 @@ class RunSession(GameState, EventHandler):
                     self.scoring_labels.prep_labels()
                     state_stack.states.append(TimeOut(self.game_events, self.mario_stats, self.scoring_labels))
 
+                self._preload_levels()
+
             else:
                 # todo: won the game!
                 print("won (some of) the game!")
-                self._finished = True
+                self._finish()
+
+    def _create_level(self):
+        return Level(self.assets, entities.entity_manager.EntityManager.create_default(), self.mario_stats)
+
+    def _preload_levels(self):
+        # this level again, in case mario doesn't make it, and the one after
+        for filename, _ in self.levels[:2]:
+            level_loader.parse("levels/" + filename)
+
+    def _finish(self):
+        self._finished = True
+        level_loader.discard()
 
     def activated(self):
         if self.finished:
@@ -126,6 +151,29 @@ class RunSession(GameState, EventHandler):
 
         self.game_events.unregister(self)
 
+    def _start_input_log(self, level_path):
+        if config.record_input_directory is None:
+            return
+
+        # some entities are randomized when they're created, so seed before loading for the replay to match
+        seed = random.randrange(1 << 32)
+        random.seed(seed)
+
+        self.input_log = InputLog(level_path, seed)
+
+    def _save_input_log(self):
+        if self.input_log is None:
+            return
+
+        os.makedirs(config.record_input_directory, exist_ok=True)
+
+        level_name = os.path.splitext(os.path.basename(self.input_log.level_path))[0]
+        path = os.path.join(config.record_input_directory, f"{level_name}-{time.strftime('%Y%m%d-%H%M%S')}.smbi")
+
+        self.input_log.save(path)
+        self.input_log = None
+
     def handle_event(self, evt, game_events):
         if evt.type == pygame.KEYDOWN and evt.key == pygame.K_ESCAPE:
-            self._finished = True
+            self._save_input_log()
+            self._finish()
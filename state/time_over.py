@@ -30,6 +30,10 @@ class TimeOut(GameState, EventHandler):
         self.scoring_labels.show_labels(screen)
         screen.blit(self.game_over, self.game_over_pos)
 
+    @property
+    def needs_redraw(self):
+        return False  # nothing on this screen moves
+
     @property
     def finished(self):
         return self._time_left <= 0.
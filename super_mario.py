@@ -1,10 +1,17 @@
+import argparse
+import atexit
 import os
+import time
 import pygame
 from event.game_events import EventHandler
 from state.game_state import state_stack
 from state import MainMenu
 import config
 from timer import game_timer
+from scheduler import game_scheduler
+from telemetry import telemetry, FrameTelemetry
+from profiler import profiler
+from dirty_rects import dirty_rects
 from assets import AssetManager
 
 
@@ -27,27 +34,138 @@ def run():
     pygame.display.set_caption("Super Mario")
     assets = AssetManager()
 
+    if config.prefetch_assets:
+        assets.prefetch()
+
     state_stack.push(MainMenu(assets))
 
     # timer initialize
     game_timer.reset()
-    accumulator = 0.0
+    game_scheduler.reset()
 
     while state_stack.top is not None:
-        state_stack.top.do_events()
+        telemetry.begin_frame()
+
+        with telemetry.measure(FrameTelemetry.EVENTS):
+            state_stack.top.do_events()
+
         game_timer.update()
 
-        # todo: fixed time step, or max time step?
-        accumulator += game_timer.elapsed
-        accumulator = min(0.10, accumulator)
-        while accumulator > config.PHYSICS_DT:
-            state_stack.update(config.PHYSICS_DT)
-            accumulator -= config.PHYSICS_DT
+        with telemetry.measure(FrameTelemetry.UPDATE):
+            telemetry.add_steps(game_scheduler.advance(game_timer.elapsed, state_stack.update))
+
+        with telemetry.measure(FrameTelemetry.DRAW):
+            state_stack.draw(screen)
 
-        state_stack.draw(screen)
-        pygame.display.flip()
+        with telemetry.measure(FrameTelemetry.FLIP):
+            if config.dirty_rect_rendering:
+                presented = dirty_rects.present()
+            else:
+                pygame.display.flip()
+                presented = True
+
+        if not presented:
+            # nothing on screen changed; wait for the next physics step rather than spinning
+            pygame.time.wait(int(config.PHYSICS_DT * 1000))
 
     exit(0)
 
 
-run()
+def dump_telemetry():
+    # registered to run at exit, since the game can quit from several places
+    telemetry.end()
+    telemetry.dump(config.telemetry_path)
+    print(f"telemetry for {len(telemetry.steps)} frames written to {config.telemetry_path}")
+
+
+def print_zones():
+    telemetry.end()
+    print(profiler.report())
+
+
+def run_headless(level_path, seconds, held):
+    # imported here so a normal run never sets the dummy SDL drivers
+    from headless import HeadlessSession, held_input
+    from event.input_log import InputLog, InputRecorder
+
+    log = InputLog(level_path, 0) if config.record_input_directory else None
+    session = HeadlessSession(level_path, input_script=held_input(*held), seed=0,
+                              input_hook=InputRecorder(log) if log is not None else None)
+
+    start = time.perf_counter()
+    steps = session.run(int(seconds / session.dt))
+    elapsed = time.perf_counter() - start
+
+    if log is not None:
+        os.makedirs(config.record_input_directory, exist_ok=True)
+        log.save(os.path.join(config.record_input_directory,
+                              os.path.splitext(os.path.basename(level_path))[0] + ".smbi"))
+
+    print(f"{level_path}: {steps} steps ({session.elapsed:.2f} s of game time) in {elapsed:.2f} s, "
+          f"{steps / max(elapsed, 1e-9):.0f} steps/s")
+    print(f"outcome: {session.outcome or 'still playing'}, mario at {tuple(session.level.mario.position)}")
+
+
+def run_replay(log_path):
+    from headless import init_headless, replay
+    from event.input_log import InputLog
+
+    log = InputLog.load(log_path)
+
+    init_headless()
+    assets = AssetManager()
+
+    start = time.perf_counter()
+    result = replay(log, assets)
+    elapsed = time.perf_counter() - start
+
+    print(f"{log_path} ({log.level_path}): replayed {result.steps} of {result.recorded_steps} steps "
+          f"in {elapsed:.2f} s, {result.steps / max(elapsed, 1e-9):.0f} steps/s")
+    print(f"outcome: {result.outcome or 'still playing'}, {result.hashes_checked} state hashes checked, "
+          f"{len(result.mismatches)} mismatched")
+
+    for step, expected, actual in result.mismatches[:10]:
+        print(f"  step {step}: expected {expected:016x}, got {actual:016x}")
+
+    if result.mismatches:
+        exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Super Mario")
+    parser.add_argument("--headless", metavar="LEVEL", help="simulate LEVEL without a window, then print a summary")
+    parser.add_argument("--seconds", type=float, default=60., help="game time to simulate in headless mode")
+    parser.add_argument("--hold", nargs="*", default=["right"], metavar="INPUT",
+                        help="player inputs held down in headless mode (left, right, up, down, jump, dash, fire)")
+    parser.add_argument("--record", metavar="DIR", help="record an input log of every level played into DIR")
+    parser.add_argument("--replay", metavar="LOG", help="replay an input log headless and check it still matches")
+    parser.add_argument("--telemetry", metavar="PATH", help="write frame timings to PATH (.json or .csv) on exit")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="update only changed parts of the screen, and skip redrawing screens that didn't change")
+    parser.add_argument("--zones", action="store_true", help="time profiling zones and print them per frame on exit")
+    args = parser.parse_args()
+
+    if args.record is not None:
+        config.record_input_directory = args.record
+
+    if args.telemetry is not None:
+        config.telemetry_path = args.telemetry
+
+    config.dirty_rect_rendering = config.dirty_rect_rendering or args.dirty_rects
+    profiler.enabled = config.profile_zones = config.profile_zones or args.zones
+
+    if profiler.enabled:
+        atexit.register(print_zones)
+
+    if config.telemetry_path:
+        atexit.register(dump_telemetry)
+
+    if args.replay:
+        run_replay(args.replay)
+    elif args.headless:
+        run_headless(args.headless, args.seconds, args.hold)
+    else:
+        run()
+
+
+main()
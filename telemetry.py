@@ -0,0 +1,187 @@
+import csv
+import json
+from array import array
+from time import perf_counter_ns
+from profiler import profiler
+import config
+
+
+class RingBuffer:
+    """Fixed number of the most recent integer samples"""
+    def __init__(self, capacity):
+        assert capacity > 0
+
+        self._values = array('q', bytes(8 * capacity))
+        self._next = 0
+        self._count = 0
+
+    def append(self, value):
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._values)
+        self._count = min(self._count + 1, len(self._values))
+
+    def values(self):
+        """Samples from oldest to newest"""
+        if self._count < len(self._values):
+            return self._values[:self._count].tolist()
+
+        return self._values[self._next:].tolist() + self._values[:self._next].tolist()
+
+    def last(self, count):
+        values = self.values()
+
+        return values[max(0, len(values) - count):]
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+
+class _Measure:
+    """Context manager adding the time spent inside it to a telemetry channel. Also a profiling zone of the same
+    name, so the zone tree of a frame starts with the main loop's phases"""
+    __slots__ = ['_telemetry', '_channel', '_start', '_zone']
+
+    def __init__(self, telemetry, channel):
+        self._telemetry = telemetry
+        self._channel = channel
+        self._start = 0
+        self._zone = None
+
+    def __enter__(self):
+        self._zone = profiler.zone(self._channel)
+        self._zone.__enter__()
+        self._start = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._telemetry.add(self._channel, perf_counter_ns() - self._start)
+        self._zone.__exit__(exc_type, exc_val, exc_tb)
+
+
+class FrameTelemetry:
+    """Per-frame timings of the main loop, in nanoseconds, kept for the last config.telemetry_frames frames.
+
+    Every frame, time is added to the channels below (a frame can run several physics steps; their update times add
+    up). FRAME is the time from the start of one frame to the start of the next, everything included"""
+    EVENTS = 'events'
+    UPDATE = 'update'
+    DRAW = 'draw'
+    FLIP = 'flip'
+    FRAME = 'frame'
+    CHANNELS = (EVENTS, UPDATE, DRAW, FLIP, FRAME)
+
+    def __init__(self, capacity=config.telemetry_frames):
+        self.buffers = {channel: RingBuffer(capacity) for channel in FrameTelemetry.CHANNELS}
+        self.steps = RingBuffer(capacity)  # physics steps taken each frame
+        self.frame_count = 0
+
+        self._current = dict.fromkeys(FrameTelemetry.CHANNELS, 0)
+        self._current_steps = 0
+        self._frame_start = None
+
+        self._measures = {channel: _Measure(self, channel) for channel in FrameTelemetry.CHANNELS}
+
+    def begin_frame(self):
+        now = perf_counter_ns()
+
+        if self._frame_start is not None:
+            self._commit(now - self._frame_start)
+
+        self._frame_start = now
+
+    def end(self):
+        """Commits the frame in progress, if any. Call once the loop is done"""
+        if self._frame_start is not None:
+            self._commit(perf_counter_ns() - self._frame_start)
+            self._frame_start = None
+
+    def measure(self, channel):
+        return self._measures[channel]
+
+    def add(self, channel, ns):
+        self._current[channel] += ns
+
+    def add_steps(self, count):
+        self._current_steps += count
+
+    def _commit(self, frame_ns):
+        self._current[FrameTelemetry.FRAME] = frame_ns
+
+        for channel, ns in self._current.items():
+            self.buffers[channel].append(ns)
+            self._current[channel] = 0
+
+        self.steps.append(self._current_steps)
+        self._current_steps = 0
+        self.frame_count += 1
+
+        profiler.begin_frame(frame_ns)  # profiling zones are grouped by the same frames
+
+    def clear(self):
+        for buffer in self.buffers.values():
+            buffer.clear()
+
+        self.steps.clear()
+        self.frame_count = 0
+        self._frame_start = None
+
+    def percentiles(self, channel, percents=(50, 95, 99)):
+        """Nearest-rank percentiles of a channel, in milliseconds"""
+        values = sorted(self.buffers[channel].values())
+
+        if not values:
+            return [0.] * len(percents)
+
+        return [values[min(len(values) - 1, max(0, -(-p * len(values) // 100) - 1))] / 1e6 for p in percents]
+
+    def summary(self):
+        summary = {}
+
+        for channel in FrameTelemetry.CHANNELS:
+            values = self.buffers[channel].values()
+            p50, p95, p99 = self.percentiles(channel)
+
+            summary[channel] = {"mean": sum(values) / len(values) / 1e6 if values else 0.,
+                                "p50": p50, "p95": p95, "p99": p99,
+                                "max": max(values) / 1e6 if values else 0.}
+
+        return summary
+
+    def _rows(self):
+        columns = [self.buffers[channel].values() for channel in FrameTelemetry.CHANNELS]
+        first_frame = self.frame_count - len(self.steps)
+
+        for i, steps in enumerate(self.steps.values()):
+            yield [first_frame + i] + [round(column[i] / 1e6, 4) for column in columns] + [steps]
+
+    def dump_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame"] + [channel + "_ms" for channel in FrameTelemetry.CHANNELS] + ["steps"])
+            writer.writerows(self._rows())
+
+    def dump_json(self, path):
+        header = ["frame"] + [channel + "_ms" for channel in FrameTelemetry.CHANNELS] + ["steps"]
+
+        with open(path, 'w') as f:
+            values = {"summary": self.summary(),
+                      "frames": [dict(zip(header, row)) for row in self._rows()]}
+
+            if profiler.frames:
+                values["zones"] = profiler.to_dict()
+
+            json.dump(values, f, indent=1)
+
+    def dump(self, path):
+        """Writes JSON if path ends in .json, CSV otherwise"""
+        if path.lower().endswith(".json"):
+            self.dump_json(path)
+        else:
+            self.dump_csv(path)
+
+
+telemetry = FrameTelemetry()